@@ -0,0 +1,40 @@
+"""keyset pagination indexes on (created_at, id)
+
+Revision ID: 2026_10_18_000003_keyset_indexes
+Revises: 2025_08_26_000002_accounts
+Create Date: 2026-10-18 00:00:03
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_18_000003_keyset_indexes"
+down_revision = "2025_08_26_000002_accounts"
+branch_labels = None
+depends_on = None
+
+TABLES = ("organizations", "users", "bots", "org_users")
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись на больших таблицах, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(
+                f"ix_{table}_created_at_id",
+                table,
+                ["created_at", "id"],
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index(
+                f"ix_{table}_created_at_id",
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
@@ -0,0 +1,24 @@
+"""bots.token for the multi-bot runner
+
+Revision ID: 2026_10_18_000004_bot_tokens
+Revises: 2026_10_18_000003_keyset_indexes
+Create Date: 2026-10-18 00:00:04
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_18_000004_bot_tokens"
+down_revision = "2026_10_18_000003_keyset_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # nullable: без токена бот есть в каталоге, но раннер его не поднимает
+    op.add_column("bots", sa.Column("token", sa.String(length=128), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("bots", "token")
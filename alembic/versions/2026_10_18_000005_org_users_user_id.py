@@ -0,0 +1,37 @@
+"""org_users(user_id) index for membership lookups by user
+
+Revision ID: 2026_10_18_000005_org_users_user_id
+Revises: 2026_10_18_000004_bot_tokens
+Create Date: 2026-10-18 00:00:05
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2026_10_18_000005_org_users_user_id"
+down_revision = "2026_10_18_000004_bot_tokens"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # uq_org_user (organization_id, user_id) не помогает искать по user_id;
+    # CONCURRENTLY не блокирует запись, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_org_users_user_id",
+            "org_users",
+            ["user_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_org_users_user_id",
+            table_name="org_users",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
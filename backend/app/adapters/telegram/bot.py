@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 
@@ -6,19 +7,43 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.filters import Command, CommandStart
 from aiogram.types import Message
-from celery.result import AsyncResult
 
-from app.services.celery_app import celery_app
+from app.adapters.telegram.fsm import create_storage
+from app.adapters.telegram.middlewares import (
+    TracingRequestMiddleware,
+    UpdateContextMiddleware,
+    UpdateMetricsMiddleware,
+)
+from app.adapters.telegram.scheduler import (
+    ChatScheduler,
+    HandlerMetricsMiddleware,
+    SchedulerMiddleware,
+)
+from app.adapters.telegram.users_buffer import SeenUsersMiddleware, user_buffer
+from app.core.config import settings
+from app.services.task_results import TaskResult, task_results
 from app.services.tasks import ping as ping_task
 
 logger = logging.getLogger(__name__)
 
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN", "")
-if not TELEGRAM_TOKEN:
-    logger.warning("TELEGRAM_TOKEN is empty. Bot will not start.")
 
-bot = Bot(token=TELEGRAM_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher()
+# Один бот из TELEGRAM_TOKEN (режим single); в режиме multi боты — из БД, см. multibot.py
+bot: Bot | None = None
+if TELEGRAM_TOKEN:
+    bot = Bot(token=TELEGRAM_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.session.middleware(TracingRequestMiddleware())
+
+dp = Dispatcher(storage=create_storage())
+scheduler = ChatScheduler(dp, workers=settings.tg_workers, max_pending=settings.tg_max_pending)
+# первым: контекст, спаны и метрики ниже срабатывают уже в воркере планировщика
+dp.update.outer_middleware(SchedulerMiddleware(scheduler))
+dp.update.outer_middleware(UpdateContextMiddleware())
+dp.update.outer_middleware(UpdateMetricsMiddleware())
+dp.message.outer_middleware(SeenUsersMiddleware(user_buffer))
+for observer_name, observer in dp.observers.items():
+    if observer_name != "update":
+        observer.middleware(HandlerMetricsMiddleware())
 
 
 @dp.message(CommandStart())
@@ -27,13 +52,49 @@ async def start(message: Message) -> None:
         "👋 Привет! Я бот TTQ_02. Команда /start работает.\n"
         "Доступно:\n"
         "• /ping — поставить задачу Celery\n"
-        "• /task <code>&lt;id&gt;</code> — статус задачи."
+        "• /task <code>&lt;id&gt; [id …]</code> — статус задач."
     )
 
 
+# Фоновые ожидания результатов (TG_PUSH_RESULTS): держим ссылки, чтобы задачи не собрал GC
+_pushes: set[asyncio.Task[None]] = set()
+
+# Сколько id принимает /task за раз (одним MGET)
+MAX_TASK_IDS = 20
+
+
+def _format_result(res: TaskResult) -> str:
+    if res.successful:
+        return (
+            f"✅ <b>{res.task_id}</b>\nstate: <code>{res.state}</code>\n"
+            f"result: <code>{res.result}</code>"
+        )
+    if res.failed:
+        return f"❌ <b>{res.task_id}</b>\nstate: <code>{res.state}</code>"
+    return f"⏳ <b>{res.task_id}</b>\nstate: <code>{res.state}</code>"
+
+
+async def _push_result(message: Message, task_id: str) -> None:
+    res = await task_results.wait(task_id, settings.tg_push_timeout)
+    if res is None:
+        await message.answer(
+            f"⌛ <b>{task_id}</b> ещё выполняется, проверь позже: <code>/task {task_id}</code>"
+        )
+        return
+    await message.answer(_format_result(res))
+
+
 @dp.message(Command("ping"))
 async def ping_cmd(message: Message) -> None:
     task = ping_task.delay()
+    if settings.tg_push_results:
+        await message.answer(
+            f"🟢 Поставил задачу Celery: <code>{task.id}</code>, пришлю результат."
+        )
+        push = asyncio.create_task(_push_result(message, task.id))
+        _pushes.add(push)
+        push.add_done_callback(_pushes.discard)
+        return
     await message.answer(
         f"🟢 Поставил задачу Celery: <code>{task.id}</code>\n"
         f"Проверь статус: <code>/task {task.id}</code>"
@@ -42,20 +103,13 @@ async def ping_cmd(message: Message) -> None:
 
 @dp.message(Command("task"))
 async def task_status(message: Message) -> None:
-    parts = message.text.split(maxsplit=1)
-    if len(parts) < 2:
-        await message.answer("ℹ️ Использование: <code>/task &lt;task_id&gt;</code>")
+    task_ids = message.text.split()[1 : MAX_TASK_IDS + 1]
+    if not task_ids:
+        await message.answer("ℹ️ Использование: <code>/task &lt;task_id&gt; [task_id …]</code>")
         return
-    task_id = parts[1].strip()
-    res = AsyncResult(task_id, app=celery_app)
-    if res.successful():
-        await message.answer(
-            f"✅ <b>{task_id}</b>\nstate: <code>{res.state}</code>\nresult: <code>{res.result}</code>"
-        )
-    elif res.failed():
-        await message.answer(f"❌ <b>{task_id}</b>\nstate: <code>{res.state}</code>")
-    else:
-        await message.answer(f"⏳ <b>{task_id}</b>\nstate: <code>{res.state}</code>")
+    # async MGET вместо синхронного AsyncResult: не блокирует event loop остальным чатам
+    results = await task_results.get_many(task_ids)
+    await message.answer("\n\n".join(_format_result(res) for res in results))
 
 
 @dp.message(F.text)
@@ -0,0 +1,203 @@
+"""
+FSM-хранилище в Redis: состояние диалога переживает рестарт и общее для всех процессов бота.
+
+- одна запись на ключ (бот, чат, пользователь, ветка) — hash с полями s (состояние) и
+  d (данные, orjson): состояние и данные читаются одним HGETALL, запись — одним пайплайном
+  HSET/HDEL + EXPIRE + PUBLISH;
+- TTL записи зависит от состояния: TG_FSM_STATE_TTLS="Order:address=900,Order=3600"
+  (имя состояния или его группа), остальные — TG_FSM_TTL секунд (0 — без срока);
+- горячие чаты читаются из локального LRU; запись рассылает ключ через pub/sub, и остальные
+  процессы выкидывают свою копию (TTL локального уровня страхует потерю сообщения).
+  Внутри процесса апдейты одного чата и так идут по очереди (scheduler.py).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+import uuid
+from collections.abc import Mapping
+from typing import Any
+
+import orjson
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.cache import LocalLRU
+
+logger = logging.getLogger(__name__)
+
+FSM_CHANNEL = "ttq:fsm:invalidate"
+_STATE, _DATA = b"s", b"d"
+_REDIS_BACKOFF = 5.0
+
+_Record = tuple[str | None, dict[str, Any]]
+
+
+def parse_state_ttls(spec: str) -> dict[str, int]:
+    ttls: dict[str, int] = {}
+    for item in spec.split(","):
+        name, sep, ttl = item.partition("=")
+        if sep and name.strip():
+            ttls[name.strip()] = int(ttl)
+    return ttls
+
+
+class RedisFSMStorage(BaseStorage):
+    def __init__(
+        self,
+        ttl: int = 86400,
+        state_ttls: Mapping[str, int] | None = None,
+        local_maxsize: int = 10_000,
+        local_ttl: float = 30.0,
+        prefix: str = "ttq:fsm",
+    ) -> None:
+        self.ttl = ttl
+        self.state_ttls = dict(state_ttls or {})
+        self.local = LocalLRU(maxsize=local_maxsize, ttl=local_ttl)
+        self.key_builder = DefaultKeyBuilder(prefix=prefix, with_bot_id=True, with_destiny=True)
+        # свои же сообщения об инвалидации listener пропускает
+        self.origin = uuid.uuid4().hex
+        self._listener: asyncio.Task[None] | None = None
+        self._redis_down_until = 0.0
+
+    def ttl_for(self, state: str | None) -> int:
+        """TTL по состоянию «Group:name», затем по группе «Group», затем общий."""
+        if state is not None:
+            if state in self.state_ttls:
+                return self.state_ttls[state]
+            group = state.partition(":")[0]
+            if group in self.state_ttls:
+                return self.state_ttls[group]
+        return self.ttl
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, exc: Exception) -> None:
+        self._redis_down_until = time.monotonic() + _REDIS_BACKOFF
+        logger.warning("fsm: redis unavailable, using local tier only: %s", exc)
+
+    def _ensure_listener(self) -> None:
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen(), name="fsm-invalidation")
+
+    async def _load(self, redis_key: str) -> _Record:
+        self._ensure_listener()
+        cached = self.local.get(redis_key)
+        if isinstance(cached, tuple):
+            return cached
+        record: _Record = (None, {})
+        if self._redis_available():
+            try:
+                raw = await get_redis().hgetall(redis_key)
+            except (RedisError, OSError) as exc:
+                self._redis_failed(exc)
+                return record
+            state = raw.get(_STATE)
+            record = (
+                state.decode() if state is not None else None,
+                orjson.loads(raw[_DATA]) if _DATA in raw else {},
+            )
+        self.local.set(redis_key, record)
+        return record
+
+    async def _store(self, redis_key: str, record: _Record, changed: bytes) -> None:
+        state, data = record
+        self.local.set(redis_key, record)
+        if not self._redis_available():
+            return
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                if state is None and not data:
+                    pipe.delete(redis_key)
+                else:
+                    if changed == _STATE:
+                        if state is None:
+                            pipe.hdel(redis_key, _STATE)
+                        else:
+                            pipe.hset(redis_key, _STATE, state)
+                    elif data:
+                        pipe.hset(
+                            redis_key, _DATA, orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+                        )
+                    else:
+                        pipe.hdel(redis_key, _DATA)
+                    ttl = self.ttl_for(state)
+                    if ttl > 0:
+                        pipe.expire(redis_key, ttl)
+                    else:
+                        pipe.persist(redis_key)
+                pipe.publish(FSM_CHANNEL, f"{self.origin}|{redis_key}")
+                await pipe.execute()
+        except (RedisError, OSError) as exc:
+            self._redis_failed(exc)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        redis_key = self.key_builder.build(key)
+        _, data = await self._load(redis_key)
+        value = state.state if isinstance(state, State) else state
+        await self._store(redis_key, (value, data), _STATE)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await self._load(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        redis_key = self.key_builder.build(key)
+        state, _ = await self._load(redis_key)
+        await self._store(redis_key, (state, data.copy()), _DATA)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = await self._load(self.key_builder.build(key))
+        # копия: хендлер может менять словарь, не трогая кэш
+        return data.copy()
+
+    async def _listen(self) -> None:
+        """Фоновая задача: чистит локальный уровень по записям других процессов."""
+        while True:
+            try:
+                async with get_redis().pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(FSM_CHANNEL)
+                    # пока не были подписаны, могли пропустить инвалидации
+                    self.local.clear()
+                    while True:
+                        message = await pubsub.get_message(timeout=1.0)
+                        if message is None:
+                            continue
+                        origin, _, redis_key = message["data"].decode().partition("|")
+                        if origin != self.origin:
+                            self.local.pop(redis_key)
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as exc:
+                logger.warning("fsm: invalidation listener failed, reconnecting: %s", exc)
+                await asyncio.sleep(_REDIS_BACKOFF)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+
+
+def create_storage() -> BaseStorage | None:
+    """Хранилище по TG_FSM_STORAGE: redis — общее для процессов, memory — aiogram по умолчанию."""
+    if settings.tg_fsm_storage != "redis":
+        return None
+    return RedisFSMStorage(
+        ttl=settings.tg_fsm_ttl,
+        state_ttls=parse_state_ttls(settings.tg_fsm_state_ttls),
+        local_maxsize=settings.tg_fsm_local_maxsize,
+        local_ttl=settings.tg_fsm_local_ttl,
+    )
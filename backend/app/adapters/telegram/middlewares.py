@@ -0,0 +1,76 @@
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject, Update, User
+
+from app.core import context, tracing
+from app.core.metrics import TELEGRAM_UPDATE_LATENCY
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: время обработки апдейта целиком, по типу события."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_type = event.event_type if isinstance(event, Update) else "unknown"
+            TELEGRAM_UPDATE_LATENCY.labels(update_type).observe(time.perf_counter() - started)
+
+
+class UpdateContextMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: контекст корреляции (request_id = tg-<update_id>,
+    user_id = Telegram id отправителя) и корневой спан апдейта — до него доходят
+    логи хендлеров, задачи Celery и вызовы Bot API.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        update_id = event.update_id if isinstance(event, Update) else None
+        update_type = event.event_type if isinstance(event, Update) else "unknown"
+        user: User | None = data.get("event_from_user")
+        with context.bind(
+            request_id=f"tg-{update_id}" if update_id is not None else None,
+            user_id=user.id if user else None,
+        ):
+            with tracing.span(
+                f"telegram.update {update_type}",
+                tracing.CONSUMER,
+                **{"telegram.update_id": update_id, "telegram.update_type": update_type},
+            ):
+                return await handler(event, data)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Клиентский спан на каждый вызов Bot API (кроме long-poll getUpdates)."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+        with tracing.span(
+            f"telegram.api {method.__api_method__}",
+            tracing.CLIENT,
+            **{"telegram.method": method.__api_method__, "telegram.bot_id": bot.id},
+        ):
+            return await make_request(bot, method)
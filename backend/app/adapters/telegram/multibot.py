@@ -0,0 +1,179 @@
+"""
+Мульти-бот раннер: все активные боты с токеном из таблицы bots в одном event loop.
+
+- long polling каждого бота — своя задача, апдейты идут в общий Dispatcher (dp.feed_update)
+  и дальше в планировщик по чатам (scheduler.py);
+- один AiohttpSession (пул соединений к api.telegram.org) на все боты процесса;
+- раз в TG_REFRESH_INTERVAL таблица перечитывается: новые боты поднимаются, выключенные,
+  удалённые и со сменённым токеном — останавливаются/перезапускаются;
+- боты делятся между процессами рандеву-хешированием по id (TG_SHARD_INDEX из TG_SHARD_COUNT):
+  при изменении числа шардов переезжает ~1/N ботов, а не все.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import logging
+import uuid
+from dataclasses import dataclass
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramConflictError, TelegramUnauthorizedError
+from aiogram.methods import GetUpdates
+from aiogram.utils.backoff import Backoff, BackoffConfig
+from aiogram.utils.token import TokenValidationError
+from sqlalchemy import select
+
+from app.adapters.telegram.middlewares import TracingRequestMiddleware
+from app.core.config import settings
+from app.core.metrics import TELEGRAM_BOTS_RUNNING
+from app.db.models.bot import Bot as BotRow
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=30.0, factor=1.5, jitter=0.1)
+
+
+def shard_of(key: str, shard_count: int) -> int:
+    """Рандеву (HRW) хеширование: шард с максимальным весом hash(shard, key)."""
+    if shard_count <= 1:
+        return 0
+    return max(
+        range(shard_count),
+        key=lambda shard: hashlib.blake2b(f"{shard}:{key}".encode(), digest_size=8).digest(),
+    )
+
+
+@dataclass
+class _Running:
+    token: str
+    bot: Bot
+    task: asyncio.Task[None]
+
+
+class MultiBotRunner:
+    def __init__(
+        self,
+        dp: Dispatcher,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        refresh_interval: float = 30.0,
+        polling_timeout: int = 30,
+        pool_size: int = 100,
+    ) -> None:
+        self.dp = dp
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.refresh_interval = refresh_interval
+        self.polling_timeout = polling_timeout
+        self.session = AiohttpSession(limit=pool_size)
+        self.session.middleware(TracingRequestMiddleware())
+        self.allowed_updates = dp.resolve_used_update_types()
+        self._running: dict[uuid.UUID, _Running] = {}
+
+    @classmethod
+    def from_settings(cls, dp: Dispatcher) -> MultiBotRunner:
+        return cls(
+            dp,
+            shard_index=settings.tg_shard_index,
+            shard_count=settings.tg_shard_count,
+            refresh_interval=settings.tg_refresh_interval,
+            polling_timeout=settings.tg_polling_timeout,
+            pool_size=settings.tg_http_pool_size,
+        )
+
+    def owns(self, bot_id: uuid.UUID) -> bool:
+        return shard_of(str(bot_id), self.shard_count) == self.shard_index
+
+    async def load(self) -> dict[uuid.UUID, str]:
+        """Активные боты этого шарда: id → token."""
+        stmt = select(BotRow.id, BotRow.token).where(
+            BotRow.is_active.is_(True), BotRow.token.is_not(None)
+        )
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(stmt)).all()
+        return {row.id: row.token for row in rows if self.owns(row.id)}
+
+    async def refresh(self) -> None:
+        wanted = await self.load()
+        for bot_id in list(self._running):
+            if wanted.get(bot_id) != self._running[bot_id].token:
+                await self.stop(bot_id)
+        for bot_id, token in wanted.items():
+            if bot_id not in self._running:
+                self.start(bot_id, token)
+        TELEGRAM_BOTS_RUNNING.set(len(self._running))
+
+    def start(self, bot_id: uuid.UUID, token: str) -> None:
+        try:
+            bot = Bot(
+                token=token,
+                session=self.session,
+                default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+            )
+        except TokenValidationError:
+            logger.error("multibot: bot %s has a malformed token, skipped", bot_id)
+            return
+        task = asyncio.create_task(self._poll(bot_id, bot), name=f"poll:{bot_id}")
+        self._running[bot_id] = _Running(token, bot, task)
+        logger.info("multibot: started bot %s (tg id %s)", bot_id, bot.id)
+
+    async def stop(self, bot_id: uuid.UUID) -> None:
+        running = self._running.pop(bot_id)
+        running.task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await running.task
+        logger.info("multibot: stopped bot %s", bot_id)
+
+    async def _poll(self, bot_id: uuid.UUID, bot: Bot) -> None:
+        backoff = Backoff(config=_BACKOFF)
+        get_updates = GetUpdates(timeout=self.polling_timeout, allowed_updates=self.allowed_updates)
+        # запрос живёт дольше long-poll таймаута, иначе ложные TimeoutError
+        request_timeout = int(self.session.timeout + self.polling_timeout)
+        while True:
+            try:
+                updates = await bot(get_updates, request_timeout=request_timeout)
+            except TelegramUnauthorizedError:
+                # токен отозван: ждём, пока его поменяют в БД (refresh перезапустит)
+                logger.error("multibot: bot %s token rejected, polling stopped", bot_id)
+                return
+            except TelegramConflictError:
+                logger.warning("multibot: bot %s polled elsewhere (webhook set?)", bot_id)
+                await backoff.asleep()
+                continue
+            except Exception as exc:  # noqa: BLE001 — сеть/5xx: не роняем остальные боты
+                logger.warning("multibot: bot %s getUpdates failed: %s", bot_id, exc)
+                await backoff.asleep()
+                continue
+            backoff.reset()
+            for update in updates:
+                get_updates.offset = update.update_id + 1
+                # планировщик (SchedulerMiddleware) принимает апдейт в очередь чата; если она
+                # полна — ждём здесь, и следующий getUpdates откладывается (backpressure)
+                await self.dp.feed_update(bot, update)
+
+    async def run(self) -> None:
+        logger.info(
+            "multibot: shard %s/%s, refresh every %ss",
+            self.shard_index,
+            self.shard_count,
+            self.refresh_interval,
+        )
+        try:
+            while True:
+                try:
+                    await self.refresh()
+                except Exception:  # noqa: BLE001 — БД недоступна: работаем с текущим набором
+                    logger.exception("multibot: refresh failed")
+                await asyncio.sleep(self.refresh_interval)
+        finally:
+            for bot_id in list(self._running):
+                await self.stop(bot_id)
+            TELEGRAM_BOTS_RUNNING.set(0)
+            await self.session.close()
@@ -1,27 +1,74 @@
 import asyncio
 import logging
+import os
 import signal
 
-from app.adapters.telegram.bot import bot, dp
+from prometheus_client import start_http_server
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s | %(message)s")
+from app.adapters.telegram.bot import bot, dp, scheduler
+from app.adapters.telegram.multibot import MultiBotRunner
+from app.adapters.telegram.users_buffer import user_buffer
+from app.adapters.telegram.webhook import StreamConsumer, registry
+from app.core import tracing
+from app.core.config import settings
+from app.core.logging_config import setup_logging
+from app.services.task_results import task_results
+
+setup_logging()
+tracing.configure("bot")
+
+logger = logging.getLogger(__name__)
 
 
 async def _main() -> None:
-    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    try:
+        await _run()
+    finally:
+        # сюда попадаем и по SIGINT/SIGTERM (см. _graceful_shutdown)
+        await scheduler.drain()
+        await user_buffer.close()
+        await dp.storage.close()
+        await task_results.close()
+
+
+async def _run() -> None:
+    # TG_RUNNER=multi — все активные боты из таблицы bots (с шардированием по процессам)
+    if settings.tg_runner == "multi":
+        await MultiBotRunner.from_settings(dp).run()
+        return
+    # TG_RUNNER=stream — обработка апдейтов, принятых вебхуком API (TG_WEBHOOK_MODE=stream)
+    if settings.tg_runner == "stream":
+        await StreamConsumer(scheduler, registry).run()
+        return
+    if bot is None:
+        logger.warning("TELEGRAM_TOKEN is empty. Bot will not start.")
+        return
+    try:
+        # без задачи на апдейт: при полной очереди планировщика polling ждёт (backpressure)
+        await dp.start_polling(
+            bot, handle_as_tasks=False, allowed_updates=dp.resolve_used_update_types()
+        )
+    finally:
+        await bot.session.close()
 
 
-def _graceful_shutdown(loop: asyncio.AbstractEventLoop):
-    for task in asyncio.all_tasks(loop):
-        task.cancel()
+def _graceful_shutdown(main: asyncio.Task[None]) -> None:
+    # отменяем только _main: его finally дождётся воркеров планировщика и сбросит буфер
+    # пользователей (отмена всех задач оборвала бы и их)
+    main.cancel()
 
 
 if __name__ == "__main__":
+    metrics_port = int(os.getenv("METRICS_BOT_PORT", "9102"))
+    if metrics_port:
+        start_http_server(metrics_port)
     loop = asyncio.new_event_loop()
+    main = loop.create_task(_main())
     for sig in (signal.SIGINT, signal.SIGTERM):
-        loop.add_signal_handler(sig, _graceful_shutdown, loop)
+        loop.add_signal_handler(sig, _graceful_shutdown, main)
     try:
-        loop.run_until_complete(_main())
+        loop.run_until_complete(main)
+    except asyncio.CancelledError:
+        pass
     finally:
-        loop.run_until_complete(bot.session.close())
         loop.close()
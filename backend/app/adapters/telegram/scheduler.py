@@ -0,0 +1,185 @@
+"""
+Планировщик апдейтов: апдейты одного чата обрабатываются строго по очереди, разных чатов —
+параллельно, пулом из TG_WORKERS воркеров. Не больше TG_MAX_PENDING апдейтов ждут в памяти:
+дальше submit() ждёт свободного места, и источник (polling, вебхук, stream) притормаживает.
+
+Подключается outer-middleware на dp.update первым по счёту, поэтому работает для любого
+источника, который вызывает dp.feed_update: первый проход ставит апдейт в очередь и сразу
+возвращается, воркер потом прогоняет его через Dispatcher ещё раз — уже с флагом SCHEDULED.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.core.metrics import (
+    TELEGRAM_HANDLER_LATENCY,
+    TELEGRAM_UPDATE_QUEUE_WAIT,
+    TELEGRAM_UPDATES_PENDING,
+)
+
+logger = logging.getLogger(__name__)
+
+# Ключ в kwargs feed_update: апдейт уже прошёл через очередь
+SCHEDULED = "ttq_scheduled"
+
+
+@dataclass
+class _Item:
+    bot: Bot
+    update: Update
+    context: contextvars.Context
+    # None — результата никто не ждёт (polling, вебхук direct)
+    done: asyncio.Future[Any] | None
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+def chat_key(bot: Bot, update: Update) -> Hashable:
+    """Порядок нужен внутри чата (и ветки форума); без чата — внутри пользователя."""
+    ctx = UserContextMiddleware.resolve_event_context(update)
+    if ctx.chat is not None:
+        return bot.id, ctx.chat.id, ctx.thread_id
+    if ctx.user is not None:
+        return bot.id, "user", ctx.user.id
+    return bot.id, "update", update.update_id
+
+
+class ChatScheduler:
+    def __init__(self, dp: Dispatcher, workers: int = 64, max_pending: int = 1000) -> None:
+        self.dp = dp
+        self.workers = workers
+        self.max_pending = max_pending
+        self._chats: dict[Hashable, deque[_Item]] = {}
+        self._ready: asyncio.Queue[Hashable] | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._workers: list[asyncio.Task[None]] = []
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _start(self) -> None:
+        # очередь и воркеры создаются в работающем event loop, при первом апдейте
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"tg-worker-{i}") for i in range(self.workers)
+        ]
+
+    async def submit(
+        self, bot: Bot, update: Update, *, wait: bool = False
+    ) -> asyncio.Future[Any] | None:
+        """
+        Поставить апдейт в очередь его чата. wait=True — вернуть future результата обработки;
+        без него ошибка хендлера только логируется (future без ожидающего дал бы
+        «Future exception was never retrieved»).
+        """
+        if self._ready is None:
+            self._start()
+        assert self._ready is not None and self._slots is not None
+        await self._slots.acquire()
+        done = asyncio.get_running_loop().create_future() if wait else None
+        # контекст (request_id/trace) источника переезжает в воркер вместе с апдейтом
+        item = _Item(bot, update, contextvars.copy_context(), done)
+        key = chat_key(bot, update)
+        queue = self._chats.get(key)
+        if queue is None:
+            self._chats[key] = deque([item])
+            self._ready.put_nowait(key)
+        else:
+            # чат уже в работе или в очереди: воркер заберёт апдейт следом за предыдущими
+            queue.append(item)
+        self._pending += 1
+        TELEGRAM_UPDATES_PENDING.inc()
+        return done
+
+    async def _work(self) -> None:
+        assert self._ready is not None and self._slots is not None
+        while True:
+            key = await self._ready.get()
+            queue = self._chats[key]
+            item = queue.popleft()
+            TELEGRAM_UPDATE_QUEUE_WAIT.observe(time.perf_counter() - item.enqueued_at)
+            try:
+                result = await asyncio.create_task(
+                    self.dp.feed_update(item.bot, item.update, **{SCHEDULED: True}),
+                    context=item.context,
+                )
+            except Exception as exc:  # noqa: BLE001 — ошибка хендлера не должна убить воркер
+                logger.exception("scheduler: update %s failed", item.update.update_id)
+                if item.done is not None and not item.done.done():
+                    item.done.set_exception(exc)
+            else:
+                if item.done is not None and not item.done.done():
+                    item.done.set_result(result)
+            finally:
+                self._pending -= 1
+                TELEGRAM_UPDATES_PENDING.dec()
+                self._slots.release()
+                # чат встаёт в конец общей очереди: длинная очередь одного чата не душит другие
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Дождаться уже принятых апдейтов и остановить воркеры."""
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._ready = None
+        self._slots = None
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.update: первый проход — в очередь чата, второй (из воркера) — дальше."""
+
+    def __init__(self, scheduler: ChatScheduler) -> None:
+        self.scheduler = scheduler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        if data.get(SCHEDULED) or not isinstance(event, Update):
+            return await handler(event, data)
+        await self.scheduler.submit(data["bot"], event)
+        # None, а не UNHANDLED: иначе Dispatcher запишет в лог «not handled» на каждый апдейт
+        return None
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware на наблюдателях событий: латентность по конкретному хендлеру."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object: HandlerObject | None = data.get("handler")
+        name = getattr(handler_object.callback, "__name__", "unknown") if handler_object else "?"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            TELEGRAM_HANDLER_LATENCY.labels(name).observe(time.perf_counter() - started)
@@ -0,0 +1,141 @@
+"""
+Write-behind буфер пользователей Telegram: каждый отправитель сообщения должен оказаться
+в таблице users (tg_user_id, display_name), но без запроса в БД на каждый апдейт.
+
+Повторные появления одного пользователя склеиваются в памяти (последнее имя побеждает),
+раз в TG_USERS_FLUSH_MS или по накоплении TG_USERS_FLUSH_ROWS пользователей пачка уходит
+одним INSERT ... ON CONFLICT (tg_user_id) DO UPDATE (app.db.upserts.upsert_users).
+close() при остановке процесса сбрасывает остаток.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.db.models.user import User as UserRow
+from app.db.session import AsyncSessionLocal
+from app.db.upserts import UPSERT_BATCH, upsert_users
+from app.services.cache import invalidate
+
+logger = logging.getLogger(__name__)
+
+_DISPLAY_NAME_MAX = UserRow.__table__.c.display_name.type.length
+
+
+def display_name(user: User) -> str:
+    name = user.full_name.strip() or (f"@{user.username}" if user.username else str(user.id))
+    return name[:_DISPLAY_NAME_MAX]
+
+
+class UserBuffer:
+    def __init__(self, flush_interval: float = 0.5, max_rows: int = 500) -> None:
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self._rows: dict[int, str] = {}
+        self._full: asyncio.Event | None = None
+        self._lock: asyncio.Lock | None = None
+        self._flusher: asyncio.Task[None] | None = None
+
+    def _start(self) -> None:
+        # примитивы и фоновая задача — в работающем event loop, при первом пользователе
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._flusher = asyncio.create_task(self._run(), name="tg-users-flush")
+
+    def add(self, user: User) -> None:
+        """Отметить пользователя; сама запись в БД — позже, пачкой."""
+        if user.is_bot:
+            return
+        self._rows[user.id] = display_name(user)
+        if self._flusher is None:
+            self._start()
+        if len(self._rows) >= self.max_rows:
+            assert self._full is not None
+            self._full.set()
+
+    async def _run(self) -> None:
+        assert self._full is not None
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            # shield: отмена при остановке не должна потерять уже вынутую из буфера пачку
+            await asyncio.shield(self.flush())
+
+    async def flush(self) -> None:
+        if self._lock is None:
+            return
+        async with self._lock:
+            assert self._full is not None
+            self._full.clear()
+            if not self._rows:
+                return
+            pending, self._rows = self._rows, {}
+            # одинаковый порядок ключей у всех процессов: пачки не ловят взаимные блокировки
+            rows = [
+                {"tg_user_id": tg_id, "display_name": pending[tg_id], "is_active": True}
+                for tg_id in sorted(pending)
+            ]
+            try:
+                async with AsyncSessionLocal() as db:
+                    changed = []
+                    for start in range(0, len(rows), UPSERT_BATCH):
+                        result = await upsert_users(
+                            db,
+                            rows[start : start + UPSERT_BATCH],
+                            # is_active не трогаем: деактивацию из админки сообщение не отменяет
+                            columns=("display_name",),
+                            skip_unchanged=True,
+                        )
+                        changed.extend(row.id for row in result if not row.inserted)
+                    await db.commit()
+            except (SQLAlchemyError, OSError) as exc:
+                # вернуть в буфер, не затирая более свежие имена; предел — чтобы не копить вечно
+                logger.warning("users buffer: flush of %s users failed: %s", len(rows), exc)
+                for tg_id, name in pending.items():
+                    if len(self._rows) >= self.max_rows * 10:
+                        break
+                    self._rows.setdefault(tg_id, name)
+                return
+            await invalidate(UserRow, *changed)
+            logger.debug("users buffer: flushed %s users (%s renamed)", len(rows), len(changed))
+
+    async def close(self) -> None:
+        """Остановить фоновый сброс и записать остаток."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+        await self.flush()
+        self._flusher = self._full = self._lock = None
+
+
+class SeenUsersMiddleware(BaseMiddleware):
+    """Outer-middleware на dp.message: отправитель сообщения — в буфер."""
+
+    def __init__(self, buffer: UserBuffer) -> None:
+        self.buffer = buffer
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user: User | None = data.get("event_from_user")
+        if user is not None:
+            self.buffer.add(user)
+        return await handler(event, data)
+
+
+user_buffer = UserBuffer(
+    flush_interval=settings.tg_users_flush_ms / 1000, max_rows=settings.tg_users_flush_rows
+)
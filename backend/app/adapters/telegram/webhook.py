@@ -0,0 +1,316 @@
+"""
+Приём апдейтов через вебхуки (вместо long polling).
+
+Telegram шлёт POST на /api/v1/telegram/webhook/{bot_id} с заголовком
+X-Telegram-Bot-Api-Secret-Token — у каждого бота свой секрет, выводимый из SECRET_KEY
+(хранить нечего). Повторы одного update_id отбрасываются (Redis SET NX + локальный LRU).
+Дальше по TG_WEBHOOK_MODE:
+
+- direct — апдейт уходит в Dispatcher в процессе API: планировщик (scheduler.py) ставит его
+  в очередь чата, ответ 200 обработки не ждёт;
+- stream — XADD в Redis stream; StreamConsumer (TG_RUNNER=stream) читает его группой
+  потребителей, так что обработку можно масштабировать отдельно от приёма.
+
+Регистрация вебхуков активных ботов: python -m app.adapters.telegram.webhook
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiogram.types import Update
+from aiogram.utils.token import TokenValidationError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import select
+
+from app.adapters.telegram.middlewares import TracingRequestMiddleware
+from app.adapters.telegram.scheduler import ChatScheduler
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.db.models.bot import Bot as BotRow
+from app.db.session import AsyncSessionLocal
+from app.services.cache import LocalLRU
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+UPDATES_STREAM = "ttq:tg:updates"
+CONSUMER_GROUP = "tg-dispatch"
+_DEDUPE_PREFIX = "ttq:tg:update:"
+_REDIS_BACKOFF = 5.0
+
+
+def webhook_secret(bot_id: uuid.UUID | str) -> str:
+    """Секрет вебхука бота: HMAC(SECRET_KEY, bot_id); [0-9a-f] подходит под ограничения Telegram."""
+    return hmac.new(
+        settings.secret_key.encode(), f"tg-webhook:{bot_id}".encode(), hashlib.sha256
+    ).hexdigest()
+
+
+def verify_secret(bot_id: uuid.UUID | str, provided: str | None) -> bool:
+    return hmac.compare_digest((provided or "").encode(), webhook_secret(bot_id).encode())
+
+
+class UpdateDeduplicator:
+    """
+    Первая доставка update_id — True, повтор — False. Redis общий для всех реплик API,
+    локальный LRU отсекает повторы без сетевого вызова и страхует, когда Redis недоступен.
+    """
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        self.local = LocalLRU(maxsize=100_000, ttl=ttl)
+        self._redis_down_until = 0.0
+
+    async def first_delivery(self, bot_id: uuid.UUID | str, update_id: int) -> bool:
+        key = f"{bot_id}:{update_id}"
+        if self.local.get(key) is True:
+            return False
+        self.local.set(key, True)
+        if time.monotonic() < self._redis_down_until:
+            return True
+        try:
+            fresh = await get_redis().set(_DEDUPE_PREFIX + key, 1, nx=True, ex=self.ttl)
+        except (RedisError, OSError) as exc:
+            self._redis_down_until = time.monotonic() + _REDIS_BACKOFF
+            logger.warning("webhook: redis unavailable, local dedupe only: %s", exc)
+            return True
+        return bool(fresh)
+
+    async def forget(self, bot_id: uuid.UUID | str, update_id: int) -> None:
+        """Обработка не удалась: снять отметку, чтобы повтор Telegram не сочли дубликатом."""
+        key = f"{bot_id}:{update_id}"
+        self.local.pop(key)
+        if time.monotonic() < self._redis_down_until:
+            return
+        try:
+            await get_redis().delete(_DEDUPE_PREFIX + key)
+        except (RedisError, OSError) as exc:
+            self._redis_down_until = time.monotonic() + _REDIS_BACKOFF
+            logger.warning("webhook: failed to clear dedupe key %s: %s", key, exc)
+
+
+class BotRegistry:
+    """
+    bot_id → aiogram.Bot для вебхуков и потребителя стрима. Токен читается из БД и живёт
+    ttl секунд (смена токена/выключение бота подхватываются); HTTP-сессия общая.
+    """
+
+    def __init__(self, ttl: float = 60.0, api: TelegramAPIServer = PRODUCTION) -> None:
+        self.ttl = ttl
+        self.api = api
+        self._bots: dict[str, tuple[float, Bot | None]] = {}
+        self._session: AiohttpSession | None = None
+
+    @property
+    def session(self) -> AiohttpSession:
+        if self._session is None:
+            self._session = AiohttpSession(api=self.api)
+            self._session.middleware(TracingRequestMiddleware())
+        return self._session
+
+    def add(self, bot_id: uuid.UUID | str, token: str) -> Bot:
+        bot = Bot(
+            token=token,
+            session=self.session,
+            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+        )
+        self._bots[str(bot_id)] = (time.monotonic() + self.ttl, bot)
+        return bot
+
+    async def _load_token(self, bot_id: uuid.UUID | str) -> str | None:
+        stmt = select(BotRow.token).where(
+            BotRow.id == uuid.UUID(str(bot_id)), BotRow.is_active.is_(True)
+        )
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(stmt)).scalar_one_or_none()
+
+    async def get(self, bot_id: uuid.UUID | str) -> Bot | None:
+        cached = self._bots.get(str(bot_id))
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        token = await self._load_token(bot_id)
+        if token is not None:
+            if cached is not None and cached[1] is not None and cached[1].token == token:
+                self._bots[str(bot_id)] = (time.monotonic() + self.ttl, cached[1])
+                return cached[1]
+            try:
+                return self.add(bot_id, token)
+            except TokenValidationError:
+                logger.error("webhook: bot %s has a malformed token", bot_id)
+        # неизвестный/выключенный бот тоже кэшируется, чтобы не ходить в БД на каждый апдейт
+        self._bots[str(bot_id)] = (time.monotonic() + self.ttl, None)
+        return None
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def enqueue(bot_id: uuid.UUID | str, body: bytes) -> None:
+    """Режим stream: сырое тело апдейта в общий stream (длина ограничена приблизительно)."""
+    await get_redis().xadd(
+        UPDATES_STREAM,
+        {"bot_id": str(bot_id), "update": body},
+        maxlen=settings.tg_updates_stream_maxlen,
+        approximate=True,
+    )
+
+
+class StreamConsumer:
+    """
+    Читает UPDATES_STREAM группой CONSUMER_GROUP: пачка апдейтов уходит в планировщик
+    и подтверждается (XACK) после обработки. Сообщения упавших потребителей забираются
+    XAUTOCLAIM после claim_idle секунд простоя.
+
+    Порядок внутри чата сохраняется в пределах одного потребителя: пачка ставится в планировщик
+    в порядке stream. Группа раздаёт сообщения потребителям без учёта чата, а XAUTOCLAIM
+    возвращает их позже, поэтому при нескольких потребителях порядок апдейтов чата
+    не гарантирован.
+    """
+
+    def __init__(
+        self,
+        scheduler: ChatScheduler,
+        registry: BotRegistry,
+        batch: int = 100,
+        block: float = 5.0,
+        claim_idle: float = 60.0,
+    ) -> None:
+        self.scheduler = scheduler
+        self.registry = registry
+        self.batch = batch
+        self.block = block
+        self.claim_idle = claim_idle
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+        # свой клиент: общий с коротким socket_timeout не переживёт блокирующий XREADGROUP
+        self.redis = Redis.from_url(settings.redis_url, socket_timeout=block + 5.0)
+
+    async def ensure_group(self) -> None:
+        try:
+            await self.redis.xgroup_create(UPDATES_STREAM, CONSUMER_GROUP, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    async def _bot(self, bot_id: str) -> Bot | None:
+        try:
+            return await self.registry.get(bot_id)
+        except Exception:  # noqa: BLE001 — апдейты бота пропадут, но потребитель продолжит
+            logger.exception("stream: failed to load bot %s", bot_id)
+            return None
+
+    async def _wait(self, message_id: bytes, done: asyncio.Future[Any]) -> None:
+        try:
+            await done
+        except Exception:  # noqa: BLE001 — один апдейт не должен останавливать потребителя
+            logger.exception("stream: update %s failed", message_id)
+
+    async def process(self, messages: list[tuple[bytes, dict[bytes, bytes]]]) -> None:
+        if not messages:
+            return
+        # боты пачки — заранее: ожидание registry.get (промах кэша токенов) между submit
+        # переставило бы апдейты одного чата
+        bot_ids = {fields[b"bot_id"].decode() for _, fields in messages}
+        bots = dict(zip(bot_ids, await asyncio.gather(*map(self._bot, bot_ids))))
+        waiting = []
+        for message_id, fields in messages:
+            bot = bots[fields[b"bot_id"].decode()]
+            if bot is None:
+                logger.warning("stream: update for unknown bot %s dropped", fields[b"bot_id"])
+                continue
+            try:
+                update = Update.model_validate(json.loads(fields[b"update"]), context={"bot": bot})
+            except ValueError:
+                logger.exception("stream: update %s is malformed", message_id)
+                continue
+            done = await self.scheduler.submit(bot, update, wait=True)
+            assert done is not None
+            waiting.append(self._wait(message_id, done))
+        await asyncio.gather(*waiting)
+        await self.redis.xack(UPDATES_STREAM, CONSUMER_GROUP, *(m[0] for m in messages))
+
+    async def claim_stale(self) -> None:
+        _, messages, *_ = await self.redis.xautoclaim(
+            UPDATES_STREAM,
+            CONSUMER_GROUP,
+            self.name,
+            min_idle_time=int(self.claim_idle * 1000),
+            count=self.batch,
+        )
+        await self.process(messages)
+
+    async def run(self) -> None:
+        await self.ensure_group()
+        logger.info("stream: consumer %s reading %s", self.name, UPDATES_STREAM)
+        last_claim = 0.0
+        try:
+            while True:
+                try:
+                    if time.monotonic() - last_claim > self.claim_idle:
+                        await self.claim_stale()
+                        last_claim = time.monotonic()
+                    response = await self.redis.xreadgroup(
+                        CONSUMER_GROUP,
+                        self.name,
+                        {UPDATES_STREAM: ">"},
+                        count=self.batch,
+                        block=int(self.block * 1000),
+                    )
+                    for _, messages in response or []:
+                        await self.process(messages)
+                except (RedisError, OSError) as exc:
+                    logger.warning("stream: redis error, retrying: %s", exc)
+                    await asyncio.sleep(_REDIS_BACKOFF)
+        finally:
+            await self.redis.aclose()
+            await self.registry.close()
+
+
+async def set_webhooks(base_url: str, dp: Dispatcher) -> None:
+    """setWebhook для всех активных ботов с токеном: URL по bot_id и его секрет."""
+    stmt = select(BotRow.id, BotRow.token).where(
+        BotRow.is_active.is_(True), BotRow.token.is_not(None)
+    )
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(stmt)).all()
+    registry = BotRegistry()
+    try:
+        for row in rows:
+            bot = registry.add(row.id, row.token)
+            await bot.set_webhook(
+                url=f"{base_url.rstrip('/')}/api/v1/telegram/webhook/{row.id}",
+                secret_token=webhook_secret(row.id),
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info("webhook: registered bot %s", row.id)
+    finally:
+        await registry.close()
+
+
+registry = BotRegistry()
+deduplicator = UpdateDeduplicator(settings.tg_update_dedupe_ttl)
+
+
+if __name__ == "__main__":
+    from app.adapters.telegram.bot import dp
+
+    if not settings.tg_webhook_base_url:
+        raise SystemExit("TG_WEBHOOK_BASE_URL is empty")
+    asyncio.run(set_webhooks(settings.tg_webhook_base_url, dp))
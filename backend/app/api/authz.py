@@ -0,0 +1,142 @@
+"""
+Проверка ролей в организации (owner > admin > member) по X-User-ID.
+
+Роль берётся из индекса членств пользователя {org_id: role} — одна запись кэша сущностей
+(app.services.cache: LRU процесса → Redis → Postgres) на пользователя, поэтому проверка
+на попадании в кэш не ходит ни в Redis, ни в БД. Любая правка членств пользователя
+обязана вызвать invalidate_roles — иначе отозванная роль проживёт до TTL кэша. Индекс
+кэшируется в строгом режиме (EntityCache, strict=True): загрузка, начатая до отзыва,
+не вернёт старую роль в кэш, а без Redis роли читаются прямо из Postgres.
+
+AUTHZ_ENABLED=false (по умолчанию) — проверки выключены, API ведёт себя как раньше.
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Literal
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import DbSession
+from app.core.config import settings
+from app.core.metrics import AUTHZ_CHECK
+from app.db.filters import any_of
+from app.db.models.org_user import OrgUser
+from app.services.cache import entity_cache
+
+Role = Literal["member", "admin", "owner"]
+ROLE_RANK: dict[str, int] = {"member": 1, "admin": 2, "owner": 3}
+_ENTITY = "org_roles"
+
+
+async def roles_of(db: AsyncSession, user_id: uuid.UUID) -> dict[str, str]:
+    """Индекс членств пользователя: {organization_id: role}."""
+
+    async def load() -> dict[str, str]:
+        # только с primary: отозванная на реплике позже роль прожила бы в кэше весь TTL
+        stmt = select(OrgUser.organization_id, OrgUser.role).where(OrgUser.user_id == user_id)
+        rows = await db.execute(stmt, bind_arguments={"primary": True})
+        return {str(org_id): role for org_id, role in rows.all()}
+
+    return await entity_cache.get_or_load(_ENTITY, user_id, load, strict=True) or {}
+
+
+def cached_roles(user_id: uuid.UUID) -> dict[str, str] | None:
+    """Индекс членств из LRU процесса; None — его там нет (или строгий кэш сейчас не читается)."""
+    return entity_cache.peek(_ENTITY, user_id, strict=True)  # type: ignore[no-any-return]
+
+
+async def invalidate_roles(*user_ids: uuid.UUID) -> None:
+    await entity_cache.invalidate(_ENTITY, *user_ids, strict=True)
+
+
+def change_role(*roles: str | None) -> Role:
+    """Роль для правки членства со старой/новой ролью roles: owner выдаёт и снимает только owner."""
+    return "owner" if "owner" in roles else "admin"
+
+
+def required_roles(
+    changes: Iterable[tuple[uuid.UUID, str | None, str | None]],
+) -> dict[uuid.UUID, Role]:
+    """Пачка правок (org_id, старая роль, новая роль) — какая роль нужна в каждой организации."""
+    required: dict[uuid.UUID, Role] = {}
+    for org_id, old, new in changes:
+        if required.get(org_id) != "owner":
+            required[org_id] = change_role(old, new)
+    return required
+
+
+async def lock_owners(
+    db: AsyncSession, org_ids: Iterable[uuid.UUID]
+) -> dict[uuid.UUID, set[uuid.UUID]]:
+    """
+    Владельцы организаций {org_id: {user_id}} под FOR UPDATE до commit: две одновременные
+    правки не снимут каждая «не последнего» owner и не оставят организацию без владельца.
+    """
+    stmt = (
+        select(OrgUser.organization_id, OrgUser.user_id)
+        .where(any_of(OrgUser.organization_id, org_ids), OrgUser.role == "owner")
+        .with_for_update()
+    )
+    owners: dict[uuid.UUID, set[uuid.UUID]] = {}
+    for org_id, user_id in (await db.execute(stmt)).all():
+        owners.setdefault(org_id, set()).add(user_id)
+    return owners
+
+
+def current_user_id(request: Request) -> uuid.UUID:
+    raw = request.headers.get("x-user-id")
+    if not raw:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="X-User-ID required")
+    try:
+        return uuid.UUID(raw)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid X-User-ID")
+
+
+async def authorize(
+    request: Request, db: AsyncSession, org_id: uuid.UUID | None, role: Role
+) -> None:
+    """
+    403, если у пользователя запроса нет в org_id роли не ниже role. org_id=None —
+    сущность ещё без организации (не привязанный бот): достаточно X-User-ID.
+    """
+    if not settings.authz_enabled:
+        return
+    user_id = current_user_id(request)
+    if org_id is None:
+        return
+    started = time.perf_counter()
+    roles = await roles_of(db, user_id)
+    allowed = ROLE_RANK.get(roles.get(str(org_id), ""), 0) >= ROLE_RANK[role]
+    AUTHZ_CHECK.labels("allowed" if allowed else "denied").observe(time.perf_counter() - started)
+    if not allowed:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"{role} role required")
+
+
+async def authorize_scope(
+    request: Request, db: AsyncSession, org_id: uuid.UUID | None, role: Role
+) -> None:
+    """
+    authorize для выборки по фильтру организации (выгрузки): без фильтра — данные всех
+    организаций, поэтому при включённых проверках organization_id обязателен.
+    """
+    if settings.authz_enabled and org_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="organization_id required"
+        )
+    await authorize(request, db, org_id, role)
+
+
+def require_org_role(role: Role, param: str = "org_id") -> Callable[..., Awaitable[None]]:
+    """Зависимость маршрута с организацией в пути: Depends(require_org_role("admin"))."""
+
+    async def dependency(request: Request, db: DbSession) -> None:
+        await authorize(request, db, uuid.UUID(str(request.path_params[param])), role)
+
+    return dependency
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import uuid
+from collections.abc import Sequence
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.export import columns_for
+from app.core.config import settings
+from app.db.filters import any_of
+from app.db.routing import READ_ONLY
+
+
+async def batch_get(
+    db: AsyncSession, model: Any, schema: type[BaseModel], ids: Sequence[uuid.UUID]
+) -> Any:
+    """
+    Сущности по списку id одним запросом (id = ANY(:ids)): элементы — в порядке запроса,
+    отсутствующие id — в missing. POST, но чистое чтение — идёт на реплику, как GET списков.
+    """
+    wanted = list(dict.fromkeys(ids))
+    db.info[READ_ONLY] = True
+    stmt = select(*columns_for(model, schema)).where(any_of(model.id, wanted))
+    found = {row.id: row for row in (await db.execute(stmt)).all()}
+    items = [found[id_] for id_ in wanted if id_ in found]
+    missing = [id_ for id_ in wanted if id_ not in found]
+    if not settings.api_fast_json:
+        return {"items": items, "missing": missing}
+    # как page_response: строки — сразу в orjson, без повторной валидации
+    return ORJSONResponse({"items": [row._asdict() for row in items], "missing": missing})
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+from collections.abc import Awaitable, Callable, Hashable, Sequence
+from itertools import islice
+from typing import Any
+
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Row
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.schemas.bulk import BulkResult, BulkRowResult
+from app.db.upserts import UPSERT_BATCH
+
+MAX_BULK_ROWS = 100_000
+
+Writer = Callable[[AsyncSession, Sequence[dict[str, Any]]], Awaitable[Sequence[Row[Any]]]]
+
+
+async def read_rows(request: Request) -> list[Any]:
+    """Тело запроса → список сырых строк: JSON-массив (или {"items": [...]}), NDJSON или CSV."""
+    content_type = request.headers.get("content-type", "application/json")
+    content_type = content_type.split(";")[0].strip().lower()
+    body = await request.body()
+    try:
+        if content_type == "text/csv":
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            # пустая ячейка CSV = поле не передано
+            rows: Any = [{k: v for k, v in row.items() if v != ""} for row in reader]
+        elif content_type in ("application/x-ndjson", "application/jsonl"):
+            rows = [json.loads(line) for line in body.splitlines() if line.strip()]
+        elif content_type == "application/json":
+            rows = json.loads(body)
+            if isinstance(rows, dict):
+                rows = rows["items"]
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="expected application/json, application/x-ndjson or text/csv",
+            )
+    except (ValueError, KeyError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="malformed payload")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="expected a list")
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"at most {MAX_BULK_ROWS} rows per request",
+        )
+    return rows
+
+
+def _error(index: int, message: str) -> BulkRowResult:
+    return BulkRowResult(index=index, status="error", error=message)
+
+
+def validate_rows(
+    rows: list[Any], schema: type[BaseModel], key: Callable[[dict[str, Any]], Hashable]
+) -> tuple[dict[Hashable, tuple[dict[str, Any], list[int]]], dict[int, BulkRowResult]]:
+    """
+    Валидирует строки и схлопывает дубликаты по ключу (побеждает последняя):
+    ON CONFLICT DO UPDATE не может дважды тронуть одну строку в одном запросе.
+    """
+    keyed: dict[Hashable, tuple[dict[str, Any], list[int]]] = {}
+    errors: dict[int, BulkRowResult] = {}
+    for index, raw in enumerate(rows):
+        try:
+            values = schema.model_validate(raw).model_dump()
+        except ValidationError as exc:
+            first = exc.errors()[0]
+            errors[index] = _error(index, f"{'.'.join(map(str, first['loc']))}: {first['msg']}")
+            continue
+        k = key(values)
+        indices = keyed[k][1] if k in keyed else []
+        indices.append(index)
+        keyed[k] = (values, indices)
+    return keyed, errors
+
+
+async def run_bulk(
+    db: AsyncSession,
+    total: int,
+    keyed: dict[Hashable, tuple[dict[str, Any], list[int]]],
+    errors: dict[int, BulkRowResult],
+    write: Writer,
+    key: Callable[[Row[Any]], Hashable],
+    atomic: bool = False,
+) -> BulkResult:
+    """
+    Пишет пачками по UPSERT_BATCH, коммит на пачку; ошибка БД валит только свою пачку.
+    atomic=True — все пачки в одной транзакции и ошибка валит все: блокировки, взятые
+    до run_bulk (lock_owners), держатся до конца записи, а проверка, сделанная под ними
+    для всего запроса, не разойдётся с частично записанным результатом.
+    """
+    results: dict[int, BulkRowResult] = dict(errors)
+    items = iter(keyed.items())
+    written: list[tuple[list[Any], Sequence[Row[Any]]]] = []
+    while batch := list(islice(items, UPSERT_BATCH)):
+        try:
+            rows = await write(db, [values for _, (values, _) in batch])
+            if not atomic:
+                await db.commit()
+        except DBAPIError as exc:
+            await db.rollback()
+            message = str(exc.orig).splitlines()[0] if exc.orig else "database error"
+            # atomic: откатилось и записанное до этой пачки — ошибка у каждой строки запроса
+            failed = keyed.items() if atomic else batch
+            for _, (_, indices) in failed:
+                results.update((i, _error(i, message)) for i in indices)
+            if atomic:
+                written.clear()
+                break
+            continue
+        written.append((batch, rows))
+    if atomic and written:
+        await db.commit()
+
+    for batch, rows in written:
+        by_key = {key(row): row for row in rows}
+        for k, (_, indices) in batch:
+            row = by_key[k]
+            row_status = "created" if row.inserted else "updated"
+            results.update(
+                (i, BulkRowResult(index=i, status=row_status, id=row.id)) for i in indices
+            )
+
+    ordered = [results[i] for i in range(total)]
+    return BulkResult(
+        created=sum(r.status == "created" for r in ordered),
+        updated=sum(r.status == "updated" for r in ordered),
+        errors=sum(r.status == "error" for r in ordered),
+        results=ordered,
+    )
@@ -1,19 +1,53 @@
 from __future__ import annotations
 
-from typing import Iterator
+import uuid
+from collections.abc import AsyncIterator
+from typing import Annotated
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import _build_sync_url  # у тебя уже есть
+from app.db.models.bot import Bot
+from app.db.routing import READ_ONLY
+from app.db.session import AsyncSessionLocal
 
-_engine = create_engine(_build_sync_url(), future=True)
-_SessionLocal = sessionmaker(bind=_engine, expire_on_commit=False, future=True)
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
 
 
-def get_db() -> Iterator[Session]:
-    db = _SessionLocal()
-    try:
+def use_replicas(request: Request) -> None:
+    """
+    Зависимость уровня роутера: APIRouter(dependencies=[Depends(use_replicas)]).
+    Безопасные запросы такого роутера читают с read-реплик (если они настроены).
+    """
+    request.state.db_replicas = True
+
+
+async def get_db(request: Request) -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        if request.method in SAFE_METHODS and getattr(request.state, "db_replicas", False):
+            db.info[READ_ONLY] = True
         yield db
-    finally:
-        db.close()
+
+
+DbSession = Annotated[AsyncSession, Depends(get_db)]
+
+__all__ = ["DbSession", "get_db", "use_replicas"]
+
+
+async def require_sendable_bot(db: AsyncSession, bot_id: uuid.UUID) -> uuid.UUID | None:
+    """
+    Бот есть (иначе 404), активен и с токеном (иначе 409) — ему можно отправлять сообщения.
+    Возвращает организацию бота: по ней доставка встаёт в справедливую очередь.
+    """
+    stmt = select(
+        Bot.is_active, Bot.token.is_not(None).label("has_token"), Bot.organization_id
+    ).where(Bot.id == bot_id)
+    row = (await db.execute(stmt)).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="bot not found")
+    if not (row.is_active and row.has_token):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="bot is inactive or has no token"
+        )
+    return row.organization_id
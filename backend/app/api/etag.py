@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import hashlib
+from collections.abc import Iterable, Mapping
+from datetime import datetime, timezone
+from typing import Any
+
+from fastapi import HTTPException, Request, Response, status
+
+
+def _canon(value: Any) -> str:
+    # один и тот же момент времени должен давать одну строку: из БД приходит datetime
+    # в таймзоне сессии, из кэша — ISO-строка от pydantic ("Z" вместо "+00:00")
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value.isoformat()
+    return str(value)
+
+
+def _digest(parts: tuple[Any, ...]) -> str:
+    return hashlib.blake2b("|".join(map(_canon, parts)).encode(), digest_size=8).hexdigest()
+
+
+def weak_etag(*parts: Any) -> str:
+    return f'W/"{_digest(parts)}"'
+
+
+def strong_etag(*parts: Any) -> str:
+    return f'"{_digest(parts)}"'
+
+
+def _get(item: Any, name: str) -> Any:
+    return item[name] if isinstance(item, Mapping) else getattr(item, name)
+
+
+def entity_etag(item: Any) -> str:
+    """
+    Сильный ETag сущности по (id, updated_at) — ORM-объект или dict из кэша. Пара однозначно
+    определяет версию строки, а If-Match по RFC 9110 сравнивает только сильные теги.
+    """
+    return strong_etag(_get(item, "id"), _get(item, "updated_at"))
+
+
+def page_etag(items: Iterable[Any], cursor: str | None, limit: int) -> str:
+    """ETag страницы списка: max(updated_at) + count (+ позиция страницы)."""
+    stamps = [_canon(_get(item, "updated_at")) for item in items]
+    return weak_etag(max(stamps, default=""), len(stamps), cursor, limit)
+
+
+def _matches(header: str, etag: str, *, strong: bool = False) -> bool:
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    if strong:
+        # сильное сравнение (RFC 9110 §8.8.3.2) — для If-Match: слабые теги не совпадают ни с чем
+        return not etag.startswith("W/") and etag in tags
+    # слабое сравнение — для If-None-Match: префикс W/ не учитываем
+    opaque = etag.removeprefix("W/")
+    return any(tag.removeprefix("W/") == opaque for tag in tags)
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """
+    Ставит ETag на ответ; если If-None-Match совпал — возвращает готовый 304,
+    и хендлер отдаёт его как есть, без сериализации тела.
+    """
+    header = request.headers.get("if-none-match")
+    if header is not None and _matches(header, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
+
+def require_match(request: Request, etag: str) -> None:
+    """If-Match для PATCH: оптимистичная блокировка, 412 если объект уже изменили."""
+    header = request.headers.get("if-match")
+    if header is not None and not _matches(header, etag, strong=True):
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED, detail="resource was modified"
+        )
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable
+from typing import Any, TypeVar
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql.base import ExecutableOption
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def expand_query(*allowed: str) -> Callable[..., frozenset[str]]:
+    """
+    Зависимость ?expand=organization,user: какие связи отдать вместе с сущностью.
+    Неизвестное имя — 400, чтобы опечатка не превращалась молча в пустое поле.
+    """
+
+    def dependency(
+        expand: str | None = Query(
+            default=None, description=f"связи через запятую: {', '.join(allowed)}"
+        ),
+    ) -> frozenset[str]:
+        names = frozenset(name.strip() for name in (expand or "").split(",") if name.strip())
+        unknown = names - set(allowed)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"unknown expand: {', '.join(sorted(unknown))}",
+            )
+        return names
+
+    return dependency
+
+
+def expand_options(model: Any, names: Iterable[str]) -> list[ExecutableOption]:
+    """
+    selectinload на каждую связь: один добавочный SELECT ... WHERE id IN (...) на связь,
+    сколько бы строк ни было на странице.
+    """
+    return [selectinload(getattr(model, name)) for name in sorted(names)]
+
+
+def expanded(schema: type[M], obj: Any, names: Iterable[str]) -> M:
+    """
+    Схема с развёрнутыми связями из ORM-объекта: читаются только связи из names (их загрузил
+    expand_options), остальные остаются незаданными. Связи с lazy="raise" нельзя отдавать
+    в schema.model_validate(obj) — валидация прочитает каждую и упадёт на незагруженной.
+    """
+    skipped = set(inspect(obj).mapper.relationships.keys()) - set(names)
+    data = {field: getattr(obj, field) for field in schema.model_fields if field not in skipped}
+    return schema.model_validate(data)
@@ -0,0 +1,283 @@
+"""
+Idempotency-Key для POST/PATCH: автоматика повторяет запросы по таймауту, и без ключа повтор
+создаёт дубликат (у users без tg_user_id нет уникальности) или стоит транзакции ради 409.
+
+- запрос с заголовком Idempotency-Key выполняется один раз; ответ (статус, заголовки, тело)
+  и отпечаток запроса (метод, путь, query, тело) лежат в Redis IDEMPOTENCY_TTL секунд;
+- повтор с тем же ключом получает сохранённый ответ с Idempotent-Replayed: true — без хендлера
+  и без Postgres; тот же ключ с другим запросом — 422;
+- одновременные дубликаты схлопываются замком (SET NX): второй ждёт ответа первого
+  до IDEMPOTENCY_LOCK_TIMEOUT секунд, дольше — 409. Замок продлевается, пока хендлер работает,
+  поэтому долгий запрос не выполнится второй раз; замок упавшего процесса истекает за _LOCK_TTL;
+- 5xx не сохраняется: повтор выполнит запрос заново. Redis недоступен — запрос выполняется
+  как без ключа.
+Ключи разделены по X-User-ID: ключ одного клиента не отдаёт ответ другому.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+
+import orjson
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+from redis.exceptions import RedisError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import IDEMPOTENCY_REQUESTS
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+HEADER = b"idempotency-key"
+REPLAYED = (b"idempotent-replayed", b"true")
+_METHODS = frozenset({"POST", "PATCH"})
+_KEY_MAX = 255
+_RECORD = "ttq:idem:{}:{}"
+_LOCK = "ttq:idem:{}:{}:lock"
+_POLL = 0.05
+# срок замка; владелец продлевает его каждую треть срока, пока выполняется хендлер
+_LOCK_TTL = 30.0
+
+# KEYS: замок; ARGV: токен владельца — снять только свой замок
+_UNLOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS: замок; ARGV: токен владельца, срок (мс) — продлить только свой замок
+_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class _InProgress(Exception):
+    """Первый запрос с этим ключом не ответил за lock_timeout."""
+
+
+def _fingerprint(scope: Scope, body: bytes) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (scope["method"].encode(), scope["path"].encode(), scope["query_string"], body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest().encode()
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    return b"".join(chunks)
+
+
+class IdempotencyMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        redis: Redis | None = None,
+        ttl: int = 86400,
+        lock_timeout: float = 10.0,
+    ) -> None:
+        self.app = app
+        # клиент — лениво, в event loop приложения (или явный, в тестах)
+        self._redis = redis
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self._unlock: AsyncScript | None = None
+        self._renew: AsyncScript | None = None
+
+    @property
+    def redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = get_redis()
+        return self._redis
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in _METHODS:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        key = headers.get(HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > _KEY_MAX:
+            await JSONResponse(
+                {"detail": "Idempotency-Key must be 1-255 characters"}, status_code=400
+            )(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            # тело уже прочитано: отдаём его хендлеру, дальше — исходный канал (disconnect)
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        owner = headers.get(b"x-user-id", b"-").decode("latin-1")
+        record_key = _RECORD.format(owner, key.decode("latin-1"))
+        lock_key = _LOCK.format(owner, key.decode("latin-1"))
+        fingerprint = _fingerprint(scope, body)
+        token = uuid.uuid4().hex
+
+        try:
+            record = await self._wait_or_lock(record_key, lock_key, token)
+        except _InProgress:
+            IDEMPOTENCY_REQUESTS.labels("in_progress").inc()
+            await JSONResponse(
+                {"detail": "a request with this Idempotency-Key is still in progress"},
+                status_code=409,
+            )(scope, replay_receive, send)
+            return
+        except (RedisError, OSError) as exc:
+            logger.warning("idempotency: redis unavailable, executing without key: %s", exc)
+            await self.app(scope, replay_receive, send)
+            return
+
+        if record is not None:
+            await self._replay(record, fingerprint, scope, replay_receive, send)
+        else:
+            await self._execute(
+                scope, replay_receive, send, record_key, lock_key, token, fingerprint
+            )
+
+    async def _wait_or_lock(
+        self, record_key: str, lock_key: str, token: str
+    ) -> dict[bytes, bytes] | None:
+        """Сохранённый ответ или None — замок наш и запрос выполняем мы."""
+        # lock_timeout — сколько ждут дубликаты; срок самого замка от него не зависит
+        deadline = time.monotonic() + self.lock_timeout
+        lock_ms = int(_LOCK_TTL * 1000)
+        while True:
+            record = await self.redis.hgetall(record_key)
+            if record:
+                return record
+            if await self.redis.set(lock_key, token, nx=True, px=lock_ms):
+                # ответ мог появиться между HGETALL и SET: тогда выполнять не нужно
+                record = await self.redis.hgetall(record_key)
+                if record:
+                    await self._release(lock_key, token)
+                    return record
+                return None
+            if time.monotonic() >= deadline:
+                raise _InProgress
+            await asyncio.sleep(_POLL)
+
+    async def _keep_lock(self, lock_key: str, token: str) -> None:
+        """Фоновая задача на время хендлера: продлевать замок, пока он наш."""
+        if self._renew is None:
+            self._renew = self.redis.register_script(_RENEW)
+        while True:
+            await asyncio.sleep(_LOCK_TTL / 3)
+            try:
+                if not await self._renew(keys=[lock_key], args=[token, int(_LOCK_TTL * 1000)]):
+                    return
+            except (RedisError, OSError) as exc:
+                logger.warning("idempotency: failed to renew lock: %s", exc)
+
+    async def _release(self, lock_key: str, token: str) -> None:
+        if self._unlock is None:
+            self._unlock = self.redis.register_script(_UNLOCK)
+        await self._unlock(keys=[lock_key], args=[token])
+
+    async def _replay(
+        self,
+        record: dict[bytes, bytes],
+        fingerprint: bytes,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+    ) -> None:
+        if record[b"fp"] != fingerprint:
+            IDEMPOTENCY_REQUESTS.labels("mismatch").inc()
+            await JSONResponse(
+                {"detail": "Idempotency-Key was used with a different request"}, status_code=422
+            )(scope, receive, send)
+            return
+        IDEMPOTENCY_REQUESTS.labels("replayed").inc()
+        headers = [
+            (name.encode("latin-1"), value.encode("latin-1"))
+            for name, value in orjson.loads(record[b"headers"])
+        ]
+        await send(
+            {
+                "type": "http.response.start",
+                "status": int(record[b"status"]),
+                "headers": [*headers, REPLAYED],
+            }
+        )
+        await send({"type": "http.response.body", "body": record.get(b"body", b"")})
+
+    async def _execute(
+        self,
+        scope: Scope,
+        receive: Receive,
+        send: Send,
+        record_key: str,
+        lock_key: str,
+        token: str,
+        fingerprint: bytes,
+    ) -> None:
+        start: Message | None = None
+        chunks: list[bytes] = []
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        IDEMPOTENCY_REQUESTS.labels("executed").inc()
+        keeper = asyncio.create_task(self._keep_lock(lock_key, token))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            keeper.cancel()
+            try:
+                if start is not None and start["status"] < 500:
+                    await self._store(record_key, fingerprint, start, b"".join(chunks))
+                await self._release(lock_key, token)
+            except (RedisError, OSError) as exc:
+                # замок истечёт сам; повтор выполнит запрос заново
+                logger.warning("idempotency: failed to store response: %s", exc)
+
+    async def _store(
+        self, record_key: str, fingerprint: bytes, start: Message, body: bytes
+    ) -> None:
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in start.get("headers", [])
+        ]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(
+                record_key,
+                mapping={
+                    "fp": fingerprint,
+                    "status": start["status"],
+                    "headers": orjson.dumps(headers),
+                    "body": body,
+                },
+            )
+            pipe.expire(record_key, self.ttl)
+            await pipe.execute()
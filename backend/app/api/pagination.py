@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import uuid
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Annotated, Any, TypeVar
+
+from fastapi import HTTPException, Query, status
+from sqlalchemy import Select, tuple_
+
+T = TypeVar("T")
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+Cursor = Annotated[str | None, Query(description="next_cursor из предыдущей страницы")]
+Limit = Annotated[int, Query(ge=1, le=MAX_LIMIT)]
+
+
+def encode_cursor(created_at: datetime, id_: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{id_}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, id_ = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(id_)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="invalid cursor")
+
+
+def keyset(stmt: Select[Any], model: Any, cursor: str | None, limit: int) -> Select[Any]:
+    """
+    Keyset-пагинация по (created_at, id) DESC: каждая страница — index range scan
+    по ix_<table>_created_at_id, без OFFSET. Берём limit + 1, чтобы понять, есть ли дальше.
+    """
+    if cursor:
+        created_at, id_ = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(model.created_at, model.id) < tuple_(created_at, id_))
+    return stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+def page_of(rows: Sequence[T], limit: int) -> tuple[list[T], str | None]:
+    items = list(rows[:limit])
+    if len(rows) <= limit:
+        return items, None
+    last: Any = items[-1]
+    return items, encode_cursor(last.created_at, last.id)
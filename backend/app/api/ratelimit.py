@@ -0,0 +1,183 @@
+"""
+Лимит запросов к API на организацию и группу маршрутов — чтобы один клиент, листающий списки
+в цикле, не забирал пул Postgres у остальных.
+
+- клиент — организация из X-Org-ID, только если пользователь X-User-ID в ней состоит; член
+  организаций без подходящего X-Org-ID — свой ключ пользователя; остальные — IP. Членство
+  берётся только из LRU процесса (индекс ролей app.api.authz, его заполняют проверки прав):
+  до проверки лимита нет ни Redis, ни Postgres, и поток запросов со случайными заголовками
+  не доходит до базы. Индекса в процессе нет — ключ IP. Заголовок сам по себе ключ не выбирает:
+  случайный X-Org-ID не обходит лимит и не тратит чужой;
+- группа — ресурс после /api/v1 (bots, users, organizations, ...); лимиты —
+  RATE_LIMIT_RULES="users=20:40,bots=50:100" (запросов в секунду : пачка), остальные группы —
+  RATE_LIMIT_RATE/RATE_LIMIT_BURST;
+- основной лимитер — GCRA в Redis (Lua, атомарно, время — Redis TIME): одно значение на ключ,
+  общее для всех процессов API;
+- Redis не ответил за RATE_LIMIT_REDIS_TIMEOUT — токен-бакет в процессе до восстановления
+  (лимит соблюдается на процесс, а не на кластер, зато запрос не ждёт Redis);
+- отказ — 429 с Retry-After; стоимость проверки — rate_limit_check_seconds по бэкенду.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+import uuid
+
+from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+from redis.exceptions import RedisError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.api.authz import cached_roles
+from app.core.metrics import RATE_LIMIT_CHECK, RATE_LIMIT_REJECTED
+from app.core.redis import get_redis
+from app.services.cache import LocalLRU
+
+_PREFIX = "/api/v1/"
+# вебхуки Telegram и health-check лимитом клиента не ограничиваем
+_EXEMPT = frozenset({"health", "telegram"})
+_KEY = "ttq:rl:{}:{}"
+_REDIS_BACKOFF = 5.0
+
+# GCRA. KEYS: ключ (теоретическое время прихода, мс); ARGV: интервал между запросами (мс),
+# допуск пачки (мс). Ответ: 0 — пропустить, иначе через сколько мс повторить (округление вверх:
+# дробный ответ Redis усёк бы до целого, и ожидание меньше 1 мс стало бы «пропустить»).
+_GCRA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local interval, tolerance = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local allow_at = tat - tolerance
+if now < allow_at then
+  return math.ceil(allow_at - now)
+end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now) + 1000)
+return 0
+"""
+
+
+def parse_rules(spec: str) -> dict[str, tuple[float, int]]:
+    rules: dict[str, tuple[float, int]] = {}
+    for item in spec.split(","):
+        group, sep, limit = item.partition("=")
+        if sep and group.strip():
+            rate, _, burst = limit.partition(":")
+            rules[group.strip()] = (float(rate), int(burst or max(1, math.ceil(float(rate)))))
+    return rules
+
+
+def route_group(path: str) -> str | None:
+    """Ресурс из /api/v1/<ресурс>/...; None — путь вне API или не лимитируется."""
+    if not path.startswith(_PREFIX):
+        return None
+    # /users/{id} и /users:batchGet — одна группа
+    group = path[len(_PREFIX) :].partition("/")[0].partition(":")[0]
+    return None if not group or group in _EXEMPT else group
+
+
+def client_key(headers: dict[bytes, bytes], scope: Scope) -> str:
+    raw_user = headers.get(b"x-user-id")
+    if raw_user:
+        try:
+            user_id = uuid.UUID(raw_user.decode("latin-1"))
+        except ValueError:
+            user_id = None
+        orgs = cached_roles(user_id) if user_id is not None else None
+        if orgs:
+            org = headers.get(b"x-org-id", b"").decode("latin-1")
+            return "org:" + org if org in orgs else "user:" + str(user_id)
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "-")
+
+
+class LocalBuckets:
+    """Токен-бакеты в памяти процесса — запасной лимитер на время недоступности Redis."""
+
+    def __init__(self, maxsize: int = 100_000) -> None:
+        # (токены, момент пополнения); давно неактивные ключи вытесняются LRU
+        self._buckets = LocalLRU(maxsize=maxsize, ttl=3600.0)
+
+    def acquire(self, key: str, rate: float, burst: int) -> float:
+        """0 — пропустить, иначе через сколько секунд повторить."""
+        now = time.monotonic()
+        cached = self._buckets.get(key)
+        tokens, updated = cached if isinstance(cached, tuple) else (float(burst), now)
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            return (1 - tokens) / rate
+        self._buckets.set(key, (tokens - 1, now))
+        return 0.0
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate: float = 50.0,
+        burst: int = 100,
+        rules: dict[str, tuple[float, int]] | None = None,
+        redis: Redis | None = None,
+        redis_timeout: float = 0.05,
+    ) -> None:
+        self.app = app
+        self.default = (rate, burst)
+        self.rules = dict(rules or {})
+        self._redis = redis
+        self.redis_timeout = redis_timeout
+        self.local = LocalBuckets()
+        self._script: AsyncScript | None = None
+        self._redis_down_until = 0.0
+
+    def limit_for(self, group: str) -> tuple[float, int]:
+        return self.rules.get(group, self.default)
+
+    async def _check_redis(self, key: str, rate: float, burst: int) -> float:
+        if self._script is None:
+            if self._redis is None:
+                self._redis = get_redis()
+            self._script = self._redis.register_script(_GCRA)
+        interval = 1000 / rate
+        wait_ms = await asyncio.wait_for(
+            self._script(keys=[key], args=[interval, interval * (burst - 1)]),
+            self.redis_timeout,
+        )
+        return wait_ms / 1000
+
+    async def check(self, key: str, rate: float, burst: int) -> float:
+        """0 — пропустить, иначе через сколько секунд повторить."""
+        started = time.perf_counter()
+        if time.monotonic() >= self._redis_down_until:
+            try:
+                wait = await self._check_redis(key, rate, burst)
+            except (RedisError, OSError, TimeoutError):
+                # медленный или недоступный Redis не должен тормозить каждый запрос
+                self._redis_down_until = time.monotonic() + _REDIS_BACKOFF
+            else:
+                RATE_LIMIT_CHECK.labels("redis").observe(time.perf_counter() - started)
+                return wait
+        wait = self.local.acquire(key, rate, burst)
+        RATE_LIMIT_CHECK.labels("local").observe(time.perf_counter() - started)
+        return wait
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        group = route_group(scope["path"]) if scope["type"] == "http" else None
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+        rate, burst = self.limit_for(group)
+        key = _KEY.format(group, client_key(dict(scope["headers"]), scope))
+        wait = await self.check(key, rate, burst)
+        if wait:
+            RATE_LIMIT_REJECTED.labels(group).inc()
+            await JSONResponse(
+                {"detail": "rate limit exceeded"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(wait)))},
+            )(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
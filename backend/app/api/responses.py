@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any
+
+from fastapi import Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import Row
+
+from app.core.config import settings
+
+DefaultResponse: type[JSONResponse] = ORJSONResponse if settings.api_fast_json else JSONResponse
+
+
+def page_response(response: Response, items: Sequence[Row[Any]], next_cursor: str | None) -> Any:
+    """
+    Тело страницы списка. В быстром режиме (API_FAST_JSON) строки уходят в orjson как есть:
+    без ORM-объектов и без повторной валидации через response_model. Заголовки, уже
+    выставленные на response (ETag), переносятся в готовый ответ.
+    """
+    if not settings.api_fast_json:
+        return {"items": items, "next_cursor": next_cursor}
+    return ORJSONResponse(
+        {"items": [row._asdict() for row in items], "next_cursor": next_cursor},
+        headers=dict(response.headers),
+    )
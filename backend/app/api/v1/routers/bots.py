@@ -3,31 +3,78 @@ from __future__ import annotations
 import uuid
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_db
-from app.api.v1.schemas.bot import BotCreate, BotRead, BotUpdate
+from app.api.authz import authorize, authorize_scope
+from app.api.batch import batch_get
+from app.api.deps import DbSession, require_sendable_bot, use_replicas
+from app.api.etag import entity_etag, not_modified, page_etag, require_match
+from app.api.expand import expand_options, expand_query
+from app.api.export import Format, Gzip, columns_for, export_response
+from app.api.pagination import DEFAULT_LIMIT, Cursor, Limit, keyset, page_of
+from app.api.responses import page_response
+from app.api.v1.schemas.batch import BatchGetRequest, BatchGetResult
+from app.api.v1.schemas.bot import BotCreate, BotExpanded, BotRead, BotUpdate
+from app.api.v1.schemas.message import MessageCreate, MessageQueued
+from app.api.v1.schemas.page import Page
 from app.db.models.bot import Bot
+from app.services import delivery
+from app.services.cache import cached_get, invalidate
 
-router = APIRouter(prefix="/bots", tags=["bots"])
+# GET-и дашборда читают с реплик (см. app.api.deps.use_replicas)
+router = APIRouter(prefix="/bots", tags=["bots"], dependencies=[Depends(use_replicas)])
 
+BotExpand = Annotated[frozenset[str], Depends(expand_query("organization"))]
 
-@router.get("", response_model=list[BotRead])
+
+@router.get("", response_model=Page[BotExpanded], response_model_exclude_unset=True)
 async def list_bots(
-    db: Annotated[AsyncSession, Depends(get_db)],
-    offset: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=200),
-) -> list[Bot]:
-    res = await db.execute(select(Bot).order_by(Bot.created_at.desc()).offset(offset).limit(limit))
-    return list(res.scalars().all())
+    request: Request,
+    response: Response,
+    db: DbSession,
+    cursor: Cursor = None,
+    limit: Limit = DEFAULT_LIMIT,
+    expand: BotExpand = frozenset(),
+) -> object:
+    if expand:
+        # ORM-объекты + по запросу на связь; без ETag — он не видит правок связанных сущностей
+        stmt = keyset(select(Bot).options(*expand_options(Bot, expand)), Bot, cursor, limit)
+        items, next_cursor = page_of((await db.execute(stmt)).scalars().all(), limit)
+        return {"items": items, "next_cursor": next_cursor}
+    stmt = keyset(select(*columns_for(Bot, BotRead)), Bot, cursor, limit)
+    items, next_cursor = page_of((await db.execute(stmt)).all(), limit)
+    if cached := not_modified(request, response, page_etag(items, cursor, limit)):
+        return cached
+    return page_response(response, items, next_cursor)
+
+
+@router.get("/export")
+async def export_bots(
+    request: Request,
+    db: DbSession,
+    organization_id: uuid.UUID | None = None,
+    fmt: Format = "ndjson",
+    gzip: Gzip = False,
+) -> StreamingResponse:
+    await authorize_scope(request, db, organization_id, "admin")
+    stmt = select(*columns_for(Bot, BotRead)).order_by(Bot.created_at, Bot.id)
+    if organization_id is not None:
+        stmt = stmt.where(Bot.organization_id == organization_id)
+    return export_response(stmt, fmt, gzip, "bots")
+
+
+@router.post(":batchGet", response_model=BatchGetResult[BotRead])
+async def batch_get_bots(payload: BatchGetRequest, db: DbSession) -> object:
+    """Боты по списку id одним запросом — вместо get_bot на каждый id."""
+    return await batch_get(db, Bot, BotRead, payload.ids)
 
 
 @router.post("", response_model=BotRead, status_code=status.HTTP_201_CREATED)
-async def create_bot(payload: BotCreate, db: Annotated[AsyncSession, Depends(get_db)]) -> Bot:
-    obj = Bot(id=uuid.uuid4(), username=payload.username)
+async def create_bot(payload: BotCreate, db: DbSession) -> Bot:
+    obj = Bot(id=uuid.uuid4(), username=payload.username, token=payload.token)
     db.add(obj)
     try:
         await db.commit()
@@ -38,21 +85,38 @@ async def create_bot(payload: BotCreate, db: Annotated[AsyncSession, Depends(get
     return obj
 
 
-@router.get("/{bot_id}", response_model=BotRead)
-async def get_bot(bot_id: uuid.UUID, db: Annotated[AsyncSession, Depends(get_db)]) -> Bot:
-    obj = await db.get(Bot, bot_id)
+@router.get("/{bot_id}", response_model=BotExpanded, response_model_exclude_unset=True)
+async def get_bot(
+    bot_id: uuid.UUID,
+    request: Request,
+    response: Response,
+    db: DbSession,
+    expand: BotExpand = frozenset(),
+) -> object:
+    if expand:
+        stmt = select(Bot).options(*expand_options(Bot, expand)).where(Bot.id == bot_id)
+        expanded = (await db.execute(stmt)).scalar_one_or_none()
+        if expanded is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
+        return expanded
+    obj = await cached_get(db, Bot, BotRead, bot_id)
     if not obj:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
+    if cached := not_modified(request, response, entity_etag(obj)):
+        return cached
     return obj
 
 
 @router.patch("/{bot_id}", response_model=BotRead)
 async def update_bot(
-    bot_id: uuid.UUID, payload: BotUpdate, db: Annotated[AsyncSession, Depends(get_db)]
+    bot_id: uuid.UUID, payload: BotUpdate, request: Request, response: Response, db: DbSession
 ) -> Bot:
-    obj = await db.get(Bot, bot_id)
+    # с If-Match держим строку до commit, иначе два PATCH пройдут проверку одновременно
+    obj = await db.get(Bot, bot_id, with_for_update="if-match" in request.headers)
     if not obj:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
+    await authorize(request, db, obj.organization_id, "admin")
+    require_match(request, entity_etag(obj))
 
     if payload.username is not None:
         obj.username = payload.username
@@ -62,21 +126,47 @@ async def update_bot(
         obj.is_active = active
 
     if payload.organization_id is not None:
+        # перенос бота — тоже админская операция в организации-получателе
+        if payload.organization_id != obj.organization_id:
+            await authorize(request, db, payload.organization_id, "admin")
         obj.organization_id = payload.organization_id
 
+    if payload.token is not None:
+        obj.token = payload.token
+
     try:
         await db.commit()
     except IntegrityError:
         await db.rollback()
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="username already exists")
+    await invalidate(Bot, bot_id)
     await db.refresh(obj)
+    response.headers["ETag"] = entity_etag(obj)
     return obj
 
 
 @router.delete("/{bot_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_bot(bot_id: uuid.UUID, db: Annotated[AsyncSession, Depends(get_db)]) -> Response:
+async def delete_bot(bot_id: uuid.UUID, request: Request, db: DbSession) -> Response:
     obj = await db.get(Bot, bot_id)
     if obj:
+        await authorize(request, db, obj.organization_id, "admin")
         await db.delete(obj)
         await db.commit()
+        await invalidate(Bot, bot_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post(
+    "/{bot_id}/messages", response_model=MessageQueued, status_code=status.HTTP_202_ACCEPTED
+)
+async def send_message(
+    bot_id: uuid.UUID, payload: MessageCreate, request: Request, db: DbSession
+) -> object:
+    """Поставить сообщение в outbox бота; доставка — воркером с учётом лимитов Telegram."""
+    org_id = await require_sendable_bot(db, bot_id)
+    await authorize(request, db, org_id, "member")
+    message = payload.model_dump(exclude_none=True)
+    if org_id is not None:
+        message["organization_id"] = str(org_id)
+    message_id = await delivery.enqueue(bot_id, message)
+    return {"id": message_id, "bot_id": bot_id}
@@ -1,13 +1,12 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter
 from sqlalchemy import text
-from sqlalchemy.orm import Session
 
-from app.db.session import get_db
+from app.api.deps import DbSession
 
 router = APIRouter()
 
 
 @router.get("/health/db")
-def db_health(db: Session = Depends(get_db)) -> dict[str, str]:
-    db.execute(text("SELECT 1"))
+async def db_health(db: DbSession) -> dict[str, str]:
+    await db.execute(text("SELECT 1"))
     return {"db": "ok"}
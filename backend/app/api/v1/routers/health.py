@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter
+from sqlalchemy import text
 
-from app.db.session import get_db
+from app.api.deps import DbSession
+from app.services.cache import entity_cache
 
 router = APIRouter()
 
@@ -12,5 +13,11 @@ async def health():
 
 
 @router.get("/health/db")
-async def health_db(db: AsyncSession = Depends(get_db)):
+async def health_db(db: DbSession):
+    await db.execute(text("SELECT 1"))
     return {"db": "ok"}
+
+
+@router.get("/health/cache")
+async def health_cache() -> dict[str, int]:
+    return entity_cache.snapshot()
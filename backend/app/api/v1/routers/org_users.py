@@ -1,50 +1,204 @@
 from __future__ import annotations
 
 import uuid
+from collections.abc import Hashable
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import delete, select
-from sqlalchemy.orm import Session
 
-from app.api.deps import get_db
-from app.api.v1.schemas.org_user import OrgUserCreate, OrgUserRead
+from app.api.authz import (
+    authorize,
+    authorize_scope,
+    change_role,
+    invalidate_roles,
+    lock_owners,
+    required_roles,
+)
+from app.api.bulk import read_rows, run_bulk, validate_rows
+from app.api.deps import DbSession, use_replicas
+from app.api.expand import expand_options, expand_query, expanded
+from app.api.export import Format, Gzip, columns_for, export_response
+from app.api.pagination import DEFAULT_LIMIT, Cursor, Limit, keyset, page_of
+from app.api.responses import page_response
+from app.api.v1.schemas.bulk import BulkResult, BulkRowResult, OrgUserUpsert
+from app.api.v1.schemas.org_user import OrgUserCreate, OrgUserExpanded, OrgUserRead
+from app.api.v1.schemas.page import Page
+from app.core.config import settings
+from app.db.filters import any_of
 from app.db.models.org_user import OrgUser
+from app.db.models.organization import Organization
+from app.db.models.user import User
+from app.db.upserts import upsert_memberships
 
-router = APIRouter(prefix="/org-users", tags=["org-users"])
+# GET-и дашборда читают с реплик (см. app.api.deps.use_replicas)
+router = APIRouter(prefix="/org-users", tags=["org-users"], dependencies=[Depends(use_replicas)])
 
+_LAST_OWNER = "organization must keep an owner"
 
-@router.get("", response_model=list[OrgUserRead])
-def list_org_users(db: Session = Depends(get_db)) -> list[OrgUser]:
-    res = db.execute(select(OrgUser).order_by(OrgUser.created_at.desc()))
-    return list(res.scalars().all())
+OrgUserExpand = Annotated[frozenset[str], Depends(expand_query("organization", "user"))]
+
+
+@router.get("", response_model=Page[OrgUserExpanded], response_model_exclude_unset=True)
+async def list_org_users(
+    response: Response,
+    db: DbSession,
+    cursor: Cursor = None,
+    limit: Limit = DEFAULT_LIMIT,
+    expand: OrgUserExpand = frozenset(),
+) -> object:
+    if expand:
+        # страница + по запросу на связь, сколько бы строк ни было на странице
+        stmt = keyset(
+            select(OrgUser).options(*expand_options(OrgUser, expand)), OrgUser, cursor, limit
+        )
+        rows, next_cursor = page_of((await db.execute(stmt)).scalars().all(), limit)
+        items = [expanded(OrgUserExpanded, row, expand) for row in rows]
+        return {"items": items, "next_cursor": next_cursor}
+    stmt = keyset(select(*columns_for(OrgUser, OrgUserRead)), OrgUser, cursor, limit)
+    items, next_cursor = page_of((await db.execute(stmt)).all(), limit)
+    return page_response(response, items, next_cursor)
+
+
+@router.get("/export")
+async def export_org_users(
+    request: Request,
+    db: DbSession,
+    organization_id: uuid.UUID | None = None,
+    fmt: Format = "ndjson",
+    gzip: Gzip = False,
+) -> StreamingResponse:
+    await authorize_scope(request, db, organization_id, "admin")
+    stmt = select(*columns_for(OrgUser, OrgUserRead)).order_by(OrgUser.created_at, OrgUser.id)
+    if organization_id is not None:
+        stmt = stmt.where(OrgUser.organization_id == organization_id)
+    return export_response(stmt, fmt, gzip, "org_users")
 
 
 @router.post("", response_model=OrgUserRead, status_code=status.HTTP_201_CREATED)
-def add_membership(payload: OrgUserCreate, db: Session = Depends(get_db)) -> OrgUser:
+async def add_membership(payload: OrgUserCreate, request: Request, db: DbSession) -> OrgUser:
+    # назначить owner может только owner
+    await authorize(request, db, payload.organization_id, change_role(payload.role))
     instance = OrgUser(**payload.model_dump())
     db.add(instance)
     try:
-        db.commit()
+        await db.commit()
     except Exception:
-        db.rollback()
+        await db.rollback()
         raise
-    db.refresh(instance)
+    await invalidate_roles(instance.user_id)
+    await db.refresh(instance)
     return instance
 
 
-@router.get("/{membership_id}", response_model=OrgUserRead)
-def get_membership(membership_id: uuid.UUID, db: Session = Depends(get_db)) -> OrgUser:
-    res = db.execute(select(OrgUser).where(OrgUser.id == membership_id))
+@router.post(":bulkUpsert", response_model=BulkResult)
+async def bulk_upsert_memberships(request: Request, db: DbSession) -> BulkResult:
+    """Массовое добавление членств по (organization_id, user_id); роль обновляется."""
+    rows = await read_rows(request)
+    keyed, errors = validate_rows(
+        rows, OrgUserUpsert, key=lambda v: (v["organization_id"], v["user_id"])
+    )
+
+    # Несуществующие org/user отсекаем заранее, иначе FK-ошибка уронит всю пачку
+    org_ids = {org_id for org_id, _ in keyed}
+    user_ids = {user_id for _, user_id in keyed}
+    known_orgs = set(
+        (await db.execute(select(Organization.id).where(any_of(Organization.id, org_ids))))
+        .scalars()
+        .all()
+    )
+    known_users = set(
+        (await db.execute(select(User.id).where(any_of(User.id, user_ids)))).scalars().all()
+    )
+    for org_id, user_id in list(keyed):
+        if org_id in known_orgs and user_id in known_users:
+            continue
+        _, indices = keyed.pop((org_id, user_id))
+        message = "organization not found" if org_id not in known_orgs else "user not found"
+        errors.update((i, BulkRowResult(index=i, status="error", error=message)) for i in indices)
+    if settings.authz_enabled:
+        await _authorize_bulk(request, db, keyed, errors)
+
+    result = await run_bulk(
+        db,
+        len(rows),
+        keyed,
+        errors,
+        upsert_memberships,
+        key=lambda r: (r.organization_id, r.user_id),
+        # проверка владельцев держит их строки FOR UPDATE — до записи последней пачки
+        atomic=settings.authz_enabled,
+    )
+    await invalidate_roles(*{user_id for _, user_id in keyed})
+    return result
+
+
+async def _authorize_bulk(
+    request: Request,
+    db: DbSession,
+    keyed: dict[Hashable, tuple[dict[str, Any], list[int]]],
+    errors: dict[int, BulkRowResult],
+) -> None:
+    """
+    Те же правила, что у одиночных правок: строка с role=owner или поверх членства owner
+    требует owner в организации, остальные — admin. Строки, после которых у организации
+    не осталось бы владельца, — ошибки.
+    """
+    owners = await lock_owners(db, {org_id for org_id, _ in keyed})
+    changes = [
+        (org_id, "owner" if user_id in owners.get(org_id, ()) else None, values["role"])
+        for (org_id, user_id), (values, _) in keyed.items()
+    ]
+    for org_id, role in required_roles(changes).items():
+        await authorize(request, db, org_id, role)
+
+    for org_id, current in owners.items():
+        after = {
+            user_id
+            for (row_org, user_id), (values, _) in keyed.items()
+            if row_org == org_id and values["role"] == "owner"
+        } | {user_id for user_id in current if (org_id, user_id) not in keyed}
+        if after:
+            continue
+        for user_id in current:
+            _, indices = keyed.pop((org_id, user_id))
+            errors.update(
+                (i, BulkRowResult(index=i, status="error", error=_LAST_OWNER)) for i in indices
+            )
+
+
+@router.get("/{membership_id}", response_model=OrgUserExpanded, response_model_exclude_unset=True)
+async def get_membership(
+    membership_id: uuid.UUID, db: DbSession, expand: OrgUserExpand = frozenset()
+) -> OrgUserRead:
+    stmt = select(OrgUser).options(*expand_options(OrgUser, expand))
+    res = await db.execute(stmt.where(OrgUser.id == membership_id))
     obj = res.scalar_one_or_none()
     if not obj:
         raise HTTPException(status_code=404, detail="Membership not found")
-    return obj
+    if not expand:
+        return OrgUserRead.model_validate(obj)
+    return expanded(OrgUserExpanded, obj, expand)
 
 
 @router.delete("/{membership_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
-def delete_membership(membership_id: uuid.UUID, db: Session = Depends(get_db)) -> Response:
-    res = db.execute(delete(OrgUser).where(OrgUser.id == membership_id))
+async def delete_membership(membership_id: uuid.UUID, request: Request, db: DbSession) -> Response:
+    stmt = select(OrgUser.organization_id, OrgUser.user_id, OrgUser.role).where(
+        OrgUser.id == membership_id
+    )
+    membership = (await db.execute(stmt)).one_or_none()
+    if membership is None:
+        raise HTTPException(status_code=404, detail="Membership not found")
+    # снять owner может только owner, и не последнего
+    await authorize(request, db, membership.organization_id, change_role(membership.role))
+    if settings.authz_enabled and membership.role == "owner":
+        owners = await lock_owners(db, [membership.organization_id])
+        if owners.get(membership.organization_id, set()) <= {membership.user_id}:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=_LAST_OWNER)
+    res = await db.execute(delete(OrgUser).where(OrgUser.id == membership_id))
     if res.rowcount == 0:
         raise HTTPException(status_code=404, detail="Membership not found")
-    db.commit()
+    await db.commit()
+    await invalidate_roles(membership.user_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
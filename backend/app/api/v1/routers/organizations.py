@@ -6,67 +6,112 @@ from fastapi import (  # ← добавили Response
     APIRouter,
     Depends,
     HTTPException,
-    Query,
+    Request,
     Response,
     status,
 )
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
 
-from app.api.deps import get_db
+from app.api.authz import current_user_id, invalidate_roles, require_org_role
+from app.api.batch import batch_get
+from app.api.deps import DbSession, use_replicas
+from app.api.etag import entity_etag, not_modified, page_etag, require_match
+from app.api.export import columns_for
+from app.api.pagination import DEFAULT_LIMIT, Cursor, Limit, keyset, page_of
+from app.api.responses import page_response
+from app.api.v1.schemas.batch import BatchGetRequest, BatchGetResult
 from app.api.v1.schemas.organization import OrganizationCreate, OrganizationRead, OrganizationUpdate
+from app.api.v1.schemas.page import Page
+from app.core.config import settings
+from app.db.models.org_user import OrgUser
 from app.db.models.organization import Organization
+from app.db.models.user import User
+from app.services.cache import cached_get, invalidate
 
-router = APIRouter(prefix="/organizations", tags=["organizations"])
+# GET-и дашборда читают с реплик (см. app.api.deps.use_replicas)
+router = APIRouter(
+    prefix="/organizations", tags=["organizations"], dependencies=[Depends(use_replicas)]
+)
 
 
-@router.get("", response_model=list[OrganizationRead])
-def list_organizations(
-    db: Session = Depends(get_db),
-    offset: int = Query(0, ge=0),
-    limit: int = Query(50, ge=1, le=200),
+@router.get("", response_model=Page[OrganizationRead])
+async def list_organizations(
+    request: Request,
+    response: Response,
+    db: DbSession,
+    cursor: Cursor = None,
+    limit: Limit = DEFAULT_LIMIT,
 ):
-    items = db.execute(select(Organization).offset(offset).limit(limit)).scalars().all()
-    return items
+    stmt = keyset(select(*columns_for(Organization, OrganizationRead)), Organization, cursor, limit)
+    items, next_cursor = page_of((await db.execute(stmt)).all(), limit)
+    if cached := not_modified(request, response, page_etag(items, cursor, limit)):
+        return cached
+    return page_response(response, items, next_cursor)
 
 
 @router.post("", response_model=OrganizationRead, status_code=status.HTTP_201_CREATED)
-def create_organization(payload: OrganizationCreate, db: Session = Depends(get_db)):
+async def create_organization(payload: OrganizationCreate, request: Request, db: DbSession):
     org = Organization(id=uuid4(), name=payload.name)
     db.add(org)
+    owner_id = current_user_id(request) if settings.authz_enabled else None
+    if owner_id is not None:
+        # создатель — owner: при включённых проверках иначе организацией некому управлять
+        if await db.get(User, owner_id) is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="unknown user")
+        db.add(OrgUser(id=uuid4(), organization_id=org.id, user_id=owner_id, role="owner"))
     try:
-        db.commit()
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="name already exists")
-    db.refresh(org)
+    if owner_id is not None:
+        await invalidate_roles(owner_id)
+    await db.refresh(org)
     return org
 
 
+@router.post(":batchGet", response_model=BatchGetResult[OrganizationRead])
+async def batch_get_organizations(payload: BatchGetRequest, db: DbSession) -> object:
+    """Организации по списку id одним запросом — вместо get_organization на каждый id."""
+    return await batch_get(db, Organization, OrganizationRead, payload.ids)
+
+
 @router.get("/{org_id}", response_model=OrganizationRead)
-def get_organization(org_id: UUID, db: Session = Depends(get_db)):
-    org = db.get(Organization, org_id)
+async def get_organization(org_id: UUID, request: Request, response: Response, db: DbSession):
+    org = await cached_get(db, Organization, OrganizationRead, org_id)
     if not org:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
+    if cached := not_modified(request, response, entity_etag(org)):
+        return cached
     return org
 
 
-@router.patch("/{org_id}", response_model=OrganizationRead)
-def update_organization(org_id: UUID, payload: OrganizationUpdate, db: Session = Depends(get_db)):
-    org = db.get(Organization, org_id)
+@router.patch(
+    "/{org_id}",
+    response_model=OrganizationRead,
+    dependencies=[Depends(require_org_role("admin"))],
+)
+async def update_organization(
+    org_id: UUID, payload: OrganizationUpdate, request: Request, response: Response, db: DbSession
+):
+    # с If-Match держим строку до commit, иначе два PATCH пройдут проверку одновременно
+    org = await db.get(Organization, org_id, with_for_update="if-match" in request.headers)
     if not org:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
+    require_match(request, entity_etag(org))
 
     if payload.name is not None:
         org.name = payload.name
 
     try:
-        db.commit()
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="name already exists")
-    db.refresh(org)
+    await invalidate(Organization, org_id)
+    await db.refresh(org)
+    response.headers["ETag"] = entity_etag(org)
     return org
 
 
@@ -74,12 +119,21 @@ def update_organization(org_id: UUID, payload: OrganizationUpdate, db: Session =
     "/{org_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     response_class=Response,  # ← ключевая строка
+    dependencies=[Depends(require_org_role("owner"))],
 )
-def delete_organization(org_id: UUID, db: Session = Depends(get_db)) -> Response:
+async def delete_organization(org_id: UUID, db: DbSession) -> Response:
     # Вариант 1: через ORM
-    org = db.get(Organization, org_id)
+    org = await db.get(Organization, org_id)
     if org:
-        db.delete(org)
-        db.commit()
+        # членства уйдут каскадом в БД — индексы ролей участников тоже устареют
+        members = (
+            (await db.execute(select(OrgUser.user_id).where(OrgUser.organization_id == org_id)))
+            .scalars()
+            .all()
+        )
+        await db.delete(org)
+        await db.commit()
+        await invalidate(Organization, org_id)
+        await invalidate_roles(*members)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
-    # Вариант 2 (эквивалентно): db.execute(delete(Organization).where(Organization.id == org_id)); db.commit(); return Response(status_code=204)
+    # Вариант 2 (эквивалентно): await db.execute(delete(Organization).where(Organization.id == org_id)); await db.commit(); return Response(status_code=204)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import uuid
+from datetime import UTC, datetime
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from app.api.authz import authorize
+from app.api.deps import DbSession, require_sendable_bot
+from app.api.v1.schemas.schedule import ScheduleCreate, ScheduleRead, ScheduleUpdate
+from app.services.schedule import ScheduledMessage, ScheduleInFlight, schedule_store
+
+# Отложенные публикации: хранятся в Redis (app.services.schedule), не в Postgres
+router = APIRouter(prefix="/schedules", tags=["schedules"])
+
+
+def _in_flight() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT, detail="schedule is already being delivered"
+    )
+
+
+async def _authorized(request: Request, db: DbSession, schedule_id: uuid.UUID) -> ScheduledMessage:
+    """Публикация (иначе 404), если пользователь состоит в организации её бота."""
+    item = await schedule_store().get(str(schedule_id))
+    if item is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
+    org_id = item.message.get("organization_id")
+    await authorize(request, db, uuid.UUID(org_id) if org_id else None, "member")
+    return item
+
+
+def _read(item: ScheduledMessage) -> dict[str, object]:
+    return {
+        **item.message,
+        "id": item.id,
+        "bot_id": item.bot_id,
+        "due_at": datetime.fromtimestamp(item.due_at, UTC),
+    }
+
+
+@router.post("", response_model=ScheduleRead, status_code=status.HTTP_201_CREATED)
+async def create_schedule(payload: ScheduleCreate, request: Request, db: DbSession) -> object:
+    org_id = await require_sendable_bot(db, payload.bot_id)
+    await authorize(request, db, org_id, "member")
+    message = payload.model_dump(exclude={"bot_id", "due_at"}, exclude_none=True)
+    if org_id is not None:
+        message["organization_id"] = str(org_id)
+    item = await schedule_store().add(str(payload.bot_id), payload.due_at.timestamp(), message)
+    return _read(item)
+
+
+@router.get("/{schedule_id}", response_model=ScheduleRead)
+async def get_schedule(schedule_id: uuid.UUID, request: Request, db: DbSession) -> object:
+    return _read(await _authorized(request, db, schedule_id))
+
+
+@router.patch("/{schedule_id}", response_model=ScheduleRead)
+async def update_schedule(
+    schedule_id: uuid.UUID, payload: ScheduleUpdate, request: Request, db: DbSession
+) -> object:
+    """Перенос и правка; 404 — публикация отменена или отправлена, 409 — уже отправляется."""
+    await _authorized(request, db, schedule_id)
+    message = payload.model_dump(exclude={"due_at"}, exclude_none=True)
+    due_at = payload.due_at.timestamp() if payload.due_at is not None else None
+    try:
+        item = await schedule_store().update(str(schedule_id), due_at, message)
+    except ScheduleInFlight:
+        raise _in_flight()
+    if item is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
+    return _read(item)
+
+
+@router.delete("/{schedule_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_schedule(schedule_id: uuid.UUID, request: Request, db: DbSession) -> Response:
+    """404 — публикации нет (отменена или отправлена), 409 — уже отправляется."""
+    await _authorized(request, db, schedule_id)
+    try:
+        cancelled = await schedule_store().cancel(str(schedule_id))
+    except ScheduleInFlight:
+        raise _in_flight()
+    if not cancelled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
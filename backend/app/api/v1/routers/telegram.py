@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import uuid
+
+import orjson
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from app.adapters.telegram.bot import dp
+from app.adapters.telegram.webhook import (
+    SECRET_HEADER,
+    deduplicator,
+    enqueue,
+    registry,
+    verify_secret,
+)
+from app.core.config import settings
+
+router = APIRouter(prefix="/telegram", tags=["telegram"])
+
+
+@router.post("/webhook/{bot_id}", include_in_schema=False)
+async def telegram_webhook(bot_id: uuid.UUID, request: Request) -> Response:
+    # секрет проверяем до разбора тела: чужие запросы не должны стоить ничего
+    if not verify_secret(bot_id, request.headers.get(SECRET_HEADER)):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="bad secret token")
+
+    body = await request.body()
+    try:
+        update = orjson.loads(body)
+        update_id = int(update["update_id"])
+    except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="invalid update")
+
+    if settings.tg_webhook_mode == "stream":
+        if await deduplicator.first_delivery(bot_id, update_id):
+            try:
+                await enqueue(bot_id, body)
+            except BaseException:
+                # 5xx — Telegram повторит доставку, и повтор должен пройти, а не считаться дубликатом
+                await deduplicator.forget(bot_id, update_id)
+                raise
+        return Response(status_code=status.HTTP_200_OK)
+
+    bot = await registry.get(bot_id)
+    if bot is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="bot not found")
+    # повтор (Telegram не дождался ответа) подтверждаем, но не обрабатываем;
+    # планировщик только ставит апдейт в очередь чата — ответ обработки не ждёт
+    if await deduplicator.first_delivery(bot_id, update_id):
+        try:
+            await dp.feed_raw_update(bot, update)
+        except BaseException:
+            await deduplicator.forget(bot_id, update_id)
+            raise
+    return Response(status_code=status.HTTP_200_OK)
@@ -2,57 +2,141 @@ from __future__ import annotations
 
 import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import delete, select
-from sqlalchemy.orm import Session
 
-from app.api.deps import get_db
+from app.api.authz import authorize_scope, invalidate_roles
+from app.api.batch import batch_get
+from app.api.bulk import read_rows, run_bulk, validate_rows
+from app.api.deps import DbSession, use_replicas
+from app.api.etag import entity_etag, not_modified, page_etag, require_match
+from app.api.export import Format, Gzip, columns_for, export_response
+from app.api.pagination import DEFAULT_LIMIT, Cursor, Limit, keyset, page_of
+from app.api.responses import page_response
+from app.api.v1.schemas.batch import BatchGetRequest, BatchGetResult
+from app.api.v1.schemas.bulk import BulkResult, UserUpsert
+from app.api.v1.schemas.organization import OrganizationMembership, OrganizationRead
+from app.api.v1.schemas.page import Page
 from app.api.v1.schemas.user import UserCreate, UserRead, UserUpdate
+from app.db.models.org_user import OrgUser
+from app.db.models.organization import Organization
 from app.db.models.user import User
+from app.db.upserts import upsert_users
+from app.services.cache import cached_get, invalidate
 
-router = APIRouter(prefix="/users", tags=["users"])
+# GET-и дашборда читают с реплик (см. app.api.deps.use_replicas)
+router = APIRouter(prefix="/users", tags=["users"], dependencies=[Depends(use_replicas)])
 
 
-@router.get("", response_model=list[UserRead])
-def list_users(db: Session = Depends(get_db)):
-    res = db.execute(select(User).order_by(User.created_at.desc()))
-    return res.scalars().all()
+@router.get("", response_model=Page[UserRead])
+async def list_users(
+    request: Request,
+    response: Response,
+    db: DbSession,
+    cursor: Cursor = None,
+    limit: Limit = DEFAULT_LIMIT,
+):
+    stmt = keyset(select(*columns_for(User, UserRead)), User, cursor, limit)
+    items, next_cursor = page_of((await db.execute(stmt)).all(), limit)
+    if cached := not_modified(request, response, page_etag(items, cursor, limit)):
+        return cached
+    return page_response(response, items, next_cursor)
+
+
+@router.get("/export")
+async def export_users(
+    request: Request,
+    db: DbSession,
+    organization_id: uuid.UUID | None = None,
+    fmt: Format = "ndjson",
+    gzip: Gzip = False,
+) -> StreamingResponse:
+    await authorize_scope(request, db, organization_id, "admin")
+    stmt = select(*columns_for(User, UserRead)).order_by(User.created_at, User.id)
+    if organization_id is not None:
+        stmt = stmt.join(OrgUser, OrgUser.user_id == User.id).where(
+            OrgUser.organization_id == organization_id
+        )
+    return export_response(stmt, fmt, gzip, "users")
 
 
 @router.post("", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-def create_user(payload: UserCreate, db: Session = Depends(get_db)):
+async def create_user(payload: UserCreate, db: DbSession):
     u = User(id=uuid.uuid4(), display_name=payload.display_name, tg_user_id=payload.tg_user_id)
     db.add(u)
-    db.commit()
-    db.refresh(u)
+    await db.commit()
+    await db.refresh(u)
     return u
 
 
+@router.post(":batchGet", response_model=BatchGetResult[UserRead])
+async def batch_get_users(payload: BatchGetRequest, db: DbSession) -> object:
+    """Пользователи по списку id одним запросом — вместо get_user на каждый id."""
+    return await batch_get(db, User, UserRead, payload.ids)
+
+
+@router.post(":bulkUpsert", response_model=BulkResult)
+async def bulk_upsert_users(request: Request, db: DbSession) -> BulkResult:
+    """Массовый импорт по tg_user_id: JSON-массив, NDJSON или CSV; результат — по каждой строке."""
+    rows = await read_rows(request)
+    keyed, errors = validate_rows(rows, UserUpsert, key=lambda v: v["tg_user_id"])
+    result = await run_bulk(db, len(rows), keyed, errors, upsert_users, key=lambda r: r.tg_user_id)
+    await invalidate(User, *{r.id for r in result.results if r.status == "updated"})
+    return result
+
+
 @router.get("/{user_id}", response_model=UserRead)
-def get_user(user_id: uuid.UUID, db: Session = Depends(get_db)):
-    u = db.get(User, user_id)
+async def get_user(user_id: uuid.UUID, request: Request, response: Response, db: DbSession):
+    u = await cached_get(db, User, UserRead, user_id)
     if not u:
         raise HTTPException(404, "User not found")
+    if cached := not_modified(request, response, entity_etag(u)):
+        return cached
     return u
 
 
+@router.get("/{user_id}/organizations", response_model=list[OrganizationMembership])
+async def list_user_organizations(user_id: uuid.UUID, db: DbSession) -> object:
+    """Организации пользователя с его ролью — обратный поиск по ix_org_users_user_id."""
+    if not await cached_get(db, User, UserRead, user_id):
+        raise HTTPException(404, "User not found")
+    stmt = (
+        select(*columns_for(Organization, OrganizationRead), OrgUser.role)
+        .join(OrgUser, OrgUser.organization_id == Organization.id)
+        .where(OrgUser.user_id == user_id)
+        .order_by(Organization.name)
+    )
+    return (await db.execute(stmt)).all()
+
+
 @router.patch("/{user_id}", response_model=UserRead)
-def update_user(user_id: uuid.UUID, payload: UserUpdate, db: Session = Depends(get_db)):
-    u = db.get(User, user_id)
+async def update_user(
+    user_id: uuid.UUID, payload: UserUpdate, request: Request, response: Response, db: DbSession
+):
+    # с If-Match держим строку до commit, иначе два PATCH пройдут проверку одновременно
+    u = await db.get(User, user_id, with_for_update="if-match" in request.headers)
     if not u:
         raise HTTPException(404, "User not found")
+    require_match(request, entity_etag(u))
     if payload.display_name is not None:
         u.display_name = payload.display_name
     if payload.tg_user_id is not None:
         u.tg_user_id = payload.tg_user_id
-    db.commit()
-    db.refresh(u)
+    if payload.is_active is not None:
+        u.is_active = payload.is_active
+    await db.commit()
+    await invalidate(User, user_id)
+    await db.refresh(u)
+    response.headers["ETag"] = entity_etag(u)
     return u
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
-def delete_user(user_id: uuid.UUID, db: Session = Depends(get_db)) -> Response:
-    res = db.execute(delete(User).where(User.id == user_id))
+async def delete_user(user_id: uuid.UUID, db: DbSession) -> Response:
+    res = await db.execute(delete(User).where(User.id == user_id))
     if res.rowcount:
-        db.commit()
+        await db.commit()
+        await invalidate(User, user_id)
+        await invalidate_roles(user_id)
     return Response(status_code=204)
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import uuid
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+# один запрос ANY(:ids) и ответ экрана дашборда, а не выгрузка — для выгрузок есть /export
+MAX_BATCH_IDS = 5000
+
+
+class BatchGetRequest(BaseModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=MAX_BATCH_IDS)
+
+
+class BatchGetResult(BaseModel, Generic[T]):
+    # в порядке запроса, повторы id — один раз
+    items: list[T]
+    # id из запроса, которых нет в БД
+    missing: list[uuid.UUID] = []
@@ -5,6 +5,8 @@ from datetime import datetime
 
 from pydantic import BaseModel, Field
 
+from app.api.v1.schemas.organization import OrganizationRead
+
 
 class BotBase(BaseModel):
     organization_id: uuid.UUID | None = None
@@ -16,13 +18,15 @@ class BotBase(BaseModel):
 
 
 class BotCreate(BotBase):
-    pass
+    # только на запись: в BotRead токена нет
+    token: str | None = Field(default=None, max_length=128, repr=False)
 
 
 class BotUpdate(BaseModel):
     organization_id: uuid.UUID | None = None
     username: str | None = Field(default=None, max_length=64)
     is_active: bool | None = None
+    token: str | None = Field(default=None, max_length=128, repr=False)
 
     model_config = dict(from_attributes=True)
 
@@ -31,3 +35,8 @@ class BotRead(BotBase):
     id: uuid.UUID
     created_at: datetime
     updated_at: datetime
+
+
+class BotExpanded(BotRead):
+    # только с ?expand=organization; без него поля в ответе нет
+    organization: OrganizationRead | None = None
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import uuid
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from app.api.v1.schemas.org_user import OrgUserBase
+
+
+class UserUpsert(BaseModel):
+    # Ключ upsert'а — tg_user_id, поэтому здесь он обязателен
+    tg_user_id: int
+    display_name: str = Field(max_length=128)
+    is_active: bool = True
+
+
+class OrgUserUpsert(OrgUserBase):
+    role: str = Field(default="member", pattern="^(owner|admin|member)$")
+
+
+class BulkRowResult(BaseModel):
+    index: int
+    status: Literal["created", "updated", "error"]
+    id: uuid.UUID | None = None
+    error: str | None = None
+
+
+class BulkResult(BaseModel):
+    created: int = 0
+    updated: int = 0
+    errors: int = 0
+    results: list[BulkRowResult]
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+import uuid
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class MessageCreate(BaseModel):
+    # id чата или @username публичного канала/группы
+    chat_id: int | str
+    text: str = Field(min_length=1, max_length=4096)
+    parse_mode: Literal["HTML", "MarkdownV2"] | None = None
+    disable_notification: bool | None = None
+    # полоса справедливой очереди: high обгоняет default и bulk (рассылки)
+    priority: Literal["high", "default", "bulk"] = "default"
+
+
+class MessageQueued(BaseModel):
+    id: uuid.UUID
+    bot_id: uuid.UUID
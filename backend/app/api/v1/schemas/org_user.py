@@ -5,6 +5,9 @@ from datetime import datetime
 
 from pydantic import BaseModel, Field
 
+from app.api.v1.schemas.organization import OrganizationRead
+from app.api.v1.schemas.user import UserRead
+
 
 class OrgUserBase(BaseModel):
     organization_id: uuid.UUID
@@ -21,3 +24,9 @@ class OrgUserCreate(OrgUserBase):
 class OrgUserRead(OrgUserBase):
     id: uuid.UUID
     created_at: datetime
+
+
+class OrgUserExpanded(OrgUserRead):
+    # только с ?expand=organization,user; без него полей в ответе нет
+    organization: OrganizationRead | None = None
+    user: UserRead | None = None
@@ -24,3 +24,8 @@ class OrganizationRead(OrganizationBase):
     updated_at: datetime
 
     model_config = {"from_attributes": True}
+
+
+class OrganizationMembership(OrganizationRead):
+    # роль пользователя в этой организации
+    role: str
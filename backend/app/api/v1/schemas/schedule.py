@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+from typing import Literal
+
+from pydantic import AwareDatetime, BaseModel, Field
+
+from app.api.v1.schemas.message import MessageCreate
+
+
+class ScheduleCreate(MessageCreate):
+    bot_id: uuid.UUID
+    # с часовым поясом: «когда» без пояса в календаре неоднозначно
+    due_at: AwareDatetime
+
+
+class ScheduleUpdate(BaseModel):
+    due_at: AwareDatetime | None = None
+    text: str | None = Field(default=None, min_length=1, max_length=4096)
+    parse_mode: Literal["HTML", "MarkdownV2"] | None = None
+    priority: Literal["high", "default", "bulk"] | None = None
+
+
+class ScheduleRead(BaseModel):
+    id: uuid.UUID
+    bot_id: uuid.UUID
+    chat_id: int | str
+    text: str
+    parse_mode: str | None = None
+    disable_notification: bool | None = None
+    priority: str = "default"
+    due_at: datetime
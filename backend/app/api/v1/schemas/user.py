@@ -20,6 +20,7 @@ class UserCreate(UserBase):
 
 class UserUpdate(BaseModel):
     display_name: str | None = Field(default=None, max_length=128)
+    tg_user_id: int | None = None
     is_active: bool | None = None
 
     model_config = dict(from_attributes=True)
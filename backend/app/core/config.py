@@ -8,6 +8,8 @@ class Settings(BaseSettings):
     log_level: str = Field(default="INFO", alias="LOG_LEVEL")
     log_json: bool = Field(default=True, alias="LOG_JSON")
     log_file: str = Field(default="logs/app.log", alias="LOG_FILE")
+    # Спаны в формате OTLP/JSON (по строке на спан); пусто — не экспортируются
+    trace_export_file: str = Field(default="", alias="TRACE_EXPORT_FILE")
 
     host: str = Field(default="0.0.0.0", alias="HOST")
     port: int = Field(default=8080, alias="PORT")
@@ -18,10 +20,92 @@ class Settings(BaseSettings):
     postgres_user: str = Field(default="ttq", alias="POSTGRES_USER")
     postgres_password: str = Field(default="ttq", alias="POSTGRES_PASSWORD")
 
+    # Пул соединений общего async-движка (app.db.session.engine)
+    db_pool_size: int = Field(default=10, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=20, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout: float = Field(default=30.0, alias="DB_POOL_TIMEOUT")
+    db_pool_recycle: int = Field(default=1800, alias="DB_POOL_RECYCLE")
+    db_echo: bool = Field(default=False, alias="DB_ECHO")
+    # Read-реплики (через запятую, те же URL postgresql+psycopg://); пусто — всё на primary
+    db_replica_urls: str = Field(default="", alias="DB_REPLICA_URLS")
+    db_replica_max_lag: float = Field(default=5.0, alias="DB_REPLICA_MAX_LAG")
+    db_replica_check_interval: float = Field(default=5.0, alias="DB_REPLICA_CHECK_INTERVAL")
+
     redis_url: str = Field(default="redis://redis:6379/0", alias="REDIS_URL")
+    redis_socket_timeout: float = Field(default=0.5, alias="REDIS_SOCKET_TIMEOUT")
+
+    # Двухуровневый кэш сущностей (in-process LRU → Redis → Postgres)
+    cache_enabled: bool = Field(default=True, alias="CACHE_ENABLED")
+    cache_local_maxsize: int = Field(default=10_000, alias="CACHE_LOCAL_MAXSIZE")
+    cache_local_ttl: float = Field(default=30.0, alias="CACHE_LOCAL_TTL")
+    cache_redis_ttl: int = Field(default=300, alias="CACHE_REDIS_TTL")
+    # Idempotency-Key для POST/PATCH: срок хранения ответа и ожидание одновременного дубликата
+    idempotency_enabled: bool = Field(default=True, alias="IDEMPOTENCY_ENABLED")
+    idempotency_ttl: int = Field(default=86400, alias="IDEMPOTENCY_TTL")
+    idempotency_lock_timeout: float = Field(default=10.0, alias="IDEMPOTENCY_LOCK_TIMEOUT")
+    # Лимит API на организацию и группу маршрутов: "users=20:40" (в секунду : пачка), остальные —
+    # RATE_LIMIT_RATE/RATE_LIMIT_BURST; дольше RATE_LIMIT_REDIS_TIMEOUT — лимит в процессе
+    rate_limit_enabled: bool = Field(default=True, alias="RATE_LIMIT_ENABLED")
+    rate_limit_rate: float = Field(default=50.0, alias="RATE_LIMIT_RATE")
+    rate_limit_burst: int = Field(default=100, alias="RATE_LIMIT_BURST")
+    rate_limit_rules: str = Field(default="", alias="RATE_LIMIT_RULES")
+    rate_limit_redis_timeout: float = Field(default=0.05, alias="RATE_LIMIT_REDIS_TIMEOUT")
+    # Роли в организациях (owner/admin/member) по X-User-ID; выключено — API без проверок
+    authz_enabled: bool = Field(default=False, alias="AUTHZ_ENABLED")
+
+    # Telegram-адаптер: single — один бот из TELEGRAM_TOKEN, multi — все активные боты из БД
+    tg_runner: str = Field(default="single", alias="TG_RUNNER")
+    tg_shard_index: int = Field(default=0, alias="TG_SHARD_INDEX")
+    tg_shard_count: int = Field(default=1, alias="TG_SHARD_COUNT")
+    tg_refresh_interval: float = Field(default=30.0, alias="TG_REFRESH_INTERVAL")
+    tg_polling_timeout: int = Field(default=30, alias="TG_POLLING_TIMEOUT")
+    tg_http_pool_size: int = Field(default=100, alias="TG_HTTP_POOL_SIZE")
+    # Планировщик апдейтов: порядок внутри чата, параллельно между чатами
+    tg_workers: int = Field(default=64, alias="TG_WORKERS")
+    tg_max_pending: int = Field(default=1000, alias="TG_MAX_PENDING")
+    # Write-behind пользователей из сообщений: сброс в users раз в N мс или по M строк
+    tg_users_flush_ms: int = Field(default=500, alias="TG_USERS_FLUSH_MS")
+    tg_users_flush_rows: int = Field(default=500, alias="TG_USERS_FLUSH_ROWS")
+    # FSM: memory — в процессе (по умолчанию aiogram), redis — общее для процессов хранилище
+    tg_fsm_storage: str = Field(default="memory", alias="TG_FSM_STORAGE")
+    tg_fsm_ttl: int = Field(default=86400, alias="TG_FSM_TTL")
+    # TTL по состоянию или группе: "Order:address=900,Order=3600"
+    tg_fsm_state_ttls: str = Field(default="", alias="TG_FSM_STATE_TTLS")
+    tg_fsm_local_maxsize: int = Field(default=10_000, alias="TG_FSM_LOCAL_MAXSIZE")
+    tg_fsm_local_ttl: float = Field(default=30.0, alias="TG_FSM_LOCAL_TTL")
+    # Вебхуки: direct — апдейт обрабатывается в процессе API, stream — через Redis stream
+    tg_webhook_mode: str = Field(default="direct", alias="TG_WEBHOOK_MODE")
+    tg_webhook_base_url: str = Field(default="", alias="TG_WEBHOOK_BASE_URL")
+    tg_update_dedupe_ttl: int = Field(default=3600, alias="TG_UPDATE_DEDUPE_TTL")
+    tg_updates_stream_maxlen: int = Field(default=100_000, alias="TG_UPDATES_STREAM_MAXLEN")
+    # Исходящие сообщения: Bot API и лимиты Telegram (на бота в секунду, на чат, на группу в минуту)
+    tg_api_url: str = Field(default="https://api.telegram.org", alias="TG_API_URL")
+    tg_send_bot_rate: float = Field(default=30.0, alias="TG_SEND_BOT_RATE")
+    tg_send_chat_rate: float = Field(default=1.0, alias="TG_SEND_CHAT_RATE")
+    tg_send_group_per_minute: float = Field(default=20.0, alias="TG_SEND_GROUP_PER_MINUTE")
+    tg_outbox_batch: int = Field(default=100, alias="TG_OUTBOX_BATCH")
+    # период проверки outbox, чья задача разбора потерялась (сервис scheduler)
+    tg_outbox_sweep_interval: float = Field(default=30.0, alias="TG_OUTBOX_SWEEP_INTERVAL")
+    # Отложенные публикации: ширина корзины колеса времени, период и пачка диспетчера
+    schedule_bucket_seconds: int = Field(default=60, alias="SCHEDULE_BUCKET_SECONDS")
+    schedule_tick: float = Field(default=0.5, alias="SCHEDULE_TICK")
+    schedule_batch: int = Field(default=500, alias="SCHEDULE_BATCH")
+    # Справедливая очередь задач между организациями: веса "org_id=4,org_id=2" (остальные —
+    # FAIR_QUEUE_DEFAULT_WEIGHT), предел задач в Celery одновременно, период диспетчера
+    fair_queue_enabled: bool = Field(default=True, alias="FAIR_QUEUE_ENABLED")
+    fair_queue_weights: str = Field(default="", alias="FAIR_QUEUE_WEIGHTS")
+    fair_queue_default_weight: float = Field(default=1.0, alias="FAIR_QUEUE_DEFAULT_WEIGHT")
+    fair_queue_max_inflight: int = Field(default=32, alias="FAIR_QUEUE_MAX_INFLIGHT")
+    fair_queue_tick: float = Field(default=0.2, alias="FAIR_QUEUE_TICK")
+    # /ping присылает результат задачи сам (pub/sub result backend), без /task
+    tg_push_results: bool = Field(default=False, alias="TG_PUSH_RESULTS")
+    tg_push_timeout: float = Field(default=60.0, alias="TG_PUSH_TIMEOUT")
 
     secret_key: str = Field(default="changeme-in-dev", alias="SECRET_KEY")
 
+    # orjson по умолчанию и отдача списков прямо из Row, минуя pydantic (см. app.api.responses)
+    api_fast_json: bool = Field(default=False, alias="API_FAST_JSON")
+
     class Config:
         extra = "ignore"
         env_file = ".env"
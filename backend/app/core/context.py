@@ -0,0 +1,86 @@
+"""
+Контекст корреляции для логов и спанов: request_id, trace_id, span_id, org_id, user_id.
+Хранится в contextvars — переживает await и не смешивается между запросами/апдейтами.
+Заполняют: ASGI middleware (API), outer-middleware aiogram (апдейт), сигналы Celery (задача).
+"""
+
+from __future__ import annotations
+
+import re
+import secrets
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any
+
+FIELDS = ("request_id", "trace_id", "span_id", "org_id", "user_id")
+
+_vars: dict[str, ContextVar[str | None]] = {
+    name: ContextVar(f"ttq_{name}", default=None) for name in FIELDS
+}
+
+# W3C Trace Context: version-trace_id-parent_id-flags
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+Tokens = list[tuple[str, Token[str | None]]]
+
+
+def get(name: str) -> str | None:
+    return _vars[name].get()
+
+
+def current() -> dict[str, str]:
+    """Непустые поля контекста — для логов и заголовков задач."""
+    fields = {}
+    for name, var in _vars.items():
+        value = var.get()
+        if value is not None:
+            fields[name] = value
+    return fields
+
+
+def attach(**fields: Any) -> Tokens:
+    """Выставить поля (None пропускаются); вернуть токены для detach."""
+    return [
+        (name, _vars[name].set(str(value))) for name, value in fields.items() if value is not None
+    ]
+
+
+def detach(tokens: Tokens) -> None:
+    for name, token in reversed(tokens):
+        _vars[name].reset(token)
+
+
+@contextmanager
+def bind(**fields: Any) -> Iterator[None]:
+    tokens = attach(**fields)
+    try:
+        yield
+    finally:
+        detach(tokens)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """(trace_id, parent span_id) из заголовка traceparent; невалидный — None."""
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id
+
+
+def traceparent() -> str | None:
+    trace_id, span_id = get("trace_id"), get("span_id")
+    if trace_id is None or span_id is None:
+        return None
+    return f"00-{trace_id}-{span_id}-01"
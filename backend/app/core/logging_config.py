@@ -1,70 +1,223 @@
-import json
+import atexit
+import copy
 import logging
 import os
-from datetime import datetime
-from logging.config import dictConfig
-from typing import Any, Dict
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from app.core import context
+from app.core.metrics import LOG_RECORDS_DROPPED
+
+# Поля корреляции: из contextvars (app.core.context) или extra=...
+CORRELATION_FIELDS = (
+    "request_id",
+    "user_id",
+    "org_id",
+    "team_id",
+    "entity",
+    "entity_id",
+    "action",
+    "status",
+    "error_code",
+    "latency_ms",
+    "retries",
+    "trace_id",
+    "span_id",
+)
 
 
 class JSONFormatter(logging.Formatter):
+    """Строка JSON на запись; пустые поля не пишутся, время — из record.created."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        # strftime дорогой, а записи в пределах одной секунды идут пачками
+        self._second = -1
+        self._second_text = ""
+
+    def _timestamp(self, record: logging.LogRecord) -> str:
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(second))
+        return "%s.%03dZ" % (self._second_text, record.msecs)
+
     def format(self, record: logging.LogRecord) -> str:
-        payload = {
-            "timestamp": datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+        ctx = context.current()
+        payload: Dict[str, Any] = {
+            "timestamp": self._timestamp(record),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
-            # Common correlation fields (populate via extra=... where applicable)
-            "request_id": getattr(record, "request_id", None),
-            "user_id": getattr(record, "user_id", None),
-            "org_id": getattr(record, "org_id", None),
-            "team_id": getattr(record, "team_id", None),
-            "entity": getattr(record, "entity", None),
-            "entity_id": getattr(record, "entity_id", None),
-            "action": getattr(record, "action", None),
-            "status": getattr(record, "status", None),
-            "error_code": getattr(record, "error_code", None),
-            "latency_ms": getattr(record, "latency_ms", None),
-            "retries": getattr(record, "retries", None),
-            "trace_id": getattr(record, "trace_id", None),
         }
-        return json.dumps(payload, ensure_ascii=False)
+        for name in CORRELATION_FIELDS:
+            # явный extra=... приоритетнее контекста
+            value = getattr(record, name, None)
+            if value is None:
+                value = ctx.get(name)
+            if value is not None:
+                payload[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return orjson.dumps(payload, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает долю записей ниже WARNING для заданных логгеров (и их потомков):
+    LOG_SAMPLING="app.access=0.1,aiogram.event=0.05". WARNING и выше — всегда.
+    """
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "SamplingFilter":
+        rates: Dict[str, float] = {}
+        for item in spec.split(","):
+            name, sep, rate = item.partition("=")
+            if sep and name.strip():
+                rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        return cls(rates)
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, prefix = 1.0, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Кладёт запись в ограниченную очередь и не ждёт: при переполнении запись
+    отбрасывается и учитывается (dropped + метрика), а при следующей удачной
+    вставке в лог уходит предупреждение с числом потерянных записей.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._unreported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Форматирование — в потоке слушателя, где контекста запроса уже нет:
+        # фиксируем поля контекста и текст сообщения/исключения здесь.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        for name, value in context.current().items():
+            if getattr(record, name, None) is None:
+                setattr(record, name, value)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self._unreported:
+                self.queue.put_nowait(self._overflow_record())
+                self._unreported = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+            LOG_RECORDS_DROPPED.inc()
+
+    def _overflow_record(self) -> logging.LogRecord:
+        return logging.makeLogRecord(
+            {
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"log queue overflow: dropped {self._unreported} records",
+            }
+        )
+
+
+_listener: Optional[QueueListener] = None
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        # дописывает всё, что уже в очереди
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
 
 
 def setup_logging() -> None:
+    global _listener
     log_level = os.getenv("LOG_LEVEL", "INFO").upper()
     log_json = os.getenv("LOG_JSON", "1") in ("1", "true", "True")
     log_file = os.getenv("LOG_FILE", "logs/app.log")
+    queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    sampling = os.getenv("LOG_SAMPLING", "")
 
     os.makedirs(os.path.dirname(log_file), exist_ok=True)
 
-    # Явно типизируем для mypy
-    handlers: Dict[str, Dict[str, Any]] = {
-        "console": {
-            "class": "logging.StreamHandler",
-            "level": log_level,
-            "formatter": "json" if log_json else "plain",
-            "stream": "ext://sys.stdout",
-        },
-        "file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "level": log_level,
-            "formatter": "json" if log_json else "plain",
-            "filename": log_file,
-            "maxBytes": 5_000_000,
-            "backupCount": 3,
-            "encoding": "utf-8",
-        },
-    }
-
-    config: Dict[str, Any] = {
-        "version": 1,
-        "disable_existing_loggers": False,
-        "formatters": {
-            "json": {"()": JSONFormatter},
-            "plain": {"format": "%(asctime)s %(levelname)s %(name)s %(message)s"},
-        },
-        "handlers": handlers,
-        "root": {"level": log_level, "handlers": ["console", "file"]},
-    }
-
-    dictConfig(config)
+    formatter: logging.Formatter = (
+        JSONFormatter()
+        if log_json
+        else logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+    )
+    # Реальный I/O — только в потоке QueueListener
+    handlers: List[logging.Handler] = [
+        logging.StreamHandler(sys.stdout),
+        RotatingFileHandler(log_file, maxBytes=5_000_000, backupCount=3, encoding="utf-8"),
+    ]
+    for handler in handlers:
+        handler.setLevel(log_level)
+        handler.setFormatter(formatter)
+
+    _stop_listener()
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    queue_handler = BoundedQueueHandler(log_queue)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter.from_spec(sampling))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+        existing.close()
+    root.setLevel(log_level)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_after_fork() -> None:
+    # поток слушателя не переживает fork (prefork-воркеры Celery) — поднимаем заново
+    global _listener
+    if _listener is not None:
+        _listener = None
+        setup_logging()
+
+
+atexit.register(_stop_listener)
+os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import os
+import time
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Бакеты под SLO публикации p95 ≤ 5 s: мелкие — для API, крупные — для доставки
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being processed", multiprocess_mode="livesum"
+)
+IDEMPOTENCY_REQUESTS = Counter(
+    "idempotency_requests_total",
+    "Requests with Idempotency-Key: executed, replayed, in_progress, mismatch",
+    ["result"],
+)
+RATE_LIMIT_CHECK = Histogram(
+    "rate_limit_check_seconds",
+    "Per-request rate limiter overhead by backend (redis, local fallback)",
+    ["backend"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+RATE_LIMIT_REJECTED = Counter(
+    "rate_limit_rejected_total", "Requests rejected with 429 by route group", ["group"]
+)
+AUTHZ_CHECK = Histogram(
+    "authz_check_seconds",
+    "Organization role check (membership index lookup) by result",
+    ["result"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time to get a connection from the SQLAlchemy pool (incl. connect)",
+    buckets=LATENCY_BUCKETS,
+)
+
+CELERY_PUBLISHED = Counter("celery_tasks_published_total", "Celery tasks published", ["task"])
+CELERY_PUBLISH_LATENCY = Histogram(
+    "celery_task_publish_seconds",
+    "Time to hand a task to the broker",
+    ["task"],
+    buckets=LATENCY_BUCKETS,
+)
+CELERY_QUEUE_WAIT = Histogram(
+    "celery_task_queue_wait_seconds", "Publish → worker start", ["task"], buckets=LATENCY_BUCKETS
+)
+CELERY_RUN = Histogram(
+    "celery_task_run_seconds", "Task execution time", ["task", "state"], buckets=LATENCY_BUCKETS
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full"
+)
+
+TELEGRAM_BOTS_RUNNING = Gauge(
+    "telegram_bots_running", "Bots polled by this runner process", multiprocess_mode="livesum"
+)
+TELEGRAM_UPDATES_PENDING = Gauge(
+    "telegram_updates_pending",
+    "Updates queued or being handled by the per-chat scheduler",
+    multiprocess_mode="livesum",
+)
+TELEGRAM_UPDATE_QUEUE_WAIT = Histogram(
+    "telegram_update_queue_wait_seconds",
+    "Time an update waited in the per-chat scheduler",
+    buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_HANDLER_LATENCY = Histogram(
+    "telegram_handler_seconds", "Handler run time", ["handler"], buckets=LATENCY_BUCKETS
+)
+TELEGRAM_SENDS = Counter("telegram_messages_sent_total", "Outbound messages by result", ["result"])
+TELEGRAM_DELIVERY_LATENCY = Histogram(
+    "telegram_delivery_seconds",
+    "Outbound message: enqueued → accepted by Bot API (publication SLO)",
+    ["result"],
+    buckets=LATENCY_BUCKETS,
+)
+TELEGRAM_SEND_THROTTLED = Counter(
+    "telegram_send_throttled_total", "Sends delayed by rate limits", ["reason"]
+)
+SCHEDULE_DISPATCHED = Counter("schedule_dispatched_total", "Scheduled messages handed to delivery")
+SCHEDULE_LAG = Histogram(
+    "schedule_dispatch_lag_seconds",
+    "Due time → handed to delivery by the dispatcher",
+    buckets=LATENCY_BUCKETS,
+)
+FAIR_QUEUE_WAIT = Histogram(
+    "fair_queue_wait_seconds",
+    "Fair queue: enqueued → task started on a worker",
+    ["org", "lane"],
+    buckets=LATENCY_BUCKETS,
+)
+FAIR_QUEUE_DISPATCHED = Counter(
+    "fair_queue_dispatched_total", "Tasks handed to Celery by the fair queue dispatcher", ["lane"]
+)
+TELEGRAM_UPDATE_LATENCY = Histogram(
+    "telegram_update_handling_seconds",
+    "Telegram update handling time in the adapter",
+    ["update_type"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Пул, который меряет ожидание соединения: у SQLAlchemy нет события «начал ждать»."""
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+
+class PoolCollector(Collector):
+    """checked-out/overflow читаются в момент scrape — на запросы это ничего не добавляет."""
+
+    def __init__(self, engines: Callable[[], Iterable[tuple[str, AsyncEngine]]]) -> None:
+        self._engines = engines
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        checked_out = GaugeMetricFamily(
+            "db_pool_checked_out", "Connections checked out of the pool", labels=["pool"]
+        )
+        overflow = GaugeMetricFamily(
+            "db_pool_overflow",
+            "Connections above pool_size (negative: idle slots)",
+            labels=["pool"],
+        )
+        for name, engine in self._engines():
+            pool: Any = engine.pool
+            checked_out.add_metric([name], pool.checkedout())
+            overflow.add_metric([name], pool.overflow())
+        yield checked_out
+        yield overflow
+
+
+class StatsCollector(Collector):
+    """Экспорт счётчиков, которые компонент уже ведёт сам (например, кэш сущностей)."""
+
+    def __init__(self, prefix: str, snapshot: Callable[[], dict[str, int]]) -> None:
+        self._prefix = prefix
+        self._snapshot = snapshot
+
+    def collect(self) -> Iterator[CounterMetricFamily | GaugeMetricFamily]:
+        for name, value in self._snapshot().items():
+            if name.endswith("_size"):
+                yield GaugeMetricFamily(f"{self._prefix}_{name}", name, value=value)
+            else:
+                yield CounterMetricFamily(f"{self._prefix}_{name}", name, value=value)
+
+
+class PrometheusMiddleware:
+    """
+    Чистый ASGI middleware (без BaseHTTPMiddleware): латентность по шаблону маршрута
+    (а не по сырому пути — иначе кардинальность меток растёт с числом id) и in-flight.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # роутер кладёт совпавший маршрут в тот же scope
+            route = scope.get("route")
+            HTTP_LATENCY.labels(
+                scope["method"], getattr(route, "path", "<unmatched>"), str(status_code)
+            ).observe(time.perf_counter() - started)
+
+
+_local_collectors: list[Collector] = []
+
+
+def register(collector: Collector) -> None:
+    """Коллектор состояния текущего процесса (пулы, кэш) — виден и в multiprocess-режиме."""
+    REGISTRY.register(collector)
+    _local_collectors.append(collector)
+
+
+def registry() -> CollectorRegistry:
+    """При PROMETHEUS_MULTIPROC_DIR (несколько воркеров uvicorn/celery) — агрегат по процессам."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        merged = CollectorRegistry()
+        multiprocess.MultiProcessCollector(merged)
+        for collector in _local_collectors:
+            merged.register(collector)
+        return merged
+    return REGISTRY
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
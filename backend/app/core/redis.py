@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import redis
+from redis.asyncio import Redis
+
+from app.core.config import settings
+
+_redis: Redis | None = None
+_sync_redis: redis.Redis | None = None
+
+
+def get_redis() -> Redis:
+    """Общий async-клиент Redis процесса (пул соединений создаётся лениво)."""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_socket_timeout,
+        )
+    return _redis
+
+
+def get_sync_redis() -> redis.Redis:
+    """Синхронный клиент для воркеров Celery (создаётся лениво — уже в дочернем процессе)."""
+    global _sync_redis
+    if _sync_redis is None:
+        _sync_redis = redis.Redis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.redis_socket_timeout,
+            socket_connect_timeout=settings.redis_socket_timeout,
+        )
+    return _sync_redis
+
+
+async def close_redis() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
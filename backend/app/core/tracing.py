@@ -0,0 +1,248 @@
+"""
+Спаны, совместимые с OpenTelemetry: W3C traceparent на входе, экспорт в OTLP/JSON
+(по одной строке ExportTraceServiceRequest на спан) — файл читает otel-collector
+(filelog/otlpjsonfile receiver) или jq. Без TRACE_EXPORT_FILE спаны не пишутся,
+но trace_id/span_id всё равно попадают в логи.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import context
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("app.access")
+
+# SpanKind из OTLP
+INTERNAL, SERVER, CLIENT, PRODUCER, CONSUMER = 1, 2, 3, 4, 5
+_STATUS_OK, _STATUS_ERROR = 1, 2
+
+
+def _attr_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+@dataclass
+class Span:
+    name: str
+    kind: int
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    start_ns: int
+    attributes: dict[str, Any] = field(default_factory=dict)
+    end_ns: int | None = None
+    error: str | None = None
+    _tokens: context.Tokens = field(default_factory=list, repr=False)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def end(self, exc: BaseException | None = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f"{type(exc).__name__}: {exc}"
+        context.detach(self._tokens)
+        if _exporter is not None:
+            _exporter.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict[str, Any]:
+        span: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _attr_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": (
+                {"code": _STATUS_ERROR, "message": self.error}
+                if self.error
+                else {"code": _STATUS_OK}
+            ),
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class FileSpanExporter:
+    """Дописывает спаны в файл; строка на спан, запись под локом (воркеры Celery — потоки)."""
+
+    def __init__(self, path: str, service: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+        self._resource = {
+            "attributes": [
+                {"key": "service.name", "value": {"stringValue": service}},
+                {"key": "service.namespace", "value": {"stringValue": settings.app_name}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]
+        }
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": self._resource,
+                        "scopeSpans": [{"scope": {"name": "ttq"}, "spans": [span.to_otlp()]}],
+                    }
+                ]
+            },
+            ensure_ascii=False,
+        )
+        try:
+            with self._lock:
+                self._file.write(line + "\n")
+        except OSError as exc:
+            logger.warning("tracing: span export failed: %s", exc)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_exporter: FileSpanExporter | None = None
+
+
+def configure(service: str) -> None:
+    """Вызывается точкой входа процесса (api / worker / bot)."""
+    global _exporter
+    if settings.trace_export_file and _exporter is None:
+        _exporter = FileSpanExporter(settings.trace_export_file, service)
+
+
+def start_span(
+    name: str,
+    kind: int = INTERNAL,
+    attributes: dict[str, Any] | None = None,
+    parent: tuple[str, str] | None = None,
+) -> Span:
+    """
+    Начать спан и сделать его текущим в контексте. Родитель — явный (из traceparent
+    или заголовков задачи) или текущий спан. end() обязательно в том же контексте.
+    """
+    if parent is not None:
+        trace_id, parent_span_id = parent
+    else:
+        trace_id = context.get("trace_id") or context.new_trace_id()
+        parent_span_id = context.get("span_id")
+    span = Span(
+        name=name,
+        kind=kind,
+        trace_id=trace_id,
+        span_id=context.new_span_id(),
+        parent_span_id=parent_span_id,
+        start_ns=time.time_ns(),
+        attributes={key: value for key, value in (attributes or {}).items() if value is not None},
+    )
+    span._tokens = context.attach(trace_id=span.trace_id, span_id=span.span_id)
+    return span
+
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, **attributes: Any) -> Iterator[Span]:
+    current = start_span(name, kind, attributes)
+    try:
+        yield current
+    except BaseException as exc:
+        current.end(exc)
+        raise
+    current.end()
+
+
+class RequestContextMiddleware:
+    """
+    Чистый ASGI middleware: request_id (X-Request-ID или новый, эхо в ответе),
+    trace из traceparent, org/user из X-Org-ID/X-User-ID; серверный спан на запрос
+    и строка access-лога с latency_ms.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]
+        }
+        request_id = headers.get("x-request-id") or uuid.uuid4().hex
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-request-id", request_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        with context.bind(
+            request_id=request_id,
+            org_id=headers.get("x-org-id"),
+            user_id=headers.get("x-user-id"),
+        ):
+            server_span = start_span(
+                f"{scope['method']} {scope['path']}",
+                SERVER,
+                {"http.request.method": scope["method"], "url.path": scope["path"]},
+                parent=context.parse_traceparent(headers.get("traceparent")),
+            )
+            error: BaseException | None = None
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except BaseException as exc:
+                error = exc
+                raise
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    server_span.name = f"{scope['method']} {route}"
+                    server_span.set_attribute("http.route", route)
+                server_span.set_attribute("http.response.status_code", status_code)
+                access_logger.info(
+                    "%s %s %s",
+                    scope["method"],
+                    scope["path"],
+                    status_code,
+                    extra={"status": status_code, "latency_ms": round(server_span.duration_ms, 2)},
+                )
+                server_span.end(error)
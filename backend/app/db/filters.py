@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Any
+
+from sqlalchemy import ColumnElement, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+
+
+def any_of(column: Any, values: Iterable[Any]) -> ColumnElement[bool]:
+    """
+    column = ANY(:values) — один параметр-массив вместо IN (:p1, ..., :pN):
+    не упирается в лимит параметров и даёт одинаковый текст запроса при любом N.
+    """
+    return column == any_(bindparam(None, list(values), type_=ARRAY(column.type)))
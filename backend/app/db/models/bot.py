@@ -2,15 +2,21 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, String, func
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import BigInteger, Boolean, DateTime, ForeignKey, Index, String, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.models.base import Base
 
+if TYPE_CHECKING:
+    from app.db.models.organization import Organization
+
 
 class Bot(Base):
     __tablename__ = "bots"
+    # keyset-пагинация (created_at, id) — см. app.api.pagination
+    __table_args__ = (Index("ix_bots_created_at_id", "created_at", "id"),)
 
     id: Mapped[uuid.UUID] = mapped_column(default=uuid.uuid4, primary_key=True)
     organization_id: Mapped[uuid.UUID | None] = mapped_column(
@@ -20,6 +26,8 @@ class Bot(Base):
     tg_bot_id: Mapped[int | None] = mapped_column(BigInteger, unique=True, nullable=True)
     username: Mapped[str] = mapped_column(String(64))
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    # токен Bot API; наружу не отдаётся (нет в BotRead), читает только раннер
+    token: Mapped[str | None] = mapped_column(String(128), nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
@@ -27,3 +35,6 @@ class Bot(Base):
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
+
+    # lazy="raise": в async ленивая загрузка невозможна — только selectinload (см. ?expand=)
+    organization: Mapped[Organization | None] = relationship(back_populates="bots", lazy="raise")
@@ -2,12 +2,17 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-from sqlalchemy import DateTime, Enum, ForeignKey, UniqueConstraint, func
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import DateTime, Enum, ForeignKey, Index, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.models.base import Base
 
+if TYPE_CHECKING:
+    from app.db.models.organization import Organization
+    from app.db.models.user import User
+
 OrgRoleEnum = Enum("owner", "admin", "member", name="org_role")
 
 
@@ -17,7 +22,13 @@ class OrgUser(Base):
     """
 
     __tablename__ = "org_users"
-    __table_args__ = (UniqueConstraint("organization_id", "user_id", name="uq_org_user"),)
+    __table_args__ = (
+        UniqueConstraint("organization_id", "user_id", name="uq_org_user"),
+        # keyset-пагинация (created_at, id) — см. app.api.pagination
+        Index("ix_org_users_created_at_id", "created_at", "id"),
+        # обратный поиск «организации пользователя» (uq_org_user начинается с organization_id)
+        Index("ix_org_users_user_id", "user_id"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(default=uuid.uuid4, primary_key=True)
     organization_id: Mapped[uuid.UUID] = mapped_column(
@@ -31,3 +42,6 @@ class OrgUser(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
+
+    organization: Mapped[Organization] = relationship(back_populates="memberships", lazy="raise")
+    user: Mapped[User] = relationship(back_populates="memberships", lazy="raise")
@@ -2,16 +2,23 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-from sqlalchemy import DateTime, String, func
+from sqlalchemy import DateTime, Index, String, func
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
 
+if TYPE_CHECKING:
+    from .bot import Bot
+    from .org_user import OrgUser
+
 
 class Organization(Base):
     __tablename__ = "organizations"
+    # keyset-пагинация (created_at, id) — см. app.api.pagination
+    __table_args__ = (Index("ix_organizations_created_at_id", "created_at", "id"),)
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -32,3 +39,11 @@ class Organization(Base):
         onupdate=func.now(),
         nullable=False,
     )
+
+    # удаление — каскадом в БД (ondelete), ORM коллекции не грузит
+    bots: Mapped[list[Bot]] = relationship(
+        back_populates="organization", lazy="raise", passive_deletes=True
+    )
+    memberships: Mapped[list[OrgUser]] = relationship(
+        back_populates="organization", lazy="raise", passive_deletes=True
+    )
@@ -2,15 +2,21 @@ from __future__ import annotations
 
 import uuid
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-from sqlalchemy import BigInteger, Boolean, DateTime, String, func
-from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import BigInteger, Boolean, DateTime, Index, String, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.models.base import Base
 
+if TYPE_CHECKING:
+    from app.db.models.org_user import OrgUser
+
 
 class User(Base):
     __tablename__ = "users"
+    # keyset-пагинация (created_at, id) — см. app.api.pagination
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
 
     id: Mapped[uuid.UUID] = mapped_column(default=uuid.uuid4, primary_key=True)
     # Telegram user id (не PII, публичный), опционально
@@ -24,3 +30,7 @@ class User(Base):
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
     )
+
+    memberships: Mapped[list[OrgUser]] = relationship(
+        back_populates="user", lazy="raise", passive_deletes=True
+    )
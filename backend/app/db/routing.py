@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import InstrumentedAsyncPool
+
+logger = logging.getLogger(__name__)
+
+# Ключи Session.info
+READ_ONLY = "read_only"
+_WROTE = "wrote"
+_REPLICA = "replica"
+
+# Отставание реплики в секундах; 0, если всё полученное WAL уже применено
+# (иначе на простаивающем primary «отставание» росло бы само по себе)
+_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+@dataclass
+class Replica:
+    url: str
+    engine: AsyncEngine
+    # до первой проверки отставания реплика считается недоступной
+    healthy: bool = False
+    lag: float | None = None
+    errors: int = field(default=0)
+
+
+class ReplicaSet:
+    """
+    Пул read-реплик: round-robin по здоровым, здоровье — по фоновой проверке
+    отставания и по ошибкам соединения (handle_error). Нет здоровых — читаем с primary.
+    """
+
+    def __init__(self, urls: list[str], max_lag: float, check_interval: float) -> None:
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replicas = [Replica(url, self._make_engine(url)) for url in urls]
+        self._rr = itertools.count()
+
+    def _make_engine(self, url: str) -> AsyncEngine:
+        engine = create_async_engine(
+            url,
+            poolclass=InstrumentedAsyncPool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+            pool_pre_ping=True,
+        )
+
+        @event.listens_for(engine.sync_engine, "handle_error")
+        def _on_error(ctx: Any) -> None:
+            if ctx.is_disconnect:
+                self._mark_down(engine, ctx.original_exception)
+
+        return engine
+
+    def _mark_down(self, engine: AsyncEngine, exc: BaseException | None) -> None:
+        for replica in self.replicas:
+            if replica.engine is engine and replica.healthy:
+                replica.healthy = False
+                replica.errors += 1
+                logger.warning("db: replica %s marked down: %s", replica.engine.url, exc)
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def engines(self) -> list[tuple[str, AsyncEngine]]:
+        return [(f"replica{i}", r.engine) for i, r in enumerate(self.replicas)]
+
+    def pick(self) -> AsyncEngine | None:
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._rr) % len(healthy)].engine
+
+    async def check(self, replica: Replica) -> None:
+        try:
+            async with replica.engine.connect() as conn:
+                replica.lag = float((await conn.execute(_LAG_SQL)).scalar_one())
+        except Exception as exc:
+            replica.lag = None
+            if replica.healthy:
+                logger.warning("db: replica %s check failed: %s", replica.engine.url, exc)
+            replica.healthy = False
+            return
+        healthy = replica.lag <= self.max_lag
+        if healthy != replica.healthy:
+            logger.info(
+                "db: replica %s healthy=%s lag=%.2fs", replica.engine.url, healthy, replica.lag
+            )
+        replica.healthy = healthy
+
+    async def monitor(self) -> None:
+        while True:
+            await asyncio.gather(*(self.check(r) for r in self.replicas))
+            await asyncio.sleep(self.check_interval)
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+class RoutingSession(Session):
+    """
+    Sync-сессия под AsyncSession: если в info выставлен READ_ONLY, чтения идут на одну
+    (закреплённую за сессией) реплику. Любая запись, flush или SELECT ... FOR UPDATE
+    переключает сессию на primary до конца её жизни — read-your-writes в пределах запроса.
+    execute(..., bind_arguments={"primary": True}) читает с primary.
+    """
+
+    def get_bind(  # type: ignore[override]
+        self, mapper: Any = None, clause: Any = None, *, primary: bool = False, **kw: Any
+    ) -> Engine:
+        if self._routes_to_replica(clause, primary):
+            engine = self.info.get(_REPLICA) or replicas.pick()
+            if engine is not None:
+                self.info[_REPLICA] = engine
+                return engine.sync_engine  # type: ignore[no-any-return]
+        return super().get_bind(mapper, clause=clause, **kw)
+
+    def _routes_to_replica(self, clause: Any, primary: bool) -> bool:
+        if not self.info.get(READ_ONLY) or self.info.get(_WROTE):
+            return False
+        writes = (
+            self._flushing
+            or getattr(clause, "is_dml", False)
+            or getattr(clause, "_for_update_arg", None) is not None
+        )
+        if writes:
+            self.info[_WROTE] = True
+            return False
+        return not primary
+
+
+replicas = ReplicaSet(
+    [url.strip() for url in settings.db_replica_urls.split(",") if url.strip()],
+    max_lag=settings.db_replica_max_lag,
+    check_interval=settings.db_replica_check_interval,
+)
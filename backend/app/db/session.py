@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 import os
-from typing import Generator
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from app.core.config import settings  # у тебя уже есть settings
+from app.core.metrics import InstrumentedAsyncPool
+from app.db.routing import RoutingSession, replicas
 
 
 def _build_sync_url() -> str:
@@ -18,13 +19,44 @@ def _build_sync_url() -> str:
     return f"postgresql+psycopg://{user}:{password}@{host}:{port}/{db}"
 
 
-ENGINE = create_engine(_build_sync_url(), pool_pre_ping=True, echo=False, future=True)
-SessionLocal = sessionmaker(bind=ENGINE, autoflush=False, autocommit=False, expire_on_commit=False)
-
-
-def get_db() -> Generator[Session, None, None]:
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# psycopg 3 — один драйвер и для sync, и для async: create_async_engine сам выбирает
+# async-диалект по тому же URL. Это единственный пул соединений процесса API.
+engine = create_async_engine(
+    _build_sync_url(),
+    poolclass=InstrumentedAsyncPool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=True,
+    echo=settings.db_echo,
+)
+# RoutingSession по умолчанию ходит в primary; на реплики — только сессии с info[READ_ONLY]
+AsyncSessionLocal = async_sessionmaker(
+    bind=engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+
+
+_sync_engine: Engine | None = None
+
+
+def get_sync_engine() -> Engine:
+    """
+    Синхронный движок для воркеров Celery: создаётся при первом обращении (после fork),
+    небольшой пул — задачи процесса идут по одной.
+    """
+    global _sync_engine
+    if _sync_engine is None:
+        _sync_engine = create_engine(
+            _build_sync_url(),
+            pool_size=2,
+            max_overflow=2,
+            pool_pre_ping=True,
+            echo=settings.db_echo,
+        )
+    return _sync_engine
+
+
+async def dispose_engine() -> None:
+    await replicas.dispose()
+    await engine.dispose()
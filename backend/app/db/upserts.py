@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import uuid
+from collections.abc import Sequence
+from typing import Any
+
+from sqlalchemy import Row, func, literal_column, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models.org_user import OrgUser
+from app.db.models.user import User
+
+# Строк в одном INSERT ... VALUES: далеко от лимита PG в 65535 параметров
+UPSERT_BATCH = 1000
+
+# xmax = 0 только у строк, вставленных этим запросом (у обновлённых — id транзакции)
+_INSERTED = literal_column("(xmax = 0)").label("inserted")
+
+
+async def upsert_users(
+    db: AsyncSession,
+    rows: Sequence[dict[str, Any]],
+    *,
+    columns: Sequence[str] = ("display_name", "is_active"),
+    skip_unchanged: bool = False,
+) -> Sequence[Row[Any]]:
+    """
+    INSERT ... ON CONFLICT (tg_user_id) DO UPDATE одним запросом на пачку.
+    Ключи tg_user_id в rows должны быть уникальны. Возвращает (id, tg_user_id, inserted).
+
+    columns — что обновлять у существующих строк. skip_unchanged — не переписывать строки,
+    где эти колонки не изменились (их нет и в результате).
+    """
+    stmt = insert(User).values([{"id": uuid.uuid4(), **row} for row in rows])
+    where = None
+    if skip_unchanged:
+        where = or_(
+            *(User.__table__.c[name].is_distinct_from(stmt.excluded[name]) for name in columns)
+        )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.tg_user_id],
+        set_={**{name: stmt.excluded[name] for name in columns}, "updated_at": func.now()},
+        where=where,
+    ).returning(User.id, User.tg_user_id, _INSERTED)
+    return (await db.execute(stmt)).all()
+
+
+async def upsert_memberships(
+    db: AsyncSession, rows: Sequence[dict[str, Any]]
+) -> Sequence[Row[Any]]:
+    """То же для org_users по uq_org_user. Возвращает (id, organization_id, user_id, inserted)."""
+    stmt = insert(OrgUser).values([{"id": uuid.uuid4(), **row} for row in rows])
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_org_user", set_={"role": stmt.excluded.role}
+    ).returning(OrgUser.id, OrgUser.organization_id, OrgUser.user_id, _INSERTED)
+    return (await db.execute(stmt)).all()
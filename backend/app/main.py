@@ -1,9 +1,90 @@
 # backend/app/main.py
-from fastapi import FastAPI
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 
-from app.api.v1.routers import bots, celery_ping, health, org_users, organizations, users
+from fastapi import FastAPI, Response
+
+from app.adapters.telegram.bot import dp, scheduler
+from app.adapters.telegram.users_buffer import user_buffer
+from app.api.idempotency import IdempotencyMiddleware
+from app.api.ratelimit import RateLimitMiddleware, parse_rules
+from app.api.responses import DefaultResponse
+from app.api.v1.routers import (
+    bots,
+    celery_ping,
+    health,
+    org_users,
+    organizations,
+    schedules,
+    telegram,
+    users,
+)
+from app.core import metrics, tracing
+from app.core.config import settings
+from app.core.logging_config import setup_logging
+from app.core.redis import close_redis
+from app.db.routing import replicas
+from app.db.session import dispose_engine, engine
+from app.services.cache import entity_cache
+from app.services.task_results import task_results
+
+setup_logging()
+tracing.configure("api")
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    background = []
+    if entity_cache.enabled:
+        background.append(asyncio.create_task(entity_cache.listen()))
+    if replicas:
+        background.append(asyncio.create_task(replicas.monitor()))
+    yield
+    for task in background:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await scheduler.drain()
+    await user_buffer.close()
+    await dp.storage.close()
+    await telegram.registry.close()
+    await task_results.close()
+    await close_redis()
+    await dispose_engine()
+
+
+app = FastAPI(title="TTQ_02", lifespan=lifespan, default_response_class=DefaultResponse)
+if settings.idempotency_enabled:
+    # внутренний слой: повтор виден в метриках и логах, но не доходит до роутера и БД
+    app.add_middleware(
+        IdempotencyMiddleware,
+        ttl=settings.idempotency_ttl,
+        lock_timeout=settings.idempotency_lock_timeout,
+    )
+if settings.rate_limit_enabled:
+    # снаружи идемпотентности: повтор тоже расходует лимит клиента
+    app.add_middleware(
+        RateLimitMiddleware,
+        rate=settings.rate_limit_rate,
+        burst=settings.rate_limit_burst,
+        rules=parse_rules(settings.rate_limit_rules),
+        redis_timeout=settings.rate_limit_redis_timeout,
+    )
+app.add_middleware(metrics.PrometheusMiddleware)
+# последним — внешний слой: контекст запроса виден и метрикам, и хендлерам
+app.add_middleware(tracing.RequestContextMiddleware)
+
+metrics.register(metrics.PoolCollector(lambda: [("primary", engine), *replicas.engines()]))
+metrics.register(metrics.StatsCollector("ttq_cache", entity_cache.snapshot))
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics() -> Response:
+    body, content_type = metrics.render_latest()
+    return Response(body, media_type=content_type)
 
-app = FastAPI(title="TTQ_02")
 
 # Роуты
 app.include_router(organizations.router, prefix="/api/v1")
@@ -13,3 +94,5 @@ app.include_router(health.router, prefix="/api/v1")
 app.include_router(users.router, prefix="/api/v1")
 app.include_router(bots.router, prefix="/api/v1")
 app.include_router(org_users.router, prefix="/api/v1")
+app.include_router(telegram.router, prefix="/api/v1")
+app.include_router(schedules.router, prefix="/api/v1")
@@ -0,0 +1,297 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from pydantic import BaseModel
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "ttq:cache:invalidate"
+_KEY_PREFIX = "ttq:cache:"
+# поколение ключа строгого кэша: растёт при каждой инвалидации
+_GEN_PREFIX = "ttq:cache:gen:"
+# После ошибки Redis не трогаем его столько секунд — чтобы не платить таймаут на каждый запрос
+_REDIS_BACKOFF = 5.0
+
+# Неудавшуюся строгую инвалидацию повторяем с таким интервалом, пока Redis не ответит
+_RETRY_INTERVAL = 0.5
+
+# KEYS: значение, поколение; ARGV: значение, TTL, поколение, прочитанное до загрузки.
+# Инвалидация, прошедшая во время загрузки, сменила поколение — старое значение не пишем.
+_SET_IF_GEN = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[3] then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """In-process LRU с TTL и ограничением размера. Не потокобезопасен — только для event loop."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+@dataclass
+class CacheStats:
+    local_hits: int = 0
+    redis_hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    redis_errors: int = 0
+
+
+class EntityCache:
+    """
+    Read-through кэш сущностей: in-process LRU → Redis → загрузчик (Postgres).
+    Инвалидация удаляет ключ в Redis, увеличивает его поколение и рассылает ключ через
+    pub/sub, чтобы остальные воркеры выкинули свою локальную копию; TTL локального уровня
+    ограничивает устаревание, если сообщение потерялось. Загруженное значение пишется в Redis,
+    только если поколение не сменилось с начала загрузки: загрузчик, прочитавший строку
+    до правки, не вернёт старое значение в кэш на весь CACHE_REDIS_TTL.
+
+    strict=True — для данных, где устаревание недопустимо (права доступа):
+    - пока Redis недоступен, кэш не используется вовсе — об инвалидациях других процессов
+      не узнать, поэтому каждый запрос идёт в загрузчик;
+    - неудавшаяся инвалидация повторяется в фоне, пока не дойдёт до Redis, и до тех пор
+      процесс тоже читает мимо кэша.
+    """
+
+    def __init__(self, local: LocalLRU, redis_ttl: int, enabled: bool = True) -> None:
+        self.local = local
+        self.redis_ttl = redis_ttl
+        self.enabled = enabled
+        self.stats = CacheStats()
+        self._redis_down_until = 0.0
+        # растёт при каждой инвалидации (своей и чужой): значение, загруженное до неё,
+        # в локальный уровень не кладём
+        self._epoch = 0
+        self._pending: set[str] = set()
+        self._retry: asyncio.Task[None] | None = None
+
+    @staticmethod
+    def key(entity: str, id_: Any) -> str:
+        return f"{entity}:{id_}"
+
+    def _redis_available(self) -> bool:
+        return time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, exc: Exception) -> None:
+        self.stats.redis_errors += 1
+        self._redis_down_until = time.monotonic() + _REDIS_BACKOFF
+        logger.warning("cache: redis unavailable, using local tier only", exc_info=exc)
+
+    async def get_or_load(
+        self,
+        entity: str,
+        id_: Any,
+        loader: Callable[[], Awaitable[dict[str, Any] | None]],
+        *,
+        strict: bool = False,
+    ) -> dict[str, Any] | None:
+        if not self.enabled:
+            return await loader()
+        if strict and (self._pending or not self._redis_available()):
+            self.stats.misses += 1
+            return await loader()
+
+        key = self.key(entity, id_)
+        epoch = self._epoch
+        value = self.local.get(key)
+        if value is not _MISSING:
+            self.stats.local_hits += 1
+            return value  # type: ignore[no-any-return]
+
+        gen: bytes | None = None
+        if self._redis_available():
+            try:
+                raw, gen = await get_redis().mget(_KEY_PREFIX + key, _GEN_PREFIX + key)
+            except (RedisError, OSError) as exc:
+                self._redis_failed(exc)
+                if strict:
+                    self.stats.misses += 1
+                    return await loader()
+            else:
+                if raw is not None:
+                    self.stats.redis_hits += 1
+                    value = json.loads(raw)
+                    self._set_local(key, value, epoch)
+                    return value  # type: ignore[no-any-return]
+
+        self.stats.misses += 1
+        value = await loader()
+        if value is None:
+            return None
+        if not self._redis_available():
+            # Redis недоступен: остаётся только локальный уровень с его коротким TTL
+            if not strict:
+                self._set_local(key, value, epoch)
+            return value  # type: ignore[no-any-return]
+        try:
+            stored = await get_redis().register_script(_SET_IF_GEN)(
+                keys=[_KEY_PREFIX + key, _GEN_PREFIX + key],
+                args=[json.dumps(value), self.redis_ttl, gen or b"0"],
+            )
+        except (RedisError, OSError) as exc:
+            self._redis_failed(exc)
+            stored = not strict
+        if stored:
+            self._set_local(key, value, epoch)
+        return value  # type: ignore[no-any-return]
+
+    def peek(self, entity: str, id_: Any, *, strict: bool = False) -> Any | None:
+        """Только локальный уровень, без сети и загрузчика; None — значения в процессе нет."""
+        if not self.enabled:
+            return None
+        if strict and (self._pending or not self._redis_available()):
+            return None
+        value = self.local.get(self.key(entity, id_))
+        return None if value is _MISSING else value
+
+    def _set_local(self, key: str, value: Any, epoch: int) -> None:
+        # инвалидация, пришедшая во время чтения, означает, что value мог устареть
+        if epoch == self._epoch:
+            self.local.set(key, value)
+
+    async def _invalidate_redis(self, keys: list[str]) -> None:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.delete(*(_KEY_PREFIX + key for key in keys))
+            for key in keys:
+                pipe.incr(_GEN_PREFIX + key)
+                # поколение переживает любое значение, записанное до инвалидации
+                pipe.expire(_GEN_PREFIX + key, self.redis_ttl * 2)
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+            await pipe.execute()
+
+    async def invalidate(self, entity: str, *ids: Any, strict: bool = False) -> None:
+        if not self.enabled or not ids:
+            return
+        keys = [self.key(entity, id_) for id_ in ids]
+        for key in keys:
+            self.local.pop(key)
+        self._epoch += 1
+        self.stats.invalidations += len(keys)
+        # строгую инвалидацию пробуем и во время паузы после ошибки Redis
+        if not strict and not self._redis_available():
+            return
+        try:
+            await self._invalidate_redis(keys)
+        except (RedisError, OSError) as exc:
+            self._redis_failed(exc)
+            if strict:
+                self._pending.update(keys)
+                if self._retry is None or self._retry.done():
+                    self._retry = asyncio.create_task(self._retry_pending())
+
+    async def _retry_pending(self) -> None:
+        """Дожать строгие инвалидации: до успеха старое значение лежит в Redis."""
+        while self._pending:
+            await asyncio.sleep(_RETRY_INTERVAL)
+            keys = sorted(self._pending)
+            try:
+                await self._invalidate_redis(keys)
+            except (RedisError, OSError) as exc:
+                logger.warning("cache: strict invalidation still pending", exc_info=exc)
+                continue
+            self._pending.difference_update(keys)
+            self._redis_down_until = 0.0
+
+    async def listen(self) -> None:
+        """Фоновая задача: чистит локальный уровень по сообщениям других воркеров."""
+        while True:
+            try:
+                async with get_redis().pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    # пока не были подписаны, могли пропустить инвалидации
+                    self.local.clear()
+                    self._epoch += 1
+                    while True:
+                        # явный timeout вместо listen(): иначе сработает короткий socket_timeout
+                        message = await pubsub.get_message(timeout=1.0)
+                        if message is None:
+                            continue
+                        for key in json.loads(message["data"]):
+                            self.local.pop(key)
+                        self._epoch += 1
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError, ValueError) as exc:
+                # без подписки чужие инвалидации не доходят: локальной копии больше не верим
+                self.local.clear()
+                self._epoch += 1
+                logger.warning("cache: invalidation listener failed, reconnecting", exc_info=exc)
+                await asyncio.sleep(_REDIS_BACKOFF)
+
+    def snapshot(self) -> dict[str, int]:
+        return {**asdict(self.stats), "local_size": len(self.local)}
+
+
+entity_cache = EntityCache(
+    LocalLRU(settings.cache_local_maxsize, settings.cache_local_ttl),
+    redis_ttl=settings.cache_redis_ttl,
+    enabled=settings.cache_enabled,
+)
+
+
+async def cached_get(
+    db: AsyncSession, model: Any, schema: type[BaseModel], id_: uuid.UUID
+) -> dict[str, Any] | None:
+    """db.get через кэш; в кэше лежит уже сериализованная схема (JSON-совместимый dict)."""
+
+    async def load() -> dict[str, Any] | None:
+        # только с primary: отстающее значение с реплики прожило бы в кэше весь TTL
+        stmt = select(model).where(model.id == id_)
+        obj = (await db.execute(stmt, bind_arguments={"primary": True})).scalar_one_or_none()
+        return schema.model_validate(obj).model_dump(mode="json") if obj else None
+
+    return await entity_cache.get_or_load(model.__tablename__, id_, load)
+
+
+async def invalidate(model: Any, *ids: uuid.UUID) -> None:
+    await entity_cache.invalidate(model.__tablename__, *ids)
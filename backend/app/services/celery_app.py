@@ -10,3 +10,6 @@ celery_app = Celery(
 
 # Автопоиск задач в пакете app.services
 celery_app.autodiscover_tasks(packages=["app.services"])
+
+# Метрики публикации и выполнения задач (подключаются через сигналы при импорте)
+from app.services import celery_signals  # noqa: E402,F401
@@ -0,0 +1,144 @@
+"""
+Сигналы Celery (и у продюсера, и у воркера): метрики публикации/ожидания/выполнения задач,
+проброс контекста корреляции в заголовках сообщения и спаны publish/run.
+"""
+
+import contextlib
+import os
+import time
+from typing import Any
+
+from celery import signals
+from prometheus_client import start_http_server
+from redis.exceptions import RedisError
+
+from app.core import context, metrics, tracing
+from app.core.logging_config import setup_logging
+from app.core.redis import get_sync_redis
+from app.services import fairqueue
+
+# Заголовок сообщения с моментом публикации (wall clock: продюсер и воркер — разные процессы)
+PUBLISHED_AT = "ttq_published_at"
+# Заголовок с контекстом продюсера (request_id, trace_id, span_id публикации, org/user)
+CONTEXT = "ttq_context"
+
+_publish_started: dict[str, float] = {}
+_run_started: dict[str, float] = {}
+_publish_spans: dict[str, tracing.Span] = {}
+_run_spans: dict[str, tuple[tracing.Span, context.Tokens]] = {}
+
+
+@signals.before_task_publish.connect
+def _before_publish(
+    sender: str | None = None, headers: dict[str, Any] | None = None, **_: Any
+) -> None:
+    if headers is None:
+        return
+    headers[PUBLISHED_AT] = time.time()
+    _publish_started[headers["id"]] = time.perf_counter()
+    span = tracing.start_span(
+        f"celery.publish {sender}", tracing.PRODUCER, {"celery.task_id": headers["id"]}
+    )
+    _publish_spans[headers["id"]] = span
+    # span_id публикации станет родителем спана выполнения на воркере
+    headers[CONTEXT] = context.current()
+
+
+@signals.after_task_publish.connect
+def _after_publish(
+    sender: str | None = None, headers: dict[str, Any] | None = None, **_: Any
+) -> None:
+    started = _publish_started.pop(headers["id"], None) if headers else None
+    span = _publish_spans.pop(headers["id"], None) if headers else None
+    if span is not None:
+        span.end()
+    metrics.CELERY_PUBLISHED.labels(sender or "unknown").inc()
+    if started is not None:
+        metrics.CELERY_PUBLISH_LATENCY.labels(sender or "unknown").observe(
+            time.perf_counter() - started
+        )
+
+
+@signals.task_prerun.connect
+def _task_prerun(task_id: str, task: Any, **_: Any) -> None:
+    _run_started[task_id] = time.perf_counter()
+    published_at = getattr(task.request, PUBLISHED_AT, None)
+    queue_wait = max(0.0, time.time() - published_at) if published_at is not None else None
+    if queue_wait is not None:
+        metrics.CELERY_QUEUE_WAIT.labels(task.name).observe(queue_wait)
+    fair = getattr(task.request, fairqueue.HEADER, None)
+    if fair:
+        metrics.FAIR_QUEUE_WAIT.labels(fair["org"], fair["lane"]).observe(
+            max(0.0, time.time() - fair["enqueued_at"])
+        )
+
+    produced = getattr(task.request, CONTEXT, None) or {}
+    tokens = context.attach(
+        request_id=produced.get("request_id"),
+        org_id=produced.get("org_id"),
+        user_id=produced.get("user_id"),
+    )
+    parent = (
+        (produced["trace_id"], produced["span_id"])
+        if produced.get("trace_id") and produced.get("span_id")
+        else None
+    )
+    span = tracing.start_span(
+        f"celery.run {task.name}",
+        tracing.CONSUMER,
+        {
+            "celery.task_id": task_id,
+            "celery.queue_wait_ms": round(queue_wait * 1000, 2) if queue_wait is not None else None,
+        },
+        parent=parent,
+    )
+    _run_spans[task_id] = (span, tokens)
+
+
+@signals.task_postrun.connect
+def _task_postrun(task_id: str, task: Any, state: str | None = None, **_: Any) -> None:
+    started = _run_started.pop(task_id, None)
+    if started is not None:
+        metrics.CELERY_RUN.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - started
+        )
+    if getattr(task.request, fairqueue.HEADER, None):
+        # место в справедливой очереди освобождается; Redis недоступен — место вернёт TTL
+        with contextlib.suppress(RedisError, OSError):
+            fairqueue.release(get_sync_redis(), task_id)
+    run = _run_spans.pop(task_id, None)
+    if run is not None:
+        span, tokens = run
+        span.set_attribute("celery.state", state)
+        span.end()
+        context.detach(tokens)
+
+
+@signals.task_failure.connect
+def _task_failure(task_id: str, exception: BaseException | None = None, **_: Any) -> None:
+    run = _run_spans.get(task_id)
+    if run is not None and exception is not None:
+        run[0].error = f"{type(exception).__name__}: {exception}"
+
+
+@signals.setup_logging.connect
+def _setup_logging(**_: Any) -> None:
+    # JSON-логи с полями контекста вместо стандартной настройки Celery
+    setup_logging()
+    tracing.configure("worker")
+
+
+@signals.worker_init.connect
+def _serve_worker_metrics(**_: Any) -> None:
+    # главный процесс воркера; с prefork метрики детей видны при PROMETHEUS_MULTIPROC_DIR
+    port = int(os.getenv("METRICS_WORKER_PORT", "9101"))
+    if port:
+        start_http_server(port, registry=metrics.registry())
+
+
+@signals.worker_process_shutdown.connect
+def _mark_process_dead(pid: int | None = None, **_: Any) -> None:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid or os.getpid())
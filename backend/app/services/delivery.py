@@ -0,0 +1,621 @@
+"""
+Исходящие сообщения. API кладёт сообщение в outbox бота (Redis list на полосу приоритета:
+high, default, bulk) и, если разбор ещё не запланирован, ставит задачу deliver_outbox в
+справедливую очередь организации бота (app.services.fairqueue); задача разбирает outbox пачками
+по TG_OUTBOX_BATCH, старшие полосы первыми, и отправляет через общий на процесс httpx-клиент Bot API.
+
+- лимиты Telegram — токен-бакеты в Redis (Lua, атомарно для всех воркеров): на бота —
+  TG_SEND_BOT_RATE сообщений в секунду, на личный чат — TG_SEND_CHAT_RATE, на группу/канал —
+  TG_SEND_GROUP_PER_MINUTE в минуту;
+- 429 ставит бота на паузу retry_after секунд (ключ в Redis, его проверяет тот же скрипт);
+- разбор outbox одного бота — одна задача за раз (замок бота), поэтому сообщения одного
+  чата в одной полосе уходят по порядку; чат, упёршийся в лимит, ждёт, остальные чаты пачки
+  идут дальше;
+- флаг «разбор запланирован» хранит полосу задачи: сообщение старшей полосы ставит ещё одну
+  задачу в свою полосу, а не ждёт за чужими bulk-рассылками; лишняя задача, не взявшая замок,
+  сразу завершается;
+- задача, потерянная брокером или воркером, не оставляет outbox навсегда: флаг истекает, а
+  OutboxSweeper (сервис scheduler) раз в TG_OUTBOX_SWEEP_INTERVAL секунд ставит разбор
+  непустых outbox без флага;
+- доставка «хотя бы один раз»: пачка переносится из outbox в список обработки бота одним
+  скриптом, отправленное сообщение оттуда удаляется. Пачку задачи, убитой посреди отправки
+  (time limit, OOM), следующая задача возвращает в голову outbox — сообщение, отправленное
+  прямо перед падением, может уйти повторно;
+- задача работает не дольше max_runtime и встаёт в справедливую очередь снова: большая рассылка
+  одной организации не занимает воркеров, пока ждут сообщения других;
+- время от постановки в outbox до ответа Bot API — telegram_delivery_seconds (SLO p95 ≤ 5 s).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections.abc import AsyncIterator, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+import orjson
+import redis
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.metrics import TELEGRAM_DELIVERY_LATENCY, TELEGRAM_SEND_THROTTLED, TELEGRAM_SENDS
+from app.core.redis import get_redis, get_sync_redis
+from app.db.models.bot import Bot
+from app.db.session import get_sync_engine
+from app.services.cache import LocalLRU
+from app.services.celery_app import celery_app
+from app.services.fairqueue import LANES, submit
+
+logger = logging.getLogger(__name__)
+
+OUTBOX = "ttq:outbox:{}:{}"
+_SCHEDULED = "ttq:outbox:{}:scheduled"
+_RUNNING = "ttq:outbox:{}:running"
+_PROCESSING = "ttq:outbox:{}:processing"
+# боты, у которых может быть непустой outbox, — их проверяет OutboxSweeper
+OUTBOX_BOTS = "ttq:outbox:bots"
+_BUCKET = "ttq:tg:send:{}"
+_PAUSE = "ttq:tg:send:{}:pause"
+# флаг «разбор запланирован» и замок живут дольше любой задачи; потерянная задача не блокирует
+# бота навсегда
+_SCHEDULED_TTL = 300
+# ожидание бакета бота дольше этого — не спим в воркере, а перезапускаем задачу с countdown
+_MAX_SLEEP = 1.0
+_MAX_ATTEMPTS = 5
+
+# KEYS: бакет бота, бакет чата, пауза бота (429)
+# ARGV: скорость и ёмкость бакета бота, скорость и ёмкость бакета чата (токенов в секунду)
+# Ответ: {0, 0} — токены взяты из обоих бакетов; иначе {ожидание в мс, 1 — бот / 2 — чат}
+_TOKEN_BUCKETS = """
+local pause = redis.call('PTTL', KEYS[3])
+if pause > 0 then
+  return {pause, 1}
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local function refill(key, rate, burst)
+  local v = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(v[1]) or burst
+  local ts = tonumber(v[2]) or now
+  return math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+end
+
+local bot_rate, bot_burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local chat_rate, chat_burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local bot = refill(KEYS[1], bot_rate, bot_burst)
+local chat = refill(KEYS[2], chat_rate, chat_burst)
+if bot < 1 then
+  return {math.ceil((1 - bot) * 1000 / bot_rate), 1}
+end
+if chat < 1 then
+  return {math.ceil((1 - chat) * 1000 / chat_rate), 2}
+end
+redis.call('HSET', KEYS[1], 'tokens', bot - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(bot_burst * 1000 / bot_rate) + 1000)
+redis.call('HSET', KEYS[2], 'tokens', chat - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[2], math.ceil(chat_burst * 1000 / chat_rate) + 1000)
+return {0, 0}
+"""
+
+
+# KEYS: флаг; ARGV: номер полосы в LANES, TTL. Флаг хранит полосу запланированной задачи:
+# 1 — поставить задачу (флага не было или запланирована младшая полоса), 0 — уже запланирована
+_SCHEDULE = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+if current and current <= tonumber(ARGV[1]) then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+# KEYS: флаг, замок, outbox по полосам; ARGV: токен замка
+# Outbox пуст — снять флаг и замок одной транзакцией (-1): сообщение, добавленное после,
+# поставит новую задачу, и она возьмёт замок. Иначе — номер старшей непустой полосы.
+_FINISH = """
+for i = 3, #KEYS do
+  if redis.call('LLEN', KEYS[i]) > 0 then
+    return i - 3
+  end
+end
+redis.call('DEL', KEYS[1])
+if redis.call('GET', KEYS[2]) == ARGV[1] then
+  redis.call('DEL', KEYS[2])
+end
+return -1
+"""
+
+# KEYS: список обработки, outbox по полосам; ARGV: размер пачки
+# Пачка из старшей непустой полосы переезжает в список обработки — до подтверждения отправки
+_TAKE_BATCH = """
+local n = tonumber(ARGV[1])
+for i = 2, #KEYS do
+  local items = redis.call('LRANGE', KEYS[i], 0, n - 1)
+  if #items > 0 then
+    redis.call('LTRIM', KEYS[i], #items, -1)
+    redis.call('RPUSH', KEYS[1], unpack(items))
+    return items
+  end
+end
+return {}
+"""
+
+# KEYS: замок; ARGV: токен — снять только свой замок
+_UNLOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS: флаг, outbox по полосам и список обработки, OUTBOX_BOTS; ARGV: bot_id — забыть бота
+# с пустым outbox
+_FORGET = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return 0
+end
+for i = 2, #KEYS - 1 do
+  if redis.call('LLEN', KEYS[i]) > 0 then
+    return 0
+  end
+end
+return redis.call('SREM', KEYS[#KEYS], ARGV[1])
+"""
+
+
+class RetryAfter(Exception):
+    """Bot API ответил 429: бот должен помолчать seconds секунд."""
+
+    def __init__(self, seconds: float) -> None:
+        super().__init__(f"retry after {seconds}s")
+        self.seconds = seconds
+
+
+class DeliveryError(Exception):
+    """Сообщение не будет доставлено и после повтора (чат не найден, бот заблокирован, 4xx)."""
+
+
+def is_group(chat_id: int | str) -> bool:
+    # у групп и каналов id отрицательные, @username — только у публичных каналов/групп
+    return isinstance(chat_id, str) or chat_id < 0
+
+
+class SendLimiter:
+    def __init__(
+        self,
+        client: redis.Redis,
+        bot_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        group_per_minute: float = 20.0,
+    ) -> None:
+        self.client = client
+        self.bot_rate = bot_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_per_minute / 60
+        self.group_burst = max(1.0, min(group_per_minute, 3.0))
+        self._script = client.register_script(_TOKEN_BUCKETS)
+
+    def acquire(self, bot_id: str, chat_id: int | str) -> tuple[float, bool]:
+        """(0, False) — можно отправлять; иначе (ожидание в секундах, упёрлись ли в лимит чата)."""
+        chat_rate, chat_burst = (
+            (self.group_rate, self.group_burst) if is_group(chat_id) else (self.chat_rate, 1.0)
+        )
+        wait_ms, reason = self._script(
+            keys=[
+                _BUCKET.format(bot_id),
+                _BUCKET.format(f"{bot_id}:{chat_id}"),
+                _PAUSE.format(bot_id),
+            ],
+            args=[self.bot_rate, self.bot_rate, chat_rate, chat_burst],
+        )
+        return wait_ms / 1000, reason == 2
+
+    def pause(self, bot_id: str, seconds: float) -> None:
+        self.client.set(_PAUSE.format(bot_id), 1, px=max(1, int(seconds * 1000)))
+
+
+class BotAPI:
+    """Синхронный клиент Bot API: один пул keep-alive соединений на процесс воркера."""
+
+    def __init__(self, base_url: str = "https://api.telegram.org", timeout: float = 10.0) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._client: httpx.Client | None = None
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(base_url=self.base_url, timeout=self.timeout)
+        return self._client
+
+    def call(self, token: str, method: str, payload: dict[str, Any]) -> Any:
+        response = self.client.post(f"/bot{token}/{method}", json=payload)
+        try:
+            body = response.json()
+        except ValueError:
+            # не JSON — прокси/балансировщик; 5xx повторяем, остальное — нет
+            response.raise_for_status()
+            raise DeliveryError(f"unexpected response: {response.status_code}")
+        if body.get("ok"):
+            return body["result"]
+        if response.status_code == 429:
+            raise RetryAfter(float(body.get("parameters", {}).get("retry_after", 1)))
+        if response.status_code >= 500:
+            response.raise_for_status()
+        raise DeliveryError(body.get("description") or f"error {response.status_code}")
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+_tokens = LocalLRU(maxsize=10_000, ttl=60.0)
+
+
+def bot_token(bot_id: str) -> str | None:
+    """
+    Токен активного бота; кэшируется на минуту, чтобы пачки не ходили в БД. Отказ не кэшируется:
+    по нему run() удаляет outbox, а бота могли включить только что.
+    """
+    cached = _tokens.get(bot_id)
+    if isinstance(cached, str):
+        return cached
+    stmt = select(Bot.token).where(Bot.id == uuid.UUID(bot_id), Bot.is_active.is_(True))
+    with get_sync_engine().connect() as conn:
+        token = conn.execute(stmt).scalar_one_or_none()
+    if token is not None:
+        _tokens.set(bot_id, token)
+    return token
+
+
+def message_payload(message: dict[str, Any]) -> dict[str, Any]:
+    payload = {"chat_id": message["chat_id"], "text": message["text"]}
+    for name in ("parse_mode", "disable_notification"):
+        if message.get(name) is not None:
+            payload[name] = message[name]
+    return payload
+
+
+def observe_delivery(message: dict[str, Any], result: str) -> None:
+    TELEGRAM_SENDS.labels(result).inc()
+    if message.get("enqueued_at") is not None:
+        TELEGRAM_DELIVERY_LATENCY.labels(result).observe(
+            max(0.0, time.time() - message["enqueued_at"])
+        )
+
+
+async def enqueue(bot_id: uuid.UUID | str, message: dict[str, Any]) -> str:
+    """Положить сообщение в outbox бота и запланировать разбор, если он ещё не запланирован."""
+    return (await enqueue_many([(bot_id, message)]))[0]
+
+
+def lane_of(message: dict[str, Any]) -> str:
+    return message.get("priority") or "default"
+
+
+async def _submit_delivery(bot_id: str, org_id: str | None, lane: str) -> None:
+    if settings.fair_queue_enabled:
+        await submit(get_redis(), org_id, "deliver_outbox", [bot_id, org_id, lane], lane)
+    else:
+        celery_app.send_task("deliver_outbox", args=[bot_id, org_id, lane])
+
+
+async def enqueue_many(messages: Sequence[tuple[uuid.UUID | str, dict[str, Any]]]) -> list[str]:
+    """
+    То же для пачки одним пайплайном. enqueued_at в сообщении — начало отсчёта задержки
+    доставки (например, срок запланированного сообщения); по умолчанию — сейчас.
+    organization_id в сообщении — чья очередь в справедливом планировщике.
+    """
+    if not messages:
+        return []
+    enqueued_at = time.time()
+    ids = [str(uuid.uuid4()) for _ in messages]
+    # по боту: организация и старшая полоса пачки — с ними разбор встаёт в очередь
+    bots: dict[str, tuple[str | None, str]] = {}
+    schedule = get_redis().register_script(_SCHEDULE)
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for message_id, (bot_id, message) in zip(ids, messages):
+            body = {"enqueued_at": enqueued_at, **message, "id": message_id}
+            lane = lane_of(body)
+            pipe.rpush(OUTBOX.format(bot_id, lane), orjson.dumps(body))
+            org_id, top = bots.get(str(bot_id), (body.get("organization_id"), lane))
+            bots[str(bot_id)] = (org_id, min(top, lane, key=LANES.index))
+        pipe.sadd(OUTBOX_BOTS, *bots)
+        for bot_id, (_, lane) in bots.items():
+            await schedule(
+                keys=[_SCHEDULED.format(bot_id)],
+                args=[LANES.index(lane), _SCHEDULED_TTL],
+                client=pipe,
+            )
+        results = await pipe.execute()
+    for (bot_id, (org_id, lane)), scheduled in zip(bots.items(), results[len(messages) + 1 :]):
+        if scheduled:
+            await _submit_delivery(bot_id, org_id, lane)
+    return ids
+
+
+@dataclass
+class OutboxDeliverer:
+    client: redis.Redis
+    limiter: SendLimiter
+    api: BotAPI
+    batch: int = 100
+    max_runtime: float = 10.0
+
+    def __post_init__(self) -> None:
+        self._take = self.client.register_script(_TAKE_BATCH)
+        self._finish = self.client.register_script(_FINISH)
+        self._unlock = self.client.register_script(_UNLOCK)
+
+    def _requeue(self, bot_id: str, messages: list[dict[str, Any]]) -> None:
+        # обратно в голову outbox своей полосы, в исходном порядке; пачка обработана
+        by_lane: dict[str, list[bytes]] = {}
+        for message in reversed(messages):
+            by_lane.setdefault(lane_of(message), []).append(orjson.dumps(message))
+        with self.client.pipeline(transaction=True) as pipe:
+            for lane, raw in by_lane.items():
+                pipe.lpush(OUTBOX.format(bot_id, lane), *raw)
+            pipe.delete(_PROCESSING.format(bot_id))
+            pipe.execute()
+
+    def _ack(self, bot_id: str, raw: bytes) -> None:
+        self.client.lrem(_PROCESSING.format(bot_id), 1, raw)
+
+    def _pop(self, bot_id: str) -> list[bytes]:
+        keys = [_PROCESSING.format(bot_id), *(OUTBOX.format(bot_id, lane) for lane in LANES)]
+        return self._take(keys=keys, args=[self.batch])  # type: ignore[no-any-return]
+
+    def _recover(self, bot_id: str) -> None:
+        """Пачка задачи, упавшей посреди отправки, — обратно в outbox (под замком бота)."""
+        raw = self.client.lrange(_PROCESSING.format(bot_id), 0, -1)
+        if raw:
+            logger.warning("delivery: bot %s: requeueing %s unacked messages", bot_id, len(raw))
+            self._requeue(bot_id, [orjson.loads(item) for item in raw])
+
+    def pending_lane(self, bot_id: str) -> str | None:
+        """Старшая непустая полоса outbox — в ней продолжать разбор."""
+        with self.client.pipeline(transaction=False) as pipe:
+            for lane in LANES:
+                pipe.llen(OUTBOX.format(bot_id, lane))
+            sizes = pipe.execute()
+        return next((lane for lane, size in zip(LANES, sizes) if size), None)
+
+    def reschedule(self, bot_id: str, countdown: float, lane: str) -> str:
+        """Разбор продолжит новая задача: флаг — на её полосу (старшую непустую) и срок."""
+        lane = self.pending_lane(bot_id) or lane
+        self.client.set(
+            _SCHEDULED.format(bot_id), LANES.index(lane), ex=_SCHEDULED_TTL + int(countdown)
+        )
+        return lane
+
+    def run(self, bot_id: str) -> float | None:
+        """
+        Разобрать outbox бота. None — outbox пуст и флаг снят, или разбор уже идёт в другой
+        задаче; иначе через сколько секунд продолжить (лимиты, 429 или исчерпан max_runtime).
+        """
+        token = bot_token(bot_id)
+        if token is None:
+            outboxes = [
+                _PROCESSING.format(bot_id),
+                *(OUTBOX.format(bot_id, lane) for lane in LANES),
+            ]
+            with self.client.pipeline() as pipe:
+                for outbox in outboxes:
+                    pipe.lrange(outbox, 0, -1)
+                pipe.delete(*outboxes)
+                dropped = [raw for lane in pipe.execute()[:-1] for raw in lane]
+            for raw in dropped:
+                observe_delivery(orjson.loads(raw), "dropped")
+            logger.warning("delivery: bot %s inactive, dropped %s messages", bot_id, len(dropped))
+            self.client.delete(_SCHEDULED.format(bot_id))
+            return None
+
+        lock = uuid.uuid4().hex
+        if not self.client.set(_RUNNING.format(bot_id), lock, nx=True, ex=_SCHEDULED_TTL):
+            # outbox разбирает другая задача: пустоту она проверяет под замком и доберёт
+            # сообщения этой полосы тоже
+            return None
+        try:
+            self._recover(bot_id)
+            deadline = time.monotonic() + self.max_runtime
+            while time.monotonic() < deadline:
+                raw = self._pop(bot_id)
+                if not raw:
+                    finished = self._finish(
+                        keys=[
+                            _SCHEDULED.format(bot_id),
+                            _RUNNING.format(bot_id),
+                            *(OUTBOX.format(bot_id, lane) for lane in LANES),
+                        ],
+                        args=[lock],
+                    )
+                    # между LPOP и проверкой могли дописать: тогда разбор — снова за нами
+                    return None if finished < 0 else 0.0
+                self.client.expire(_RUNNING.format(bot_id), _SCHEDULED_TTL)
+                countdown = self._deliver(bot_id, token, raw)
+                if countdown is not None:
+                    return countdown
+            return 0.0
+        finally:
+            self._unlock(keys=[_RUNNING.format(bot_id)], args=[lock])
+
+    def _deliver(self, bot_id: str, token: str, raw: list[bytes]) -> float | None:
+        """Отправить пачку; None — продолжать, иначе пауза перед следующей попыткой."""
+        messages = [orjson.loads(item) for item in raw]
+        deferred: list[dict[str, Any]] = []
+        waiting_chats: set[int | str] = set()
+        chat_wait: float | None = None
+        for index, message in enumerate(messages):
+            chat_id = message["chat_id"]
+            if chat_id in waiting_chats:
+                deferred.append(message)
+                continue
+            wait, chat_limited = self.limiter.acquire(bot_id, chat_id)
+            if wait and not chat_limited and wait <= _MAX_SLEEP:
+                time.sleep(wait)
+                wait, chat_limited = self.limiter.acquire(bot_id, chat_id)
+            if wait and chat_limited:
+                TELEGRAM_SEND_THROTTLED.labels("chat").inc()
+                waiting_chats.add(chat_id)
+                deferred.append(message)
+                chat_wait = wait if chat_wait is None else min(chat_wait, wait)
+                continue
+            if wait:
+                TELEGRAM_SEND_THROTTLED.labels("bot").inc()
+                self._requeue(bot_id, deferred + messages[index:])
+                return wait
+            try:
+                self.api.call(token, "sendMessage", message_payload(message))
+            except RetryAfter as exc:
+                TELEGRAM_SEND_THROTTLED.labels("retry_after").inc()
+                logger.warning("delivery: bot %s got 429, pausing %ss", bot_id, exc.seconds)
+                self.limiter.pause(bot_id, exc.seconds)
+                self._requeue(bot_id, deferred + messages[index:])
+                return exc.seconds
+            except DeliveryError as exc:
+                logger.warning("delivery: message %s to %s failed: %s", message["id"], chat_id, exc)
+                observe_delivery(message, "failed")
+                self._ack(bot_id, raw[index])
+                continue
+            except httpx.HTTPError as exc:
+                attempts = message.get("attempts", 0) + 1
+                if attempts >= _MAX_ATTEMPTS:
+                    logger.error("delivery: message %s gave up: %s", message["id"], exc)
+                    observe_delivery(message, "failed")
+                    self._ack(bot_id, raw[index])
+                    continue
+                logger.warning("delivery: bot %s send failed, retrying: %s", bot_id, exc)
+                self._requeue(
+                    bot_id, deferred + [{**message, "attempts": attempts}] + messages[index + 1 :]
+                )
+                return float(2**attempts)
+            observe_delivery(message, "sent")
+            self._ack(bot_id, raw[index])
+        self._requeue(bot_id, deferred)
+        # вся пачка ждёт лимитов чатов — продолжим, когда освободится первый
+        if deferred and len(deferred) == len(messages):
+            return chat_wait
+        return None
+
+    def send_now(self, bot_id: str, message: dict[str, Any]) -> Any:
+        """Одно сообщение мимо outbox; лимит или 429 — RetryAfter (повтор — на вызывающем)."""
+        token = bot_token(bot_id)
+        if token is None:
+            raise DeliveryError(f"bot {bot_id} is inactive or has no token")
+        wait, chat_limited = self.limiter.acquire(bot_id, message["chat_id"])
+        if wait:
+            TELEGRAM_SEND_THROTTLED.labels("chat" if chat_limited else "bot").inc()
+            raise RetryAfter(wait)
+        try:
+            result = self.api.call(token, "sendMessage", message_payload(message))
+        except RetryAfter as exc:
+            TELEGRAM_SEND_THROTTLED.labels("retry_after").inc()
+            self.limiter.pause(bot_id, exc.seconds)
+            raise
+        except DeliveryError:
+            observe_delivery(message, "failed")
+            raise
+        observe_delivery(message, "sent")
+        return result
+
+
+class OutboxSweeper:
+    """
+    Страховка от потерянных задач deliver_outbox (брокер, убитый воркер): раз в interval
+    секунд ставит разбор непустых outbox без флага «запланирован». Пустые outbox без флага
+    забываются.
+    """
+
+    def __init__(self, client: Redis, interval: float = 30.0, batch: int = 500) -> None:
+        self.client = client
+        self.interval = interval
+        self.batch = batch
+        self._schedule = client.register_script(_SCHEDULE)
+        self._forget = client.register_script(_FORGET)
+
+    async def sweep(self) -> int:
+        """Один проход; возвращает число заново поставленных разборов."""
+        resubmitted = 0
+        async for raw_ids in self._scan():
+            bot_ids = [raw.decode() for raw in raw_ids]
+            async with self.client.pipeline(transaction=False) as pipe:
+                for bot_id in bot_ids:
+                    pipe.exists(_SCHEDULED.format(bot_id))
+                    for lane in LANES:
+                        pipe.lindex(OUTBOX.format(bot_id, lane), 0)
+                    # пачка убитой задачи без флага тоже требует разбора
+                    pipe.lindex(_PROCESSING.format(bot_id), 0)
+                rows = await pipe.execute()
+            step = 2 + len(LANES)
+            for index, bot_id in enumerate(bot_ids):
+                scheduled, *heads = rows[index * step : (index + 1) * step]
+                if scheduled:
+                    continue
+                outboxes = [
+                    *(OUTBOX.format(bot_id, lane) for lane in LANES),
+                    _PROCESSING.format(bot_id),
+                ]
+                head = next((item for item in heads if item is not None), None)
+                if head is None:
+                    await self._forget(
+                        keys=[_SCHEDULED.format(bot_id), *outboxes, OUTBOX_BOTS], args=[bot_id]
+                    )
+                    continue
+                message = orjson.loads(head)
+                lane = lane_of(message)
+                # флаг ставит тот же скрипт, что и enqueue: одновременная постановка не задвоится
+                if await self._schedule(
+                    keys=[_SCHEDULED.format(bot_id)], args=[LANES.index(lane), _SCHEDULED_TTL]
+                ):
+                    logger.warning("delivery: outbox of bot %s had no task, resubmitting", bot_id)
+                    await _submit_delivery(bot_id, message.get("organization_id"), lane)
+                    resubmitted += 1
+        return resubmitted
+
+    async def _scan(self) -> AsyncIterator[list[bytes]]:
+        cursor = 0
+        while True:
+            cursor, raw_ids = await self.client.sscan(OUTBOX_BOTS, cursor, count=self.batch)
+            if raw_ids:
+                yield raw_ids
+            if not cursor:
+                return
+
+    async def run(self) -> None:
+        logger.info("delivery: outbox sweeper started (every %ss)", self.interval)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except (RedisError, OSError) as exc:
+                logger.warning("delivery: outbox sweep failed: %s", exc)
+
+
+_deliverer: OutboxDeliverer | None = None
+
+
+def deliverer() -> OutboxDeliverer:
+    """Общий на процесс воркера: Redis-клиент, Lua-скрипт и пул соединений к Bot API."""
+    global _deliverer
+    if _deliverer is None:
+        client = get_sync_redis()
+        _deliverer = OutboxDeliverer(
+            client=client,
+            limiter=SendLimiter(
+                client,
+                bot_rate=settings.tg_send_bot_rate,
+                chat_rate=settings.tg_send_chat_rate,
+                group_per_minute=settings.tg_send_group_per_minute,
+            ),
+            api=BotAPI(settings.tg_api_url),
+            batch=settings.tg_outbox_batch,
+        )
+    return _deliverer
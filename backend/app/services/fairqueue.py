@@ -0,0 +1,247 @@
+"""
+Справедливая очередь задач Celery между организациями. С одной очередью Celery массовая
+рассылка одной организации занимает всех воркеров, и срочные сообщения остальных ждут.
+
+- задача сначала попадает в Redis-список своей организации и полосы (ttq:fq:<полоса>:<org>);
+- диспетчер (вместе с диспетчером расписания, python -m app.services.schedule) отдаёт задачи
+  в Celery не больше FAIR_QUEUE_MAX_INFLIGHT одновременно — очередь Celery остаётся короткой,
+  и порядок определяет диспетчер, а не FIFO брокера;
+- полосы — строгий приоритет: high, потом default, потом bulk;
+- внутри полосы — deficit round robin: за круг организация получает вес (FAIR_QUEUE_WEIGHTS,
+  по умолчанию 1) задач; опустевшая очередь теряет накопленный дефицит;
+- ожидание от постановки до старта на воркере — fair_queue_wait_seconds по организации и полосе.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+import orjson
+import redis
+from kombu.exceptions import OperationalError
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import FAIR_QUEUE_DISPATCHED
+from app.services.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+LANES = ("high", "default", "bulk")
+# заголовок задачи, отданной диспетчером: организация, полоса, момент постановки
+HEADER = "ttq_fair"
+NO_ORG = "-"
+
+_QUEUE = "ttq:fq:{}:{}"
+_ACTIVE = "ttq:fq:{}:active"
+INFLIGHT = "ttq:fq:inflight"
+_REDIS_BACKOFF = 5.0
+
+# KEYS: очередь организации, множество активных организаций полосы; ARGV: org, limit
+# Забрать до limit задач; опустевшую очередь снять с учёта в той же транзакции, иначе задача,
+# добавленная между LPOP и SREM, осталась бы без организации в active
+_TAKE = """
+local items = redis.call('LPOP', KEYS[1], ARGV[2]) or {}
+if redis.call('LLEN', KEYS[1]) == 0 then
+  redis.call('SREM', KEYS[2], ARGV[1])
+end
+return items
+"""
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    weights: dict[str, float] = {}
+    for item in spec.split(","):
+        org, sep, weight = item.partition("=")
+        if sep and org.strip():
+            weights[org.strip()] = max(0.0, float(weight))
+    return weights
+
+
+def _entry(org_id: uuid.UUID | str | None, lane: str, name: str, args: Sequence[Any]) -> tuple:
+    if lane not in LANES:
+        raise ValueError(f"unknown lane {lane!r}")
+    org = str(org_id) if org_id else NO_ORG
+    body = orjson.dumps(
+        {"id": str(uuid.uuid4()), "task": name, "args": list(args), "enqueued_at": time.time()}
+    )
+    return _QUEUE.format(lane, org), _ACTIVE.format(lane), org, body
+
+
+async def submit(
+    client: Redis, org_id: uuid.UUID | str | None, name: str, args: Sequence[Any], lane: str
+) -> None:
+    """Поставить задачу name(*args) в очередь организации (из API и прочего async-кода)."""
+    queue, active, org, body = _entry(org_id, lane, name, args)
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.rpush(queue, body)
+        pipe.sadd(active, org)
+        await pipe.execute()
+
+
+def submit_sync(
+    client: redis.Redis, org_id: uuid.UUID | str | None, name: str, args: Sequence[Any], lane: str
+) -> None:
+    """То же из задач Celery."""
+    queue, active, org, body = _entry(org_id, lane, name, args)
+    with client.pipeline(transaction=True) as pipe:
+        pipe.rpush(queue, body)
+        pipe.sadd(active, org)
+        pipe.execute()
+
+
+def release(client: redis.Redis, task_id: str) -> None:
+    """Задача, отданная диспетчером, завершилась — освободить место (из сигналов воркера)."""
+    client.zrem(INFLIGHT, task_id)
+
+
+class FairDispatcher:
+    def __init__(
+        self,
+        client: Redis,
+        weights: Mapping[str, float] | None = None,
+        default_weight: float = 1.0,
+        max_inflight: int = 32,
+        inflight_ttl: float = 300.0,
+        tick: float = 0.2,
+    ) -> None:
+        self.client = client
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.max_inflight = max_inflight
+        # задача воркера, упавшего без task_postrun, перестаёт занимать место через столько секунд
+        self.inflight_ttl = inflight_ttl
+        self.tick = tick
+        self._take = client.register_script(_TAKE)
+        self._deficit: dict[tuple[str, str], float] = {}
+        self._rings: dict[str, deque[str]] = {lane: deque() for lane in LANES}
+        # send_task синхронный: медленный или переподключающийся брокер не должен держать event
+        # loop, а с ним диспетчер расписания и OutboxSweeper того же процесса. Один поток —
+        # публикации идут по порядку через одно соединение с брокером.
+        self._publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fair-queue-send")
+
+    def weight(self, org: str) -> float:
+        return self.weights.get(org, self.default_weight)
+
+    async def capacity(self) -> int:
+        now = time.time()
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(INFLIGHT, "-inf", now - self.inflight_ttl)
+            pipe.zcard(INFLIGHT)
+            _, busy = await pipe.execute()
+        return max(0, self.max_inflight - busy)
+
+    async def _refresh_ring(self, lane: str) -> deque[str]:
+        ring = self._rings[lane]
+        active = {org.decode() for org in await self.client.smembers(_ACTIVE.format(lane))}
+        for org in list(ring):
+            if org not in active:
+                ring.remove(org)
+                self._deficit.pop((lane, org), None)
+        # новые организации встают в конец круга
+        known = set(ring)
+        ring.extend(sorted(active - known))
+        return ring
+
+    def _forward(self, org: str, lane: str, item: dict[str, Any]) -> None:
+        celery_app.send_task(
+            item["task"],
+            args=item["args"],
+            task_id=item["id"],
+            headers={HEADER: {"org": org, "lane": lane, "enqueued_at": item["enqueued_at"]}},
+        )
+
+    async def _send(self, org: str, lane: str, items: list[bytes]) -> None:
+        """
+        Отдать задачи в Celery. Место в inflight занимаем до отправки: быстрая задача может
+        завершиться (и освободить место в task_postrun) раньше, чем вернётся send_task.
+        Брокер недоступен — неотправленные задачи возвращаются в голову очереди организации.
+        """
+        parsed = [orjson.loads(raw) for raw in items]
+        now = time.time()
+        await self.client.zadd(INFLIGHT, {item["id"]: now for item in parsed})
+        sent = 0
+        try:
+            loop = asyncio.get_running_loop()
+            for item in parsed:
+                await loop.run_in_executor(self._publisher, self._forward, org, lane, item)
+                sent += 1
+        except (OperationalError, OSError):
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.lpush(_QUEUE.format(lane, org), *reversed(items[sent:]))
+                pipe.sadd(_ACTIVE.format(lane), org)
+                pipe.zrem(INFLIGHT, *(item["id"] for item in parsed[sent:]))
+                await pipe.execute()
+            raise
+        finally:
+            FAIR_QUEUE_DISPATCHED.labels(lane).inc(sent)
+
+    async def dispatch(self) -> int:
+        """Один проход DRR по полосам; возвращает число отданных в Celery задач."""
+        free = await self.capacity()
+        sent = 0
+        for lane in LANES:
+            if free <= 0:
+                break
+            ring = await self._refresh_ring(lane)
+            while free > 0 and ring:
+                progressed = False
+                for _ in range(len(ring)):
+                    if free <= 0:
+                        break
+                    # круг продолжается со следующего прохода, а не с начала
+                    org = ring[0]
+                    ring.rotate(-1)
+                    key = (lane, org)
+                    self._deficit[key] = self._deficit.get(key, 0.0) + self.weight(org)
+                    want = min(int(self._deficit[key]), free)
+                    if want <= 0:
+                        continue
+                    items = await self._take(
+                        keys=[_QUEUE.format(lane, org), _ACTIVE.format(lane)], args=[org, want]
+                    )
+                    if len(items) < want:
+                        # очередь опустела: по правилам DRR неистраченный дефицит сгорает
+                        ring.remove(org)
+                        self._deficit.pop(key, None)
+                    else:
+                        self._deficit[key] -= len(items)
+                    if not items:
+                        continue
+                    await self._send(org, lane, items)
+                    free -= len(items)
+                    sent += len(items)
+                    progressed = True
+                if not progressed:
+                    break
+        return sent
+
+    async def run(self) -> None:
+        logger.info("fair queue: dispatcher started (max inflight %s)", self.max_inflight)
+        while True:
+            try:
+                await self.dispatch()
+            except (RedisError, OSError, OperationalError) as exc:
+                # задачи остались в очередях Redis; диспетчер расписания в том же процессе живёт
+                logger.warning("fair queue: redis or broker error, retrying: %s", exc)
+                await asyncio.sleep(_REDIS_BACKOFF)
+                continue
+            await asyncio.sleep(self.tick)
+
+
+def fair_dispatcher(client: Redis) -> FairDispatcher:
+    return FairDispatcher(
+        client,
+        weights=parse_weights(settings.fair_queue_weights),
+        default_weight=settings.fair_queue_default_weight,
+        max_inflight=settings.fair_queue_max_inflight,
+        tick=settings.fair_queue_tick,
+    )
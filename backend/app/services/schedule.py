@@ -0,0 +1,334 @@
+"""
+Отложенные публикации («календарь активности») без eta/countdown Celery: такие задачи воркер
+держит в памяти до срока и теряет при рестарте брокера/воркера.
+
+Хранение — «колесо времени» в Redis:
+- запись — hash ttq:sched:item:<id> (data — сообщение в JSON, due — срок, bucket — корзина);
+- корзина — sorted set ttq:sched:bucket:<n> (n = due // SCHEDULE_BUCKET_SECONDS, score = due),
+  поэтому каждый ZSET остаётся маленьким, а диспетчер трогает только наступившие корзины;
+- индекс непустых корзин — sorted set ttq:sched:buckets.
+
+Диспетчер (python -m app.services.schedule; там же работает диспетчер справедливой очереди
+app.services.fairqueue) раз в SCHEDULE_TICK секунд забирает наступившие
+записи пачками по SCHEDULE_BATCH и кладёт их в outbox ботов (app.services.delivery), дальше —
+обычная доставка Celery. Забранная запись до подтверждения лежит в ttq:sched:inflight с арендой:
+если диспетчер упал, запись заберут снова (доставка «хотя бы один раз»). Скрипты атомарны,
+поэтому несколько диспетчеров не раздадут одну запись дважды.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import SCHEDULE_DISPATCHED, SCHEDULE_LAG
+from app.core.redis import get_redis
+from app.services import delivery
+
+logger = logging.getLogger(__name__)
+
+_ITEM = "ttq:sched:item:{}"
+_BUCKET = "ttq:sched:bucket:{}"
+_BUCKETS = "ttq:sched:buckets"
+_INFLIGHT = "ttq:sched:inflight"
+# сколько секунд забранная запись принадлежит диспетчеру, прежде чем её заберут снова
+_LEASE = 30.0
+_REDIS_BACKOFF = 5.0
+_IN_FLIGHT = 2
+
+# KEYS: запись, её текущая корзина (или любая, если записи нет), новая корзина, индекс корзин,
+#       inflight
+# ARGV: id, data, due, номер новой корзины, ожидаемый номер текущей ('' — записи ещё нет),
+#       1 — только перенос существующей записи
+# Ответ: 1 — ок, 0 — записи нет, 2 — её уже забрал диспетчер (отправляется), -1 — запись успели
+# перенести, повторить
+_UPSERT = """
+if redis.call('ZSCORE', KEYS[5], ARGV[1]) then
+  return 2
+end
+local current = redis.call('HGET', KEYS[1], 'bucket')
+if ARGV[6] == '1' and not current then
+  return 0
+end
+if (current or '') ~= ARGV[5] then
+  return -1
+end
+if current then
+  redis.call('ZREM', KEYS[2], ARGV[1])
+end
+redis.call('HSET', KEYS[1], 'data', ARGV[2], 'due', ARGV[3], 'bucket', ARGV[4])
+redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+redis.call('ZADD', KEYS[4], ARGV[4], ARGV[4])
+return 1
+"""
+
+# KEYS: запись, её корзина, inflight; ARGV: id, ожидаемый номер корзины
+# Ответ — как у _UPSERT: запись, уже забранную диспетчером, не отменить (2), она отправляется
+_CANCEL = """
+if redis.call('ZSCORE', KEYS[3], ARGV[1]) then
+  return 2
+end
+local current = redis.call('HGET', KEYS[1], 'bucket')
+if not current then
+  return 0
+end
+if current ~= ARGV[2] then
+  return -1
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+# KEYS: корзина, индекс корзин, inflight; ARGV: номер корзины, now, limit, срок аренды
+_POP = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[2], 'LIMIT', 0, ARGV[3])
+for _, id in ipairs(ids) do
+  redis.call('ZREM', KEYS[1], id)
+  redis.call('ZADD', KEYS[3], ARGV[4], id)
+end
+if redis.call('ZCARD', KEYS[1]) == 0 then
+  redis.call('ZREM', KEYS[2], ARGV[1])
+end
+return ids
+"""
+
+# KEYS: inflight; ARGV: now, limit, срок новой аренды — записи упавших диспетчеров
+_RECLAIM = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, id in ipairs(ids) do
+  redis.call('ZADD', KEYS[1], ARGV[3], id)
+end
+return ids
+"""
+
+# KEYS: запись, inflight; ARGV: id, срок, с которым запись забрали.
+# Запись, перенесённую после того, как её забрали, не удаляем — она ждёт нового срока.
+_ACK = """
+if redis.call('HGET', KEYS[1], 'due') == ARGV[2] then
+  redis.call('DEL', KEYS[1])
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+return 1
+"""
+
+
+class ScheduleInFlight(Exception):
+    """Запись уже забрал диспетчер: она отправляется, менять и отменять поздно."""
+
+
+@dataclass(frozen=True)
+class ScheduledMessage:
+    id: str
+    bot_id: str
+    due_at: float
+    message: dict[str, Any]
+
+
+class ScheduleStore:
+    def __init__(self, redis: Redis, bucket_seconds: int = 60) -> None:
+        self.redis = redis
+        self.bucket_seconds = bucket_seconds
+        self._upsert = redis.register_script(_UPSERT)
+        self._cancel = redis.register_script(_CANCEL)
+        self._pop = redis.register_script(_POP)
+        self._reclaim = redis.register_script(_RECLAIM)
+        self._ack = redis.register_script(_ACK)
+
+    def bucket_of(self, due_at: float) -> int:
+        return int(due_at // self.bucket_seconds)
+
+    @staticmethod
+    def _decode(item_id: str, raw: dict[bytes, bytes]) -> ScheduledMessage | None:
+        if not raw:
+            return None
+        data = orjson.loads(raw[b"data"])
+        return ScheduledMessage(item_id, data.pop("bot_id"), float(raw[b"due"]), data)
+
+    async def get(self, item_id: str) -> ScheduledMessage | None:
+        return self._decode(item_id, await self.redis.hgetall(_ITEM.format(item_id)))
+
+    async def _write(
+        self, item_id: str, bot_id: str, due_at: float, message: dict[str, Any], move_only: bool
+    ) -> bool:
+        data = orjson.dumps({**message, "bot_id": bot_id})
+        bucket = self.bucket_of(due_at)
+        while True:
+            current = await self.redis.hget(_ITEM.format(item_id), "bucket")
+            current_key = _BUCKET.format(current.decode() if current else bucket)
+            result = await self._upsert(
+                keys=[
+                    _ITEM.format(item_id),
+                    current_key,
+                    _BUCKET.format(bucket),
+                    _BUCKETS,
+                    _INFLIGHT,
+                ],
+                args=[
+                    item_id,
+                    data,
+                    repr(due_at),
+                    bucket,
+                    current.decode() if current else "",
+                    int(move_only),
+                ],
+            )
+            if result == _IN_FLIGHT:
+                raise ScheduleInFlight(item_id)
+            if result != -1:
+                return bool(result)
+
+    async def add(self, bot_id: str, due_at: float, message: dict[str, Any]) -> ScheduledMessage:
+        item = ScheduledMessage(str(uuid.uuid4()), bot_id, due_at, message)
+        await self._write(item.id, bot_id, due_at, message, move_only=False)
+        return item
+
+    async def update(
+        self, item_id: str, due_at: float | None = None, message: dict[str, Any] | None = None
+    ) -> ScheduledMessage | None:
+        """
+        Перенос/правка; None — записи нет (отменена или отправлена), ScheduleInFlight — запись
+        уже отправляется.
+        """
+        item = await self.get(item_id)
+        if item is None:
+            return None
+        due_at = item.due_at if due_at is None else due_at
+        message = {**item.message, **(message or {})}
+        if not await self._write(item_id, item.bot_id, due_at, message, move_only=True):
+            return None
+        return ScheduledMessage(item_id, item.bot_id, due_at, message)
+
+    async def cancel(self, item_id: str) -> bool:
+        """False — записи нет; ScheduleInFlight — уже отправляется."""
+        while True:
+            current = await self.redis.hget(_ITEM.format(item_id), "bucket")
+            if current is None:
+                return False
+            result = await self._cancel(
+                keys=[_ITEM.format(item_id), _BUCKET.format(current.decode()), _INFLIGHT],
+                args=[item_id, current.decode()],
+            )
+            if result == _IN_FLIGHT:
+                raise ScheduleInFlight(item_id)
+            if result != -1:
+                return bool(result)
+
+    async def pop_due(self, now: float, limit: int) -> list[str]:
+        """Забрать до limit наступивших записей (и записи с истёкшей арендой)."""
+        lease_until = now + _LEASE
+        ids = [
+            item_id.decode()
+            for item_id in await self._reclaim(keys=[_INFLIGHT], args=[now, limit, lease_until])
+        ]
+        buckets = await self.redis.zrangebyscore(_BUCKETS, "-inf", self.bucket_of(now))
+        for bucket in buckets:
+            if len(ids) >= limit:
+                break
+            popped = await self._pop(
+                keys=[_BUCKET.format(bucket.decode()), _BUCKETS, _INFLIGHT],
+                args=[bucket, now, limit - len(ids), lease_until],
+            )
+            ids.extend(item_id.decode() for item_id in popped)
+        return ids
+
+    async def load(self, ids: list[str]) -> list[ScheduledMessage | None]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for item_id in ids:
+                pipe.hgetall(_ITEM.format(item_id))
+            raws = await pipe.execute()
+        return [self._decode(item_id, raw) for item_id, raw in zip(ids, raws)]
+
+    async def ack(self, items: list[tuple[str, float]]) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for item_id, due_at in items:
+                await self._ack(
+                    keys=[_ITEM.format(item_id), _INFLIGHT],
+                    args=[item_id, repr(due_at)],
+                    client=pipe,
+                )
+            await pipe.execute()
+
+
+class ScheduleDispatcher:
+    def __init__(self, store: ScheduleStore, tick: float = 0.5, batch: int = 500) -> None:
+        self.store = store
+        self.tick = tick
+        self.batch = batch
+
+    async def dispatch(self) -> int:
+        """Один проход: наступившие записи → outbox ботов. Возвращает число забранных записей."""
+        now = time.time()
+        ids = await self.store.pop_due(now, self.batch)
+        if not ids:
+            return 0
+        items = await self.store.load(ids)
+        due: list[ScheduledMessage] = []
+        acks: list[tuple[str, float]] = []
+        for item_id, item in zip(ids, items):
+            if item is None:
+                # аренда истекла, и запись уже отправил другой диспетчер — только снять аренду
+                acks.append((item_id, 0.0))
+            else:
+                # перенос и отмену забранной записи скрипты отклоняют: срок у неё не сдвинулся
+                due.append(item)
+        # задержка доставки считается от срока публикации, а не от момента выдачи
+        await delivery.enqueue_many(
+            [(item.bot_id, {**item.message, "enqueued_at": item.due_at}) for item in due]
+        )
+        for item in due:
+            SCHEDULE_LAG.observe(max(0.0, now - item.due_at))
+            acks.append((item.id, item.due_at))
+        SCHEDULE_DISPATCHED.inc(len(due))
+        await self.store.ack(acks)
+        return len(ids)
+
+    async def run(self) -> None:
+        logger.info("schedule: dispatcher started (tick %ss, batch %s)", self.tick, self.batch)
+        while True:
+            try:
+                taken = await self.dispatch()
+            except (RedisError, OSError) as exc:
+                logger.warning("schedule: redis error, retrying: %s", exc)
+                await asyncio.sleep(_REDIS_BACKOFF)
+                continue
+            # полная пачка — сразу следующий проход, пока не разберём отставание
+            if taken < self.batch:
+                await asyncio.sleep(self.tick)
+
+
+_store: ScheduleStore | None = None
+
+
+def schedule_store() -> ScheduleStore:
+    global _store
+    if _store is None:
+        _store = ScheduleStore(get_redis(), bucket_seconds=settings.schedule_bucket_seconds)
+    return _store
+
+
+if __name__ == "__main__":
+    from app.core import tracing
+    from app.core.logging_config import setup_logging
+    from app.services.delivery import OutboxSweeper
+    from app.services.fairqueue import fair_dispatcher
+
+    async def main() -> None:
+        dispatcher = ScheduleDispatcher(
+            schedule_store(), tick=settings.schedule_tick, batch=settings.schedule_batch
+        )
+        sweeper = OutboxSweeper(get_redis(), interval=settings.tg_outbox_sweep_interval)
+        await asyncio.gather(dispatcher.run(), fair_dispatcher(get_redis()).run(), sweeper.run())
+
+    setup_logging()
+    tracing.configure("scheduler")
+    asyncio.run(main())
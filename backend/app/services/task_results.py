@@ -0,0 +1,159 @@
+"""
+Неблокирующее чтение результатов Celery из Redis result backend.
+
+celery.result.AsyncResult ходит в Redis синхронно — в event loop бота это останавливает
+все чаты на время запроса. Здесь те же ключи (celery-task-meta-<id>) читаются async-клиентом:
+пачка id — одним MGET; ожидание завершения — подпиской на канал с тем же именем, куда
+backend публикует результат при записи (так же работает и собственный ResultConsumer Celery).
+Все ожидания процесса делят одно pub/sub-соединение.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from celery import Celery, states
+from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.services.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TaskResult:
+    task_id: str
+    state: str
+    result: Any = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state in states.READY_STATES
+
+    @property
+    def successful(self) -> bool:
+        return self.state == states.SUCCESS
+
+    @property
+    def failed(self) -> bool:
+        return self.state in states.PROPAGATE_STATES
+
+
+class AsyncResultClient:
+    def __init__(self, app: Celery = celery_app, url: str | None = None) -> None:
+        self.app = app
+        self.url = url or str(app.conf.result_backend)
+        self._redis: Redis | None = None
+        self._pubsub: PubSub | None = None
+        self._reader: asyncio.Task[None] | None = None
+        self._waiters: dict[bytes, set[asyncio.Future[TaskResult]]] = {}
+
+    @property
+    def redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(
+                self.url,
+                socket_timeout=settings.redis_socket_timeout,
+                socket_connect_timeout=settings.redis_socket_timeout,
+            )
+        return self._redis
+
+    def key(self, task_id: str) -> bytes:
+        # ключ с учётом префиксов, настроенных в backend
+        return self.app.backend.get_key_for_task(task_id)  # type: ignore[no-any-return]
+
+    def _decode(self, task_id: str, raw: bytes | None) -> TaskResult:
+        if raw is None:
+            # Celery не отличает «неизвестную» задачу от ожидающей
+            return TaskResult(task_id, states.PENDING)
+        meta = self.app.backend.decode_result(raw)
+        return TaskResult(task_id, meta["status"], meta.get("result"))
+
+    async def get(self, task_id: str) -> TaskResult:
+        return (await self.get_many([task_id]))[0]
+
+    async def get_many(self, task_ids: Sequence[str]) -> list[TaskResult]:
+        """Состояния задач одним MGET, в порядке task_ids."""
+        if not task_ids:
+            return []
+        values = await self.redis.mget([self.key(task_id) for task_id in task_ids])
+        return [self._decode(task_id, raw) for task_id, raw in zip(task_ids, values)]
+
+    async def wait(self, task_id: str, timeout: float) -> TaskResult | None:
+        """Результат по готовности (pub/sub) или None по таймауту."""
+        key = self.key(task_id)
+        future: asyncio.Future[TaskResult] = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(key, set())
+        waiters.add(future)
+        try:
+            if len(waiters) == 1:
+                await self._subscribe(key)
+            # задача могла завершиться до подписки
+            current = await self.get(task_id)
+            if current.ready:
+                return current
+            return await asyncio.wait_for(future, timeout)
+        except TimeoutError:
+            return None
+        finally:
+            waiters.discard(future)
+            if not waiters:
+                del self._waiters[key]
+                if self._pubsub is not None:
+                    with contextlib.suppress(RedisError, OSError):
+                        await self._pubsub.unsubscribe(key)
+
+    async def _subscribe(self, key: bytes) -> None:
+        if self._pubsub is None:
+            self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(key)
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read(self._pubsub))
+
+    async def _read(self, pubsub: PubSub) -> None:
+        while True:
+            try:
+                message = await pubsub.get_message(timeout=1.0)
+            except (RedisError, OSError) as exc:
+                # ожидающие досидят до своих таймаутов; новая подписка перезапустит чтение
+                logger.warning("task results: pub/sub failed: %s", exc)
+                self._pubsub = None
+                return
+            if message is None:
+                # как в PubSub.run: точка переключения, даже если чтение не ждало I/O
+                await asyncio.sleep(0)
+                continue
+            channel = message["channel"]
+            futures = self._waiters.get(channel)
+            if not futures:
+                continue
+            meta = self.app.backend.decode_result(message["data"])
+            result = TaskResult(meta["task_id"], meta["status"], meta.get("result"))
+            if result.ready:
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
+
+    async def close(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            # не ждём бесконечно: отмена доходит только на следующем чтении из сокета
+            await asyncio.wait({self._reader}, timeout=2.0)
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+task_results = AsyncResultClient()
@@ -1,5 +1,11 @@
 import logging
+from typing import Any
 
+import httpx
+
+from app.core.config import settings
+from app.core.redis import get_sync_redis
+from app.services import delivery, fairqueue
 from app.services.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
@@ -10,3 +16,34 @@ logger = logging.getLogger(__name__)
 def ping() -> str:
     logger.info("Ping task executed")
     return "pong"
+
+
+@celery_app.task(name="deliver_outbox", ignore_result=True)
+def deliver_outbox(bot_id: str, org_id: str | None = None, lane: str = "default") -> None:
+    """Разобрать outbox бота (см. app.services.delivery); упёрлись в лимиты — продолжить позже."""
+    deliverer = delivery.deliverer()
+    countdown = deliverer.run(bot_id)
+    if countdown is None:
+        return
+    lane = deliverer.reschedule(bot_id, countdown, lane)
+    if countdown == 0 and settings.fair_queue_enabled:
+        # исчерпали max_runtime: в конец очереди организации, чтобы дать дорогу другим
+        fairqueue.submit_sync(
+            get_sync_redis(), org_id, "deliver_outbox", [bot_id, org_id, lane], lane
+        )
+    else:
+        # ожидание лимитов Telegram — мимо справедливой очереди, воркера оно не занимает
+        deliver_outbox.apply_async((bot_id, org_id, lane), countdown=countdown)
+
+
+@celery_app.task(name="send_message", bind=True, max_retries=5)
+def send_message(self: Any, bot_id: str, message: dict[str, Any]) -> int:
+    """Одно сообщение мимо outbox; результат задачи — message_id в Telegram."""
+    try:
+        result = delivery.deliverer().send_now(bot_id, message)
+    except delivery.RetryAfter as exc:
+        # ожидание лимита — не ошибка, число повторов не ограничиваем
+        raise self.retry(countdown=exc.seconds, max_retries=None)
+    except httpx.HTTPError as exc:
+        raise self.retry(exc=exc, countdown=2**self.request.retries)
+    return int(result["message_id"])
@@ -0,0 +1,116 @@
+"""
+Пропускная способность логирования в записях/с с точки зрения вызывающего кода
+(сколько стоит logger.info(...) в хендлере) и до записи на диск:
+
+- sync:   прежняя схема — RotatingFileHandler + json.dumps словаря из 16 полей на root;
+- queue:  app.core.logging_config — BoundedQueueHandler → QueueListener, orjson без пустых полей;
+- sample: то же с LOG_SAMPLING=bench=0.1 (горячий путь, пишется каждая десятая запись).
+
+    PYTHONPATH=backend python benchmarks/bench_logging.py [records]
+
+Пишет во временный каталог; консольный хендлер не участвует, чтобы не мерить терминал.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import time
+from datetime import datetime
+from logging.handlers import QueueListener, RotatingFileHandler
+
+from app.core import context
+from app.core.logging_config import (
+    CORRELATION_FIELDS,
+    BoundedQueueHandler,
+    JSONFormatter,
+    SamplingFilter,
+)
+
+
+class LegacyJSONFormatter(logging.Formatter):
+    """Прежний форматтер: все поля, включая пустые, и json.dumps."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": datetime.utcnow().isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **{name: getattr(record, name, None) for name in CORRELATION_FIELDS},
+        }
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def _file_handler(path: str, formatter: logging.Formatter) -> logging.Handler:
+    handler = RotatingFileHandler(path, maxBytes=50_000_000, backupCount=1, encoding="utf-8")
+    handler.setFormatter(formatter)
+    return handler
+
+
+def _emit(logger: logging.Logger, records: int) -> float:
+    started = time.perf_counter()
+    for i in range(records):
+        logger.info("update handled chat=%s", i, extra={"latency_ms": 1.5})
+    return time.perf_counter() - started
+
+
+def bench_sync(logger: logging.Logger, directory: str, records: int) -> tuple[float, float]:
+    handler = _file_handler(os.path.join(directory, "sync.log"), LegacyJSONFormatter())
+    logger.handlers = [handler]
+    elapsed = _emit(logger, records)
+    handler.close()
+    return elapsed, elapsed
+
+
+def bench_queue(
+    logger: logging.Logger, directory: str, records: int, sampling: str = ""
+) -> tuple[float, float]:
+    handler = _file_handler(os.path.join(directory, "queue.log"), JSONFormatter())
+    # очередь с запасом: здесь меряем скорость, а не отбрасывание
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=records + 1)
+    queue_handler = BoundedQueueHandler(log_queue)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter.from_spec(sampling))
+    logger.handlers = [queue_handler]
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    started = time.perf_counter()
+    caller = _emit(logger, records)
+    listener.stop()
+    total = time.perf_counter() - started
+    handler.close()
+    assert queue_handler.dropped == 0
+    return caller, total
+
+
+def main() -> None:
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    logger = logging.getLogger("bench")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    with (
+        tempfile.TemporaryDirectory() as directory,
+        context.bind(request_id="bench", trace_id="0" * 31 + "1", org_id="org"),
+    ):
+        print(f"records={records}")
+        variants = (
+            ("sync  ", lambda: bench_sync(logger, directory, records)),
+            ("queue ", lambda: bench_queue(logger, directory, records)),
+            ("sample", lambda: bench_queue(logger, directory, records, "bench=0.1")),
+        )
+        for name, bench in variants:
+            caller, total = bench()
+            print(
+                f"{name}: caller {records / caller:10,.0f} rec/s   "
+                f"end-to-end {records / total:10,.0f} rec/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Стоимость лимитера на запрос (app.api.ratelimit.RateLimitMiddleware) относительно пустого
+ASGI-приложения:
+
+- none:  без лимитера;
+- local: токен-бакет в процессе (режим, в который лимитер уходит при недоступном Redis);
+- redis: GCRA-скрипт в Redis по REDIS_URL (пропускается, если Redis не отвечает).
+
+    PYTHONPATH=backend python benchmarks/bench_ratelimit.py [requests]
+
+Лимит заведомо выше нагрузки: меряем проверку, а не отказы. Ключи — по 100 клиентам (IP).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+
+from redis.exceptions import RedisError
+from starlette.types import Receive, Scope, Send
+
+from app.api.ratelimit import RateLimitMiddleware
+from app.core.redis import close_redis, get_redis
+
+CLIENTS = 100
+
+
+async def endpoint(scope: Scope, receive: Receive, send: Send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _noop_receive() -> dict:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _noop_send(_: dict) -> None:
+    return None
+
+
+def _scope(i: int) -> Scope:
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": "/api/v1/users",
+        "headers": [],
+        "client": (f"10.0.0.{i % CLIENTS}", 1),
+    }
+
+
+async def bench(app, requests: int) -> float:
+    scopes = [_scope(i) for i in range(requests)]
+    started = time.perf_counter()
+    for scope in scopes:
+        await app(scope, _noop_receive, _noop_send)
+    return time.perf_counter() - started
+
+
+async def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    limits = {"rate": 1e9, "burst": 10**9}
+    variants = [("none ", endpoint)]
+    local = RateLimitMiddleware(endpoint, **limits)
+    local._redis_down_until = float("inf")
+    variants.append(("local", local))
+    try:
+        await get_redis().ping()
+    except (RedisError, OSError) as exc:
+        print(f"redis: skipped ({exc})")
+    else:
+        # таймаут с запасом: меряем Redis, а не переход на запасной лимитер
+        variants.append(("redis", RateLimitMiddleware(endpoint, redis_timeout=1.0, **limits)))
+
+    print(f"requests={requests}")
+    baseline = None
+    for name, app in variants:
+        await bench(app, min(requests, 1000))  # прогрев: скрипт загружен, пул соединений открыт
+        elapsed = await bench(app, requests)
+        per_request = elapsed / requests * 1e6
+        overhead = "" if baseline is None else f"   overhead {per_request - baseline:8.1f} µs"
+        baseline = per_request if baseline is None else baseline
+        print(f"{name}: {requests / elapsed:10,.0f} req/s   {per_request:8.1f} µs/req{overhead}")
+    await close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
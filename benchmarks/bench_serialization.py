@@ -0,0 +1,83 @@
+"""
+Стоимость сериализации страницы списка на строку: стандартный путь FastAPI
+(ORM-объекты → response_model Page[BotRead] → json) против быстрого
+(Row из выбранных колонок → orjson), см. app.api.responses.page_response.
+
+    PYTHONPATH=backend python benchmarks/bench_serialization.py [rows] [repeats]
+
+Запрос выполняется на in-memory SQLite, чтобы не зависеть от Postgres; в оба
+замера входят выборка, построение строк и кодирование тела.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+import uuid
+from collections.abc import Callable
+
+import orjson
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.api.export import columns_for
+from app.api.v1.schemas.bot import BotRead
+from app.api.v1.schemas.page import Page
+from app.db.models.base import Base
+from app.db.models.bot import Bot
+
+
+def _setup(rows: int) -> Session:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Bot.__table__])
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Bot),
+            [{"id": uuid.uuid4(), "username": f"bot_{i}", "tg_bot_id": i} for i in range(rows)],
+        )
+    return Session(engine)
+
+
+def standard(db: Session, adapter: TypeAdapter[Page[BotRead]]) -> bytes:
+    items = db.execute(select(Bot)).scalars().all()
+    page = adapter.validate_python({"items": items, "next_cursor": None}, from_attributes=True)
+    content = adapter.dump_python(page, mode="json")
+    db.expunge_all()
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def fast(db: Session) -> bytes:
+    items = db.execute(select(*columns_for(Bot, BotRead))).all()
+    return orjson.dumps({"items": [row._asdict() for row in items], "next_cursor": None})
+
+
+def _per_row_us(fn: Callable[[], bytes], rows: int, repeats: int) -> float:
+    fn()  # прогрев
+    best = min(_timed(fn) for _ in range(repeats))
+    return best / rows * 1e6
+
+
+def _timed(fn: Callable[[], bytes]) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    db = _setup(rows)
+    adapter = TypeAdapter(Page[BotRead])
+
+    before = _per_row_us(lambda: standard(db, adapter), rows, repeats)
+    after = _per_row_us(lambda: fast(db), rows, repeats)
+    print(f"rows={rows} repeats={repeats} (best of)")
+    print(f"standard (ORM + pydantic + json): {before:7.2f} us/row")
+    print(f"fast     (Row + orjson):          {after:7.2f} us/row")
+    print(f"speedup: x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
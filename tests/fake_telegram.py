@@ -0,0 +1,69 @@
+"""Локальная подмена Bot API для тестов: aiohttp-сервер, который записывает вызовы."""
+
+from __future__ import annotations
+
+import itertools
+from typing import Any
+
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+
+
+class FakeTelegram:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, str, dict[str, Any]]] = []
+        self._message_ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+        self.api: TelegramAPIServer | None = None
+
+    def called(self, method: str) -> list[dict[str, Any]]:
+        return [params for name, _, params in self.calls if name == method]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        token, method = request.match_info["token"], request.match_info["method"]
+        params = dict(await request.post())
+        self.calls.append((method, token, params))
+        if method == "getMe":
+            bot_id = int(token.split(":")[0])
+            result: Any = {"id": bot_id, "is_bot": True, "first_name": "fake", "username": "fake"}
+        elif method == "sendMessage":
+            result = {
+                "message_id": next(self._message_ids),
+                "date": 0,
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "text": params["text"],
+            }
+        elif method == "getUpdates":
+            result = []
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def __aenter__(self) -> FakeTelegram:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.api = TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def message_update(update_id: int, text: str, chat_id: int = 42) -> dict[str, Any]:
+    user = {"id": chat_id, "is_bot": False, "first_name": "user"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": user,
+            "text": text,
+        },
+    }
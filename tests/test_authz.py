@@ -0,0 +1,221 @@
+import asyncio
+import uuid
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("httpx")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, HTTPException  # noqa: E402
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from app.api import authz  # noqa: E402
+from app.api import export  # noqa: E402
+from app.api.deps import get_db  # noqa: E402
+from app.api.v1.routers import bots, org_users, schedules, users  # noqa: E402
+from app.api.v1.schemas.bulk import OrgUserUpsert  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.db.models import Bot, Organization, OrgUser, User  # noqa: E402
+from app.db.models.base import Base  # noqa: E402
+from app.services.cache import entity_cache  # noqa: E402
+
+ORG = uuid.uuid4()
+BOT = uuid.uuid4()
+OWNER, ADMIN, MEMBER, OUTSIDER = (uuid.uuid4() for _ in range(4))
+
+
+@pytest.fixture(autouse=True)
+def authz_enabled(monkeypatch):
+    monkeypatch.setattr(settings, "authz_enabled", True)
+    # роли — прямо из БД: тест не зависит от Redis
+    monkeypatch.setattr(entity_cache, "enabled", False)
+
+
+async def _database():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+    async with sessionmaker() as db:
+        db.add(Organization(id=ORG, name="org"))
+        for user_id, role in ((OWNER, "owner"), (ADMIN, "admin"), (MEMBER, "member")):
+            db.add(User(id=user_id, display_name=role))
+            db.add(OrgUser(id=uuid.uuid4(), organization_id=ORG, user_id=user_id, role=role))
+        db.add(User(id=OUTSIDER, display_name="outsider"))
+        db.add(Bot(id=BOT, username="bot", token="123:TEST", organization_id=ORG))
+        await db.commit()
+    return engine, sessionmaker
+
+
+async def _membership_id(sessionmaker, user_id):
+    async with sessionmaker() as db:
+        stmt = select(OrgUser.id).where(OrgUser.organization_id == ORG, OrgUser.user_id == user_id)
+        return (await db.execute(stmt)).scalar_one()
+
+
+def _as(user_id):
+    return {"X-User-ID": str(user_id)}
+
+
+def test_required_roles_owner_rows_need_owner():
+    other = uuid.uuid4()
+    assert authz.required_roles(
+        [
+            (ORG, None, "member"),
+            (ORG, "admin", "member"),
+            (other, None, "admin"),
+        ]
+    ) == {ORG: "admin", other: "admin"}
+    # выдача owner и правка поверх owner (в том числе понижение) — только owner
+    assert authz.required_roles([(ORG, None, "admin"), (ORG, None, "owner")]) == {ORG: "owner"}
+    assert authz.required_roles([(ORG, "owner", "member"), (ORG, None, "admin")]) == {ORG: "owner"}
+
+
+def test_membership_routes_enforce_owner_rules():
+    async def scenario():
+        engine, sessionmaker = await _database()
+
+        async def db_override():
+            async with sessionmaker() as db:
+                yield db
+
+        app = FastAPI()
+        app.include_router(org_users.router)
+        app.dependency_overrides[get_db] = db_override
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            grant = {"organization_id": str(ORG), "user_id": str(OUTSIDER), "role": "owner"}
+            assert (await client.post("/org-users", json=grant)).status_code == 401
+            assert (
+                await client.post("/org-users", json=grant, headers=_as(MEMBER))
+            ).status_code == 403
+            assert (
+                await client.post("/org-users", json=grant, headers=_as(ADMIN))
+            ).status_code == 403
+            member = {**grant, "role": "member"}
+            response = await client.post("/org-users", json=member, headers=_as(ADMIN))
+            assert response.status_code == 201, response.text
+
+            owner_row = await _membership_id(sessionmaker, OWNER)
+            response = await client.delete(f"/org-users/{owner_row}", headers=_as(ADMIN))
+            assert response.status_code == 403
+            member_row = await _membership_id(sessionmaker, MEMBER)
+            response = await client.delete(f"/org-users/{member_row}", headers=_as(MEMBER))
+            assert response.status_code == 403
+            response = await client.delete(f"/org-users/{member_row}", headers=_as(ADMIN))
+            assert response.status_code == 204
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_bulk_upsert_owner_rows_need_owner(monkeypatch):
+    async def fake_lock_owners(db, org_ids):
+        # FOR UPDATE и = ANY(:ids) — только Postgres; владельцы — как в _database
+        return {ORG: {OWNER}}
+
+    monkeypatch.setattr(org_users, "lock_owners", fake_lock_owners)
+
+    def keyed(*rows):
+        result = {}
+        for index, (user_id, role) in enumerate(rows):
+            values = OrgUserUpsert(organization_id=ORG, user_id=user_id, role=role).model_dump()
+            result[(ORG, user_id)] = (values, [index])
+        return result
+
+    async def scenario():
+        engine, sessionmaker = await _database()
+
+        async def check(user_id, rows):
+            request = Request({"type": "http", "headers": [(b"x-user-id", str(user_id).encode())]})
+            errors = {}
+            async with sessionmaker() as db:
+                await org_users._authorize_bulk(request, db, rows, errors)
+            return errors
+
+        # admin не выдаёт owner и не понижает owner через :bulkUpsert
+        for rows in (keyed((OUTSIDER, "owner")), keyed((MEMBER, "admin"), (OWNER, "member"))):
+            with pytest.raises(HTTPException) as exc:
+                await check(ADMIN, rows)
+            assert exc.value.status_code == 403
+        assert await check(ADMIN, keyed((OUTSIDER, "member"), (MEMBER, "admin"))) == {}
+        assert await check(OWNER, keyed((OUTSIDER, "owner"))) == {}
+
+        # последнего владельца не понизить и владельцу
+        rows = keyed((MEMBER, "admin"), (OWNER, "admin"))
+        errors = await check(OWNER, rows)
+        assert list(errors) == [1] and errors[1].error == "organization must keep an owner"
+        assert list(rows) == [(ORG, MEMBER)]
+        # передать владение в той же пачке — можно
+        assert await check(OWNER, keyed((MEMBER, "owner"), (OWNER, "admin"))) == {}
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_messages_schedules_and_exports_need_org_role(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # Lua-скрипты расписания
+    from app.services.schedule import ScheduleStore
+
+    queued = []
+
+    async def enqueue(bot_id, message):
+        queued.append(message)
+        return str(uuid.uuid4())
+
+    monkeypatch.setattr(bots.delivery, "enqueue", enqueue)
+    store = ScheduleStore(fakeredis.FakeAsyncRedis())
+    monkeypatch.setattr(schedules, "schedule_store", lambda: store)
+
+    async def scenario():
+        engine, sessionmaker = await _database()
+        monkeypatch.setattr(export, "AsyncSessionLocal", sessionmaker)
+
+        async def db_override():
+            async with sessionmaker() as db:
+                yield db
+
+        app = FastAPI()
+        for module in (bots, org_users, schedules, users):
+            app.include_router(module.router)
+        app.dependency_overrides[get_db] = db_override
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            message = {"chat_id": 1, "text": "hi"}
+            url = f"/bots/{BOT}/messages"
+            assert (await client.post(url, json=message)).status_code == 401
+            assert (await client.post(url, json=message, headers=_as(OUTSIDER))).status_code == 403
+            assert (await client.post(url, json=message, headers=_as(MEMBER))).status_code == 202
+            assert len(queued) == 1
+
+            planned = {**message, "bot_id": str(BOT), "due_at": "2030-01-01T00:00:00Z"}
+            response = await client.post("/schedules", json=planned, headers=_as(OUTSIDER))
+            assert response.status_code == 403
+            response = await client.post("/schedules", json=planned, headers=_as(MEMBER))
+            assert response.status_code == 201, response.text
+            url = f"/schedules/{response.json()['id']}"
+            # чужой не видит, не правит и не отменяет публикацию организации
+            assert (await client.get(url, headers=_as(OUTSIDER))).status_code == 403
+            patch = {"text": "changed"}
+            assert (await client.patch(url, json=patch, headers=_as(OUTSIDER))).status_code == 403
+            assert (await client.delete(url, headers=_as(OUTSIDER))).status_code == 403
+            assert (await client.get(url, headers=_as(MEMBER))).json()["text"] == "hi"
+            assert (await client.delete(url, headers=_as(MEMBER))).status_code == 204
+
+            # выгрузка — только admin и только по своей организации
+            for prefix in ("/bots", "/users", "/org-users"):
+                url = f"{prefix}/export"
+                scoped = {"organization_id": str(ORG)}
+                assert (await client.get(url, headers=_as(OWNER))).status_code == 403
+                response = await client.get(url, params=scoped, headers=_as(MEMBER))
+                assert response.status_code == 403
+                response = await client.get(url, params=scoped, headers=_as(ADMIN))
+                assert response.status_code == 200, response.text
+                assert response.text
+        await engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+
+from app.api.bulk import run_bulk, validate_rows
+from app.api.v1.schemas.bulk import UserUpsert
+from app.db import upserts
+from app.db.models import User
+from app.db.models.base import Base
+
+# :bulkUpsert на живом Postgres (xmax есть только там): postgresql+psycopg://... пустой базы
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+def _rows(*pairs):
+    return [{"tg_user_id": tg_id, "display_name": name} for tg_id, name in pairs]
+
+
+def test_run_bulk_splits_created_and_updated(monkeypatch):
+    monkeypatch.setattr("app.api.bulk.UPSERT_BATCH", 2)
+    existing = {2, 3}
+    written = []
+
+    class FakeSession:
+        async def commit(self):
+            pass
+
+        async def rollback(self):
+            pass
+
+    async def write(db, rows):
+        written.append([row["tg_user_id"] for row in rows])
+        if any(row["tg_user_id"] == 99 for row in rows):
+            raise DBAPIError("INSERT", {}, Exception("boom\ndetails"))
+        return [
+            SimpleNamespace(
+                id=uuid.uuid4(),
+                tg_user_id=r["tg_user_id"],
+                inserted=r["tg_user_id"] not in existing,
+            )
+            for r in rows
+        ]
+
+    # 1 — новый, 2 и 3 — есть, 1 повторяется (побеждает последняя), 99 валит свою пачку
+    raw = _rows((1, "a"), (2, "b"), (3, "c"), (1, "a2"), (99, "x"), (4, "d")) + [{"tg_user_id": 5}]
+    keyed, errors = validate_rows(raw, UserUpsert, key=lambda v: v["tg_user_id"])
+    result = asyncio.run(
+        run_bulk(FakeSession(), len(raw), keyed, errors, write, key=lambda r: r.tg_user_id)
+    )
+
+    assert written == [[1, 2], [3, 99], [4]]
+    assert [r.status for r in result.results] == [
+        "created",
+        "updated",
+        "error",
+        "created",
+        "error",
+        "created",
+        "error",
+    ]
+    assert (result.created, result.updated, result.errors) == (3, 1, 3)
+    assert result.results[0].id == result.results[3].id
+    assert result.results[4].error == "boom"
+
+
+def test_run_bulk_atomic_commits_once_and_fails_whole_request(monkeypatch):
+    monkeypatch.setattr("app.api.bulk.UPSERT_BATCH", 2)
+    events = []
+
+    class FakeSession:
+        async def commit(self):
+            events.append("commit")
+
+        async def rollback(self):
+            events.append("rollback")
+
+    async def write(db, rows):
+        events.append([row["tg_user_id"] for row in rows])
+        if any(row["tg_user_id"] == 99 for row in rows):
+            raise DBAPIError("INSERT", {}, Exception("boom"))
+        return [
+            SimpleNamespace(id=uuid.uuid4(), tg_user_id=r["tg_user_id"], inserted=True)
+            for r in rows
+        ]
+
+    def run(raw):
+        keyed, errors = validate_rows(raw, UserUpsert, key=lambda v: v["tg_user_id"])
+        return asyncio.run(
+            run_bulk(
+                FakeSession(),
+                len(raw),
+                keyed,
+                errors,
+                write,
+                key=lambda r: r.tg_user_id,
+                atomic=True,
+            )
+        )
+
+    # блокировки до run_bulk держатся до конца: один commit после всех пачек
+    result = run(_rows((1, "a"), (2, "b"), (3, "c")))
+    assert events == [[1, 2], [3], "commit"]
+    assert (result.created, result.errors) == (3, 0)
+
+    # ошибка во второй пачке откатывает и первую: ошибка у каждой строки
+    events.clear()
+    result = run(_rows((1, "a"), (2, "b"), (99, "x"), (4, "d")) + [{"tg_user_id": 5}])
+    assert events == [[1, 2], [99, 4], "rollback"]
+    assert (result.created, result.updated, result.errors) == (0, 0, 5)
+    assert [r.error for r in result.results[:4]] == ["boom"] * 4
+
+
+def test_upsert_users_returns_inserted_flag():
+    statements = []
+
+    class CaptureSession:
+        async def execute(self, stmt):
+            statements.append(stmt)
+            return SimpleNamespace(all=list)
+
+    asyncio.run(upserts.upsert_users(CaptureSession(), _rows((1, "a"))))
+    compiled = str(statements[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (tg_user_id) DO UPDATE" in compiled
+    assert compiled.endswith("RETURNING users.id, users.tg_user_id, (xmax = 0) AS inserted")
+
+
+@pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_upsert_users_counts_mixed_batch_on_postgres():
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async def scenario():
+        engine = create_async_engine(DATABASE_URL)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+            async with sessionmaker() as db:
+                await upserts.upsert_users(db, _rows((1, "a"), (2, "b")))
+                await db.commit()
+            raw = _rows((2, "b2"), (3, "c"), (1, "a"))
+            keyed, errors = validate_rows(raw, UserUpsert, key=lambda v: v["tg_user_id"])
+            async with sessionmaker() as db:
+                result = await run_bulk(
+                    db, len(raw), keyed, errors, upserts.upsert_users, key=lambda r: r.tg_user_id
+                )
+            return result
+        finally:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+            await engine.dispose()
+
+    result = asyncio.run(scenario())
+    assert [r.status for r in result.results] == ["updated", "created", "updated"]
+    assert (result.created, result.updated, result.errors) == (1, 2, 0)
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from redis.exceptions import ConnectionError  # noqa: E402
+
+from app.services import cache  # noqa: E402
+from app.services.cache import EntityCache, LocalLRU  # noqa: E402
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(cache, "get_redis", lambda: client)
+    return client
+
+
+def _cache() -> EntityCache:
+    return EntityCache(LocalLRU(maxsize=100, ttl=30.0), redis_ttl=300)
+
+
+class Rows:
+    """Загрузчик поверх «таблицы»: считает обращения, может остановиться посреди чтения."""
+
+    def __init__(self, **values):
+        self.values = values
+        self.loads = 0
+        self.gate: asyncio.Event | None = None
+
+    async def load(self):
+        self.loads += 1
+        value = dict(self.values)
+        if self.gate is not None:
+            await self.gate.wait()
+        return value
+
+
+def test_invalidate_drops_both_tiers(redis):
+    async def scenario():
+        entity_cache = _cache()
+        rows = Rows(name="old")
+        assert await entity_cache.get_or_load("bots", 1, rows.load) == {"name": "old"}
+        assert await entity_cache.get_or_load("bots", 1, rows.load) == {"name": "old"}
+        assert rows.loads == 1
+        assert await redis.get("ttq:cache:bots:1") == b'{"name": "old"}'
+
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(cache.INVALIDATION_CHANNEL)
+        rows.values["name"] = "new"
+        await entity_cache.invalidate("bots", 1)
+        message = None
+        for _ in range(3):  # первым приходит подтверждение подписки (get_message вернёт None)
+            message = message or await pubsub.get_message(timeout=1.0)
+        assert message is not None and message["data"] == b'["bots:1"]'
+        assert await redis.get("ttq:cache:bots:1") is None
+        assert await entity_cache.get_or_load("bots", 1, rows.load) == {"name": "new"}
+        assert rows.loads == 2
+        await pubsub.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_listener_drops_local_copy_of_other_worker(redis):
+    async def scenario():
+        reader, writer = _cache(), _cache()
+        rows = Rows(name="old")
+        await reader.get_or_load("bots", 1, rows.load)
+        listener = asyncio.create_task(reader.listen())
+        await asyncio.sleep(0.1)
+
+        rows.values["name"] = "new"
+        await writer.invalidate("bots", 1)
+        for _ in range(50):
+            if len(reader.local) == 0:
+                break
+            await asyncio.sleep(0.02)
+        assert await reader.get_or_load("bots", 1, rows.load) == {"name": "new"}
+        listener.cancel()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_load_racing_invalidation_is_not_cached(redis, strict):
+    async def scenario():
+        entity_cache = _cache()
+        rows = Rows(name="old")
+        rows.gate = asyncio.Event()
+        # загрузчик прочитал строку до правки и застрял, правка инвалидирует кэш
+        loading = asyncio.create_task(entity_cache.get_or_load("bots", 1, rows.load, strict=strict))
+        await asyncio.sleep(0.05)
+        rows.values["name"] = "new"
+        await entity_cache.invalidate("bots", 1, strict=strict)
+        rows.gate.set()
+        assert await loading == {"name": "old"}
+
+        # старое значение не попало ни в Redis, ни в локальный уровень
+        assert await redis.get("ttq:cache:bots:1") is None
+        assert len(entity_cache.local) == 0
+        assert await entity_cache.get_or_load("bots", 1, rows.load, strict=strict) == {
+            "name": "new"
+        }
+        assert await redis.get("ttq:cache:bots:1") == b'{"name": "new"}'
+
+    asyncio.run(scenario())
+
+
+def test_strict_reads_bypass_cache_until_invalidation_reaches_redis(redis, monkeypatch):
+    monkeypatch.setattr(cache, "_RETRY_INTERVAL", 0.05)
+
+    async def scenario():
+        entity_cache = _cache()
+        rows = Rows(role="owner")
+        await entity_cache.get_or_load("org_roles", 1, rows.load, strict=True)
+
+        pipeline = redis.pipeline
+
+        def broken(*args, **kwargs):
+            raise ConnectionError("redis is down")
+
+        monkeypatch.setattr(redis, "pipeline", broken)
+        rows.values["role"] = "member"
+        await entity_cache.invalidate("org_roles", 1, strict=True)
+        # в Redis ещё старая роль — читаем мимо кэша
+        assert await redis.get("ttq:cache:org_roles:1") is not None
+        for _ in range(2):
+            assert await entity_cache.get_or_load("org_roles", 1, rows.load, strict=True) == {
+                "role": "member"
+            }
+        assert rows.loads == 3
+
+        monkeypatch.setattr(redis, "pipeline", pipeline)
+        await asyncio.sleep(0.2)
+        assert await redis.get("ttq:cache:org_roles:1") is None
+        await entity_cache.get_or_load("org_roles", 1, rows.load, strict=True)
+        await entity_cache.get_or_load("org_roles", 1, rows.load, strict=True)
+        assert rows.loads == 4
+
+    asyncio.run(scenario())
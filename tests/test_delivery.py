@@ -0,0 +1,197 @@
+import uuid
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # Lua-скрипты в fakeredis
+
+import httpx  # noqa: E402
+import orjson  # noqa: E402
+from sqlalchemy import create_engine, update  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.db.models import Bot  # noqa: E402
+from app.db.models.base import Base  # noqa: E402
+from app.services import delivery  # noqa: E402
+from app.services.delivery import (  # noqa: E402
+    OUTBOX,
+    DeliveryError,
+    OutboxDeliverer,
+    RetryAfter,
+    SendLimiter,
+)
+
+BOT = str(uuid.uuid4())
+
+
+class FakeAPI:
+    """Bot API: записывает отправленное; fail — исключение на текст сообщения (один раз)."""
+
+    def __init__(self, **fail):
+        self.sent = []
+        self.fail = fail
+
+    def call(self, token, method, payload):
+        error = self.fail.pop(payload["text"], None)
+        if error is not None:
+            raise error
+        self.sent.append(payload["text"])
+        return {"message_id": len(self.sent)}
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.fixture(autouse=True)
+def token(monkeypatch):
+    monkeypatch.setattr(delivery, "bot_token", lambda bot_id: "123:TEST")
+
+
+def _deliverer(client, api, **limits):
+    limits = {"bot_rate": 1000.0, "chat_rate": 1000.0, "group_per_minute": 6000.0, **limits}
+    return OutboxDeliverer(client=client, limiter=SendLimiter(client, **limits), api=api)
+
+
+def _push(client, *messages):
+    for text, chat_id, *lane in messages:
+        body = {"id": text, "text": text, "chat_id": chat_id}
+        if lane:
+            body["priority"] = lane[0]
+        client.rpush(OUTBOX.format(BOT, lane[0] if lane else "default"), orjson.dumps(body))
+
+
+def _left(client):
+    keys = [*(OUTBOX.format(BOT, lane) for lane in delivery.LANES), f"ttq:outbox:{BOT}:processing"]
+    return {
+        key.rsplit(":", 1)[1]: [orjson.loads(raw)["text"] for raw in client.lrange(key, 0, -1)]
+        for key in keys
+        if client.llen(key)
+    }
+
+
+def test_token_buckets_limit_bot_chat_and_group(client):
+    limiter = SendLimiter(client, bot_rate=3.0, chat_rate=1.0, group_per_minute=2.0)
+    assert limiter.acquire(BOT, 1) == (0, False)
+    wait, chat_limited = limiter.acquire(BOT, 1)
+    assert chat_limited and 0.9 < wait <= 1.0
+
+    # группа: ёмкость min(в минуту, 3), пополнение — по 2 в минуту
+    assert limiter.acquire(BOT, -100) == (0, False)
+    assert limiter.acquire(BOT, -100) == (0, False)
+    # у бота кончились токены (3 в секунду): ждём бота, а не чат
+    wait, chat_limited = limiter.acquire(BOT, 2)
+    assert not chat_limited and 0 < wait <= 1 / 3
+
+    other = str(uuid.uuid4())
+    assert limiter.acquire(other, -100) == (0, False)
+    assert limiter.acquire(other, -100) == (0, False)
+    wait, chat_limited = limiter.acquire(other, -100)
+    assert chat_limited and 29 < wait <= 30
+
+    limiter.pause(other, 5)
+    wait, chat_limited = limiter.acquire(other, 3)
+    assert not chat_limited and 4.9 < wait <= 5
+
+
+def test_run_sends_lanes_in_order_and_clears_state(client):
+    _push(client, ("d1", 1), ("b1", 2, "bulk"), ("h1", 3, "high"), ("d2", 1))
+    client.set(f"ttq:outbox:{BOT}:scheduled", 1)
+    api = FakeAPI()
+
+    assert _deliverer(client, api).run(BOT) is None
+    assert api.sent == ["h1", "d1", "d2", "b1"]
+    assert _left(client) == {}
+    assert not client.exists(f"ttq:outbox:{BOT}:scheduled", f"ttq:outbox:{BOT}:running")
+
+
+def test_run_skips_bot_locked_by_another_task(client):
+    _push(client, ("d1", 1))
+    client.set(f"ttq:outbox:{BOT}:running", "other")
+    api = FakeAPI()
+    assert _deliverer(client, api).run(BOT) is None
+    assert api.sent == [] and _left(client) == {"default": ["d1"]}
+
+
+def test_failed_message_is_acked_and_retry_after_requeues_rest(client):
+    _push(client, ("d1", 1), ("bad", 2), ("d2", 3), ("d3", 4), ("h1", 5, "high"))
+    api = FakeAPI(bad=DeliveryError("chat not found"), d3=RetryAfter(7))
+
+    assert _deliverer(client, api).run(BOT) == 7
+    assert api.sent == ["h1", "d1", "d2"]
+    # ошибка 4xx не повторяется, 429 возвращает остаток пачки в голову outbox
+    assert _left(client) == {"default": ["d3"]}
+    assert 6000 < client.pttl(f"ttq:tg:send:{BOT}:pause") <= 7000
+
+
+def test_network_error_requeues_with_attempts(client):
+    _push(client, ("d1", 1), ("d2", 2))
+    api = FakeAPI(d1=httpx.ConnectError("down"))
+
+    assert _deliverer(client, api).run(BOT) == 2.0
+    raw = client.lrange(OUTBOX.format(BOT, "default"), 0, -1)
+    assert [(m["text"], m.get("attempts")) for m in map(orjson.loads, raw)] == [
+        ("d1", 1),
+        ("d2", None),
+    ]
+    assert _left(client) == {"default": ["d1", "d2"]}
+
+
+def test_chat_limit_defers_only_that_chat(client):
+    _push(client, ("a1", 1), ("a2", 1), ("b1", 2))
+    api = FakeAPI()
+
+    wait = _deliverer(client, api, chat_rate=0.5).run(BOT)
+    # a2 ждёт лимита своего чата, b1 ушёл; вся оставшаяся пачка ждёт — пауза до освобождения
+    assert api.sent == ["a1", "b1"]
+    assert 1.9 < wait <= 2.0
+    assert _left(client) == {"default": ["a2"]}
+
+
+def test_recover_returns_unacked_batch_to_head(client):
+    # задача упала посреди пачки: сообщения в списке обработки, outbox уже пополнили
+    processing = f"ttq:outbox:{BOT}:processing"
+    for text, lane in (("h0", "high"), ("d0", "default")):
+        body = {"id": text, "text": text, "chat_id": 9, "priority": lane}
+        client.rpush(processing, orjson.dumps(body))
+    _push(client, ("d1", 1), ("h1", 3, "high"))
+
+    deliverer = _deliverer(client, FakeAPI())
+    deliverer._recover(BOT)
+    assert _left(client) == {"high": ["h0", "h1"], "default": ["d0", "d1"]}
+
+    # _ack снимает из списка обработки ровно одно сообщение
+    batch = deliverer._pop(BOT)
+    assert _left(client) == {"default": ["d0", "d1"], "processing": ["h0", "h1"]}
+    deliverer._ack(BOT, batch[0])
+    assert _left(client)["processing"] == ["h1"]
+    deliverer._requeue(BOT, [orjson.loads(batch[1])])
+    assert _left(client) == {"high": ["h1"], "default": ["d0", "d1"]}
+
+
+def test_inactive_bot_drops_outbox_but_activation_is_seen_at_once(client, monkeypatch):
+    monkeypatch.undo()  # настоящий bot_token поверх SQLite
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(Bot(id=uuid.UUID(BOT), username="bot", token="123:TEST", is_active=False))
+        db.commit()
+    monkeypatch.setattr(delivery, "get_sync_engine", lambda: engine)
+    monkeypatch.setattr(delivery, "_tokens", delivery.LocalLRU(maxsize=10, ttl=60.0))
+
+    _push(client, ("d1", 1))
+    client.rpush(f"ttq:outbox:{BOT}:processing", orjson.dumps({"id": "p", "chat_id": 1}))
+    client.set(f"ttq:outbox:{BOT}:scheduled", 1)
+    api = FakeAPI()
+    assert _deliverer(client, api).run(BOT) is None
+    assert _left(client) == {} and not client.exists(f"ttq:outbox:{BOT}:scheduled")
+
+    # бота включили сразу после отказа: отказ не закэширован, сообщение уходит
+    with Session(engine) as db:
+        db.execute(update(Bot).values(is_active=True))
+        db.commit()
+    _push(client, ("d2", 1))
+    assert _deliverer(client, api).run(BOT) is None
+    assert api.sent == ["d2"]
+    engine.dispose()
@@ -0,0 +1,122 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("httpx")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import update  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.api.deps import get_db  # noqa: E402
+from app.api.v1.routers import users  # noqa: E402
+from app.db.models import User  # noqa: E402
+from app.db.models.base import Base  # noqa: E402
+from app.services.cache import entity_cache  # noqa: E402
+
+USER = uuid.uuid4()
+STARTED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(entity_cache, "enabled", False)
+
+
+def _run(scenario):
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+        async with sessionmaker() as db:
+            db.add(User(id=USER, display_name="user", created_at=STARTED, updated_at=STARTED))
+            await db.commit()
+
+        async def db_override():
+            async with sessionmaker() as db:
+                yield db
+
+        async def touch():
+            # правка «из другого запроса»: updated_at в SQLite — с точностью до секунды
+            async with sessionmaker() as db:
+                stmt = update(User).where(User.id == USER)
+                await db.execute(stmt.values(updated_at=STARTED + timedelta(hours=1)))
+                await db.commit()
+
+        app = FastAPI()
+        app.include_router(users.router)
+        app.dependency_overrides[get_db] = db_override
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await scenario(client, touch)
+        await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_entity_etag_is_strong_and_if_none_match_gives_304():
+    async def scenario(client, touch):
+        response = await client.get(f"/users/{USER}")
+        etag = response.headers["etag"]
+        assert response.status_code == 200 and not etag.startswith("W/")
+
+        cached = await client.get(f"/users/{USER}", headers={"If-None-Match": etag})
+        assert cached.status_code == 304 and cached.content == b""
+        assert cached.headers["etag"] == etag
+        # If-None-Match сравнивает слабо: W/ перед тем же тегом тоже совпадает
+        weak = await client.get(f"/users/{USER}", headers={"If-None-Match": f"W/{etag}"})
+        assert weak.status_code == 304
+
+        await touch()
+        changed = await client.get(f"/users/{USER}", headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+    _run(scenario)
+
+
+def test_page_etag_is_weak():
+    async def scenario(client, touch):
+        response = await client.get("/users")
+        etag = response.headers["etag"]
+        assert response.status_code == 200 and etag.startswith('W/"')
+        assert (await client.get("/users", headers={"If-None-Match": etag})).status_code == 304
+        # другая страница того же набора — другой тег
+        other = await client.get("/users", params={"limit": 1})
+        assert other.headers["etag"] != etag
+
+        await touch()
+        changed = await client.get("/users", headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+    _run(scenario)
+
+
+def test_patch_if_match_is_strong():
+    async def scenario(client, touch):
+        etag = (await client.get(f"/users/{USER}")).headers["etag"]
+        url = f"/users/{USER}"
+
+        # слабый тег при If-Match не совпадает ни с чем
+        weak = await client.patch(
+            url, json={"display_name": "x"}, headers={"If-Match": f"W/{etag}"}
+        )
+        assert weak.status_code == 412
+
+        ok = await client.patch(url, json={"display_name": "a"}, headers={"If-Match": etag})
+        assert ok.status_code == 200, ok.text
+        assert ok.json()["display_name"] == "a" and ok.headers["etag"]
+
+        await touch()
+        stale = await client.patch(url, json={"display_name": "b"}, headers={"If-Match": etag})
+        assert stale.status_code == 412
+        assert (await client.get(url)).json()["display_name"] == "a"
+
+        star = await client.patch(url, json={"display_name": "c"}, headers={"If-Match": "*"})
+        assert star.status_code == 200
+
+    _run(scenario)
@@ -0,0 +1,160 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("httpx")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.api.deps import get_db  # noqa: E402
+from app.api.v1.routers import bots, org_users  # noqa: E402
+from app.db.models import Bot, Organization, OrgUser, User  # noqa: E402
+from app.db.models.base import Base  # noqa: E402
+
+
+async def _seed(sessionmaker, rows: int) -> None:
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    async with sessionmaker() as db:
+        orgs = [Organization(id=uuid.uuid4(), name=f"org-{i}") for i in range(3)]
+        db.add_all(orgs)
+        for i in range(rows):
+            created_at = started + timedelta(seconds=i)
+            org = orgs[i % len(orgs)]
+            user = User(id=uuid.uuid4(), display_name=f"user-{i}", created_at=created_at)
+            db.add_all(
+                [
+                    user,
+                    Bot(
+                        id=uuid.uuid4(),
+                        username=f"bot_{i}",
+                        organization_id=org.id,
+                        created_at=created_at,
+                    ),
+                    OrgUser(
+                        id=uuid.uuid4(),
+                        organization_id=org.id,
+                        user_id=user.id,
+                        role="member",
+                        created_at=created_at,
+                    ),
+                ]
+            )
+        await db.commit()
+
+
+def _count_queries(rows: int) -> dict[str, tuple[int, dict]]:
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+        await _seed(sessionmaker, rows)
+
+        statements: list[str] = []
+        event.listen(
+            engine.sync_engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+
+        async def db_override():
+            async with sessionmaker() as db:
+                yield db
+
+        app = FastAPI()
+        app.include_router(bots.router)
+        app.include_router(org_users.router)
+        app.dependency_overrides[get_db] = db_override
+
+        results = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for url in (
+                "/bots?limit=200",
+                "/bots?limit=200&expand=organization",
+                "/org-users?limit=200&expand=organization,user",
+            ):
+                statements.clear()
+                response = await client.get(url)
+                assert response.status_code == 200, response.text
+                results[url] = (len(statements), response.json())
+            assert (await client.get("/bots?expand=owner")).status_code == 400
+        await engine.dispose()
+        return results
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("rows", [5, 60])
+def test_expand_loads_relations_in_fixed_number_of_queries(rows):
+    results = _count_queries(rows)
+
+    plain_queries, plain = results["/bots?limit=200"]
+    assert plain_queries == 1
+    assert len(plain["items"]) == rows
+    assert "organization" not in plain["items"][0]
+
+    # страница + по запросу на связь — независимо от числа строк
+    bot_queries, expanded = results["/bots?limit=200&expand=organization"]
+    assert bot_queries == 2
+    assert len(expanded["items"]) == rows
+    for item in expanded["items"]:
+        assert item["organization"]["id"] == item["organization_id"]
+
+    member_queries, members = results["/org-users?limit=200&expand=organization,user"]
+    assert member_queries == 3
+    for item in members["items"]:
+        assert item["organization"]["id"] == item["organization_id"]
+        assert item["user"]["id"] == item["user_id"]
+
+
+def test_org_user_routes_without_expand_or_with_one_relation():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+        await _seed(sessionmaker, 3)
+
+        async def db_override():
+            async with sessionmaker() as db:
+                yield db
+
+        app = FastAPI()
+        app.include_router(org_users.router)
+        app.dependency_overrides[get_db] = db_override
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            plain = await client.get("/org-users")
+            assert plain.status_code == 200, plain.text
+            items = plain.json()["items"]
+            assert len(items) == 3
+            assert not {"organization", "user"} & set(items[0])
+
+            # связь, которую не просили, не читается (lazy="raise") и в ответ не попадает
+            for name, other in (("organization", "user"), ("user", "organization")):
+                page = await client.get("/org-users", params={"expand": name})
+                assert page.status_code == 200, page.text
+                for item in page.json()["items"]:
+                    assert item[name]["id"] == item[f"{name}_id"] and other not in item
+
+                one = await client.get(f"/org-users/{items[0]['id']}", params={"expand": name})
+                assert one.status_code == 200, one.text
+                assert one.json()[name]["id"] == items[0][f"{name}_id"]
+                assert other not in one.json()
+
+            single = await client.get(f"/org-users/{items[0]['id']}")
+            assert single.status_code == 200, single.text
+            assert single.json() == items[0]
+            missing = await client.get(f"/org-users/{uuid.uuid4()}")
+            assert missing.status_code == 404
+        await engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # Lua-скрипты в fakeredis
+
+import orjson  # noqa: E402
+from kombu.exceptions import OperationalError  # noqa: E402
+
+from app.services import fairqueue  # noqa: E402
+from app.services.fairqueue import INFLIGHT, FairDispatcher, release, submit  # noqa: E402
+
+ORG_A, ORG_B = "org-a", "org-b"
+
+
+class Broker:
+    """Вместо send_task: записывает (org, lane, args) и поток; fail_on — номер падающей отправки."""
+
+    def __init__(self, fail_on: int | None = None):
+        self.sent = []
+        self.threads = set()
+        self.fail_on = fail_on
+
+    def forward(self, org, lane, item):
+        self.threads.add(threading.current_thread().name)
+        if self.fail_on is not None and len(self.sent) == self.fail_on:
+            self.fail_on = None
+            raise OperationalError("broker is down")
+        self.sent.append((org, lane, item["args"][0]))
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = Broker()
+    monkeypatch.setattr(FairDispatcher, "_forward", broker.forward)
+    return broker
+
+
+async def _fill(client, org, lane, count, start=0):
+    for i in range(start, start + count):
+        await submit(client, org, "deliver_outbox", [f"{org}-{lane}-{i}"], lane)
+
+
+def test_lanes_are_strict_priority(server, broker):
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis(server=server)
+        await _fill(client, ORG_A, "bulk", 2)
+        await _fill(client, ORG_B, "default", 2)
+        await _fill(client, ORG_A, "high", 1)
+        dispatcher = FairDispatcher(client, max_inflight=3)
+
+        assert await dispatcher.dispatch() == 3
+        assert [lane for _, lane, _ in broker.sent] == ["high", "default", "default"]
+        # мест нет, пока задачи не завершились
+        assert await dispatcher.dispatch() == 0
+        assert await client.zcard(INFLIGHT) == 3
+
+    asyncio.run(scenario())
+
+
+def test_weights_split_slots_within_lane(server, broker):
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis(server=server)
+        await _fill(client, ORG_A, "default", 10)
+        await _fill(client, ORG_B, "default", 10)
+        dispatcher = FairDispatcher(client, weights={ORG_A: 2.0}, max_inflight=6)
+
+        assert await dispatcher.dispatch() == 6
+        orgs = [org for org, _, _ in broker.sent]
+        assert orgs.count(ORG_A) == 4 and orgs.count(ORG_B) == 2
+        # порядок внутри организации — FIFO
+        assert [args for org, _, args in broker.sent if org == ORG_A] == [
+            f"{ORG_A}-default-{i}" for i in range(4)
+        ]
+
+    asyncio.run(scenario())
+
+
+def test_deficit_carries_over_passes_and_is_dropped_with_drained_queue(server, broker):
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis(server=server)
+        await _fill(client, ORG_A, "default", 2)
+        dispatcher = FairDispatcher(client, weights={ORG_A: 0.5}, max_inflight=10)
+
+        # вес 0.5: за проход дефицит не дорос до задачи, но копится дальше
+        assert await dispatcher.dispatch() == 0
+        assert dispatcher._deficit[("default", ORG_A)] == 0.5
+        assert await dispatcher.dispatch() == 1
+        # остаток второго круга того же прохода (0.5) переходит на следующий
+        assert await dispatcher.dispatch() == 1
+        assert broker.sent == [(ORG_A, "default", f"{ORG_A}-default-{i}") for i in range(2)]
+
+        # очередь опустела — организация уходит из круга вместе с дефицитом
+        assert not await client.sismember("ttq:fq:default:active", ORG_A)
+        assert await dispatcher.dispatch() == 0
+        assert ("default", ORG_A) not in dispatcher._deficit
+        assert list(dispatcher._rings["default"]) == []
+
+    asyncio.run(scenario())
+
+
+def test_release_and_expired_slots_free_capacity(server, broker):
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis(server=server)
+        await _fill(client, ORG_A, "default", 3)
+        dispatcher = FairDispatcher(client, max_inflight=2, inflight_ttl=60.0)
+
+        assert await dispatcher.dispatch() == 2
+        task_ids = [raw.decode() for raw in await client.zrange(INFLIGHT, 0, -1)]
+        # task_postrun воркера (синхронный клиент) освобождает место
+        release(fakeredis.FakeRedis(server=server), task_ids[0])
+        assert await dispatcher.capacity() == 1
+
+        # задача воркера, упавшего без task_postrun, перестаёт занимать место через inflight_ttl
+        await client.zadd(INFLIGHT, {task_ids[1]: time.time() - 61})
+        assert await dispatcher.capacity() == 2
+        assert await dispatcher.dispatch() == 1
+
+    asyncio.run(scenario())
+
+
+def test_broker_error_returns_unsent_tasks_to_head(server, broker):
+    broker.fail_on = 1
+
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis(server=server)
+        await _fill(client, ORG_A, "default", 3)
+        dispatcher = FairDispatcher(client, max_inflight=10)
+
+        with pytest.raises(OperationalError):
+            await dispatcher.dispatch()
+        assert [args for _, _, args in broker.sent] == [f"{ORG_A}-default-0"]
+        # место держит только отправленная задача, остальные — снова в голове очереди
+        assert await client.zcard(INFLIGHT) == 1
+        queued = await client.lrange(f"ttq:fq:default:{ORG_A}", 0, -1)
+        assert [orjson.loads(raw)["args"][0] for raw in queued] == [
+            f"{ORG_A}-default-1",
+            f"{ORG_A}-default-2",
+        ]
+        assert await client.sismember("ttq:fq:default:active", ORG_A)
+
+        assert await dispatcher.dispatch() == 2
+        assert [args for _, _, args in broker.sent][1:] == queued_args(queued)
+        # send_task не выполняется в потоке event loop
+        assert threading.current_thread().name not in broker.threads
+
+    def queued_args(raw):
+        return [orjson.loads(item)["args"][0] for item in raw]
+
+    asyncio.run(scenario())
+
+
+def test_parse_weights():
+    assert fairqueue.parse_weights("a=4, b=0.5,,c=-1,bad") == {"a": 4.0, "b": 0.5, "c": 0.0}
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+fakeredis = pytest.importorskip("fakeredis")
+
+from aiogram.fsm.state import State, StatesGroup  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+
+from app.adapters.telegram import fsm  # noqa: E402
+from app.adapters.telegram.fsm import RedisFSMStorage, parse_state_ttls  # noqa: E402
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=7)
+
+
+class Order(StatesGroup):
+    address = State()
+    confirm = State()
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeAsyncRedis()
+    monkeypatch.setattr(fsm, "get_redis", lambda: client)
+    return client
+
+
+def _storage(**kwargs) -> RedisFSMStorage:
+    return RedisFSMStorage(
+        ttl=86400, state_ttls=parse_state_ttls("Order:address=900,Order=3600"), **kwargs
+    )
+
+
+def test_parse_state_ttls():
+    assert parse_state_ttls("Order:address=900, Order=3600,,bad") == {
+        "Order:address": 900,
+        "Order": 3600,
+    }
+
+
+def test_state_and_data_round_trip_across_processes(redis):
+    async def scenario():
+        storage = _storage()
+        await storage.set_state(KEY, Order.address)
+        await storage.set_data(KEY, {"items": [1, 2], "note": "у двери"})
+        data = await storage.get_data(KEY)
+        data["items"].append(3)
+        data["note"] = "changed"  # копия: кэш не трогаем
+        await storage.close()
+
+        # новый процесс (пустой локальный уровень) видит то же самое
+        restarted = _storage()
+        assert await restarted.get_state(KEY) == "Order:address"
+        assert await restarted.get_data(KEY) == {"items": [1, 2], "note": "у двери"}
+        # смена состояния не теряет данные
+        await restarted.set_state(KEY, Order.confirm)
+        assert await restarted.get_data(KEY) == {"items": [1, 2], "note": "у двери"}
+
+        await restarted.set_state(KEY, None)
+        await restarted.set_data(KEY, {})
+        assert await redis.keys("ttq:fsm:*") == []
+        await restarted.close()
+
+        fresh = _storage()
+        assert await fresh.get_state(KEY) is None and await fresh.get_data(KEY) == {}
+        await fresh.close()
+
+    asyncio.run(scenario())
+
+
+def test_ttl_follows_state(redis):
+    async def scenario():
+        storage = _storage()
+        redis_key = storage.key_builder.build(KEY)
+
+        await storage.set_data(KEY, {"step": 1})
+        assert await redis.ttl(redis_key) == 86400
+        await storage.set_state(KEY, Order.address)
+        assert await redis.ttl(redis_key) == 900
+        # у состояния своего TTL нет — берётся TTL группы
+        await storage.set_state(KEY, Order.confirm)
+        assert await redis.ttl(redis_key) == 3600
+        await storage.set_data(KEY, {"step": 2})
+        assert await redis.ttl(redis_key) == 3600
+        await storage.close()
+
+        forever = RedisFSMStorage(ttl=0)
+        await forever.set_data(KEY, {"step": 3})
+        assert await redis.ttl(redis_key) == -1
+        await forever.close()
+
+    asyncio.run(scenario())
+
+
+def test_write_drops_local_copy_in_other_process(redis):
+    async def scenario():
+        reader, writer = _storage(), _storage()
+        try:
+            await reader.set_state(KEY, Order.address)
+            assert await writer.get_state(KEY) == "Order:address"
+            await asyncio.sleep(0.1)  # слушатели подписались
+
+            await writer.set_state(KEY, Order.confirm)
+            for _ in range(50):
+                if await reader.get_state(KEY) == "Order:confirm":
+                    break
+                await asyncio.sleep(0.02)
+            assert await reader.get_state(KEY) == "Order:confirm"
+        finally:
+            # close — отдельной задачей: отмена слушателя посреди get_message fakeredis,
+            # дожидаемая прямо из главной задачи, в Python 3.11 может зависнуть
+            await asyncio.wait_for(reader.close(), 3)
+            await asyncio.wait_for(writer.close(), 3)
+
+    asyncio.run(scenario())
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # Lua-скрипты в fakeredis
+pytest.importorskip("httpx")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.api import idempotency  # noqa: E402
+from app.api.idempotency import IdempotencyMiddleware  # noqa: E402
+
+LOCK = "ttq:idem:user-1:k1:lock"
+
+
+def _app(redis, calls, **kwargs) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/items")
+    async def create(request: Request):
+        body = await request.json()
+        calls.append(body)
+        await asyncio.sleep(body.get("sleep", 0))
+        if body.get("fail"):
+            return JSONResponse({"detail": "boom"}, status_code=503)
+        return JSONResponse({"n": len(calls)}, status_code=201, headers={"x-item": "1"})
+
+    app.add_middleware(IdempotencyMiddleware, redis=redis, **kwargs)
+    return app
+
+
+def _run(scenario, **kwargs):
+    async def main():
+        redis = fakeredis.FakeAsyncRedis()
+        calls = []
+        transport = httpx.ASGITransport(app=_app(redis, calls, **kwargs))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await scenario(client, redis, calls)
+
+    asyncio.run(main())
+
+
+def _post(client, body, key="k1", user="user-1"):
+    headers = {"Idempotency-Key": key, "X-User-ID": user}
+    return client.post("/items", json=body, headers=headers)
+
+
+def test_replay_after_success_skips_handler():
+    async def scenario(client, redis, calls):
+        first = await _post(client, {"a": 1})
+        assert first.status_code == 201 and first.json() == {"n": 1}
+        assert "idempotent-replayed" not in first.headers
+
+        again = await _post(client, {"a": 1})
+        assert again.status_code == 201 and again.json() == {"n": 1}
+        assert again.headers["idempotent-replayed"] == "true"
+        assert again.headers["x-item"] == "1"
+        assert len(calls) == 1
+        assert not await redis.exists(LOCK)
+
+        # ключи разделены по X-User-ID
+        other = await _post(client, {"a": 1}, user="user-2")
+        assert other.json() == {"n": 2} and "idempotent-replayed" not in other.headers
+
+    _run(scenario)
+
+
+def test_same_key_with_different_body_is_rejected():
+    async def scenario(client, redis, calls):
+        assert (await _post(client, {"a": 1})).status_code == 201
+        mismatch = await _post(client, {"a": 2})
+        assert mismatch.status_code == 422
+        assert len(calls) == 1
+
+    _run(scenario)
+
+
+def test_server_error_is_not_stored():
+    async def scenario(client, redis, calls):
+        assert (await _post(client, {"fail": True})).status_code == 503
+        assert (await _post(client, {"fail": True})).status_code == 503
+        assert len(calls) == 2
+        assert not await redis.exists("ttq:idem:user-1:k1")
+
+    _run(scenario)
+
+
+def test_concurrent_duplicate_gets_409_after_lock_timeout():
+    async def scenario(client, redis, calls):
+        first = asyncio.create_task(_post(client, {"sleep": 0.5}))
+        await asyncio.sleep(0.1)
+        duplicate = await _post(client, {"sleep": 0.5})
+        assert duplicate.status_code == 409
+        assert (await first).status_code == 201
+        assert len(calls) == 1
+
+    _run(scenario, lock_timeout=0.1)
+
+
+def test_lock_is_renewed_for_whole_handler_run(monkeypatch):
+    # срок замка короче хендлера: без продления дубликат выполнил бы запрос второй раз
+    monkeypatch.setattr(idempotency, "_LOCK_TTL", 0.3)
+
+    async def scenario(client, redis, calls):
+        first = asyncio.create_task(_post(client, {"sleep": 1.0}))
+        await asyncio.sleep(0.7)
+        assert await redis.get(LOCK)
+
+        duplicate = await _post(client, {"sleep": 1.0})
+        assert duplicate.status_code == 201
+        assert duplicate.headers["idempotent-replayed"] == "true"
+        assert (await first).json() == duplicate.json()
+        assert len(calls) == 1
+        assert not await redis.exists(LOCK)
+
+    _run(scenario, lock_timeout=5.0)
+
+
+def test_redis_down_executes_without_key():
+    class Broken(fakeredis.FakeAsyncRedis):
+        async def hgetall(self, name):
+            raise ConnectionError("redis is down")
+
+    async def main():
+        calls = []
+        transport = httpx.ASGITransport(app=_app(Broken(), calls))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await _post(client, {"a": 1})).status_code == 201
+            assert (await _post(client, {"a": 1})).status_code == 201
+        assert len(calls) == 2
+
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import asyncio
+import base64
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("httpx")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.api.deps import get_db  # noqa: E402
+from app.api.pagination import encode_cursor  # noqa: E402
+from app.api.v1.routers import users  # noqa: E402
+from app.db.models import User  # noqa: E402
+from app.db.models.base import Base  # noqa: E402
+
+STARTED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _walk(created: list[datetime], limit: int, bad_cursors: tuple[str, ...] = ()):
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+        async with sessionmaker() as db:
+            db.add_all(
+                User(id=uuid.uuid4(), display_name=f"user-{i}", created_at=created_at)
+                for i, created_at in enumerate(created)
+            )
+            await db.commit()
+
+        async def db_override():
+            async with sessionmaker() as db:
+                yield db
+
+        app = FastAPI()
+        app.include_router(users.router)
+        app.dependency_overrides[get_db] = db_override
+        pages = []
+        statuses = []
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            cursor = None
+            while True:
+                params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+                response = await client.get("/users", params=params)
+                assert response.status_code == 200, response.text
+                body = response.json()
+                pages.append(body["items"])
+                cursor = body["next_cursor"]
+                if cursor is None:
+                    break
+            for bad in bad_cursors:
+                response = await client.get("/users", params={"cursor": bad})
+                statuses.append((response.status_code, response.json()["detail"]))
+        await engine.dispose()
+        return pages, statuses
+
+    return asyncio.run(scenario())
+
+
+def test_pages_cover_ties_on_created_at_once():
+    # пять строк на одну отметку времени: порядок внутри неё задаёт id
+    created = [STARTED] * 5 + [STARTED + timedelta(seconds=1)] * 2
+    pages, _ = _walk(created, limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    items = [item for page in pages for item in page]
+    assert len({item["id"] for item in items}) == len(created)
+    keys = [(item["created_at"], uuid.UUID(item["id"])) for item in items]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_last_page_has_no_cursor():
+    pages, _ = _walk([STARTED + timedelta(seconds=i) for i in range(4)], limit=2)
+    # ровно limit строк на последней странице — курсора дальше нет, пустой страницы тоже
+    assert [len(page) for page in pages] == [2, 2]
+
+    pages, _ = _walk([STARTED], limit=5)
+    assert [len(page) for page in pages] == [1]
+
+
+def test_invalid_cursor_is_400():
+    tampered = base64.urlsafe_b64encode(f"{STARTED.isoformat()}|not-a-uuid".encode()).decode()
+    bad = ("%%%", "bm90LWEtY3Vyc29y", tampered, encode_cursor(STARTED, uuid.uuid4())[:-4])
+    _, statuses = _walk([STARTED], limit=1, bad_cursors=bad)
+    assert statuses == [(400, "invalid cursor")] * len(bad)
@@ -0,0 +1,96 @@
+import asyncio
+import uuid
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # Lua-скрипты в fakeredis
+pytest.importorskip("httpx")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.api import authz  # noqa: E402
+from app.api.ratelimit import RateLimitMiddleware, client_key, parse_rules  # noqa: E402
+from app.services.cache import EntityCache, LocalLRU  # noqa: E402
+
+ORG = str(uuid.uuid4())
+USER = uuid.uuid4()
+SCOPE = {"client": ("10.0.0.1", 1234)}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = EntityCache(LocalLRU(maxsize=100, ttl=60.0), redis_ttl=60)
+    monkeypatch.setattr(authz, "entity_cache", cache)
+
+    async def roles_of(db, user_id):
+        raise AssertionError("rate limiter must not load roles")
+
+    monkeypatch.setattr(authz, "roles_of", roles_of)
+    return cache
+
+
+def _headers(user=USER, org=ORG):
+    return {b"x-user-id": str(user).encode(), b"x-org-id": org.encode()}
+
+
+def test_parse_rules():
+    assert parse_rules("users=20:40, bots=5,,bad") == {"users": (20.0, 40), "bots": (5.0, 5)}
+
+
+def test_client_key_uses_only_local_roles(cache):
+    # ролей в процессе нет — ключ IP, без похода в Redis и Postgres
+    assert client_key(_headers(), SCOPE) == "ip:10.0.0.1"
+
+    cache.local.set(cache.key("org_roles", USER), {ORG: "member"})
+    assert client_key(_headers(), SCOPE) == "org:" + ORG
+    # чужой X-Org-ID не тратит лимит той организации
+    assert client_key(_headers(org=str(uuid.uuid4())), SCOPE) == f"user:{USER}"
+    assert client_key({b"x-user-id": b"not-a-uuid"}, SCOPE) == "ip:10.0.0.1"
+
+    # не член ни одной организации — IP
+    outsider = uuid.uuid4()
+    cache.local.set(cache.key("org_roles", outsider), {})
+    assert client_key(_headers(user=outsider), SCOPE) == "ip:10.0.0.1"
+
+    # строгий кэш не читается, пока не дошла инвалидация
+    cache._pending.add(cache.key("org_roles", USER))
+    assert client_key(_headers(), SCOPE) == "ip:10.0.0.1"
+
+
+def test_limit_is_per_group_and_client(cache):
+    app = FastAPI()
+
+    @app.get("/api/v1/users")
+    async def users():
+        return []
+
+    @app.get("/api/v1/bots")
+    async def bots():
+        return []
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        rate=1.0,
+        burst=2,
+        rules={"bots": (1.0, 1)},
+        redis=fakeredis.FakeAsyncRedis(),
+    )
+    cache.local.set(cache.key("org_roles", USER), {ORG: "admin"})
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app, client=("10.0.0.1", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            statuses = [(await client.get("/api/v1/users")).status_code for _ in range(3)]
+            assert statuses == [200, 200, 429]
+            rejected = await client.get("/api/v1/users")
+            assert rejected.headers["retry-after"] == "1"
+
+            # организация — свой ключ, а у bots — своё правило
+            member = {"X-User-ID": str(USER), "X-Org-ID": ORG}
+            assert (await client.get("/api/v1/users", headers=member)).status_code == 200
+            assert (await client.get("/api/v1/bots", headers=member)).status_code == 200
+            assert (await client.get("/api/v1/bots", headers=member)).status_code == 429
+
+    asyncio.run(scenario())
@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # Lua-скрипты в fakeredis
+pytest.importorskip("httpx")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.api.v1.routers import schedules  # noqa: E402
+from app.services import schedule  # noqa: E402
+from app.services.schedule import ScheduleDispatcher, ScheduleInFlight, ScheduleStore  # noqa: E402
+
+BOT = "6f1c2f1e-8d5e-4c8a-9b5a-2f0e8a1d7c3b"
+# начало корзины в 60 секунд: сроки в тестах не переползают через её границу случайно
+NOW = 1_700_000_040.0
+
+
+def _store() -> ScheduleStore:
+    return ScheduleStore(fakeredis.FakeAsyncRedis(), bucket_seconds=60)
+
+
+async def _buckets(store):
+    """Непустые корзины; пустые остаются в индексе, пока диспетчер не дойдёт до их срока."""
+    buckets = {}
+    for raw in await store.redis.zrange("ttq:sched:buckets", 0, -1):
+        ids = await store.redis.zrange(f"ttq:sched:bucket:{raw.decode()}", 0, -1)
+        if ids:
+            buckets[raw.decode()] = [item_id.decode() for item_id in ids]
+    return buckets
+
+
+def test_pop_due_takes_only_due_items_and_leases_them():
+    async def scenario():
+        store = _store()
+        early = await store.add(BOT, NOW + 10, {"text": "early"})
+        late = await store.add(BOT, NOW + 70, {"text": "late"})
+        bucket = store.bucket_of(NOW)
+        assert await _buckets(store) == {str(bucket): [early.id], str(bucket + 1): [late.id]}
+
+        assert await store.pop_due(NOW, 10) == []
+        assert await store.pop_due(NOW + 10, 10) == [early.id]
+        # пустая корзина уходит из индекса, запись — в inflight с арендой
+        assert await _buckets(store) == {str(bucket + 1): [late.id]}
+        assert (
+            await store.redis.zscore("ttq:sched:inflight", early.id) == NOW + 10 + schedule._LEASE
+        )
+
+        # аренда истекла (диспетчер упал) — запись забирают снова
+        assert await store.pop_due(NOW + 20, 10) == []
+        assert await store.pop_due(NOW + 11 + schedule._LEASE, 10) == [early.id]
+
+        await store.ack([(early.id, early.due_at)])
+        assert await store.get(early.id) is None
+        assert await store.redis.zcard("ttq:sched:inflight") == 0
+
+    asyncio.run(scenario())
+
+
+def test_update_moves_between_buckets_and_cancel_removes():
+    async def scenario():
+        store = _store()
+        item = await store.add(BOT, NOW + 10, {"text": "a", "chat_id": 1})
+        bucket = store.bucket_of(NOW)
+
+        moved = await store.update(item.id, NOW + 130, {"text": "b"})
+        assert moved is not None and moved.message == {"text": "b", "chat_id": 1}
+        assert await _buckets(store) == {str(bucket + 2): [item.id]}
+        assert (await store.get(item.id)).due_at == NOW + 130
+        assert await store.pop_due(NOW + 60, 10) == []
+        # корзины, из которых запись ушла, диспетчер снял с индекса
+        assert await store.redis.zrange("ttq:sched:buckets", 0, -1) == [str(bucket + 2).encode()]
+
+        assert await store.cancel(item.id) is True
+        assert await _buckets(store) == {}
+        assert await store.get(item.id) is None
+        assert await store.cancel(item.id) is False
+        assert await store.update(item.id, NOW, None) is None
+
+    asyncio.run(scenario())
+
+
+def test_taken_item_cannot_be_changed_or_cancelled():
+    async def scenario():
+        store = _store()
+        item = await store.add(BOT, NOW, {"text": "a"})
+        assert await store.pop_due(NOW, 10) == [item.id]
+
+        with pytest.raises(ScheduleInFlight):
+            await store.update(item.id, NOW + 600, {"text": "b"})
+        with pytest.raises(ScheduleInFlight):
+            await store.cancel(item.id)
+        assert await store.get(item.id) == item
+        assert await _buckets(store) == {}
+
+    asyncio.run(scenario())
+
+
+def test_dispatch_moves_due_items_to_outbox(monkeypatch):
+    sent = []
+
+    async def enqueue_many(messages):
+        sent.extend(messages)
+        return [str(i) for i in range(len(messages))]
+
+    monkeypatch.setattr(schedule.delivery, "enqueue_many", enqueue_many)
+    monkeypatch.setattr(schedule.time, "time", lambda: NOW + 5)
+
+    async def scenario():
+        store = _store()
+        due = await store.add(BOT, NOW, {"text": "now", "chat_id": 1})
+        await store.add(BOT, NOW + 600, {"text": "later", "chat_id": 1})
+        dispatcher = ScheduleDispatcher(store, batch=10)
+
+        assert await dispatcher.dispatch() == 1
+        # задержка доставки считается от срока публикации
+        assert sent == [(BOT, {"text": "now", "chat_id": 1, "enqueued_at": NOW})]
+        assert await store.get(due.id) is None
+        assert await store.redis.zcard("ttq:sched:inflight") == 0
+        assert await dispatcher.dispatch() == 0
+
+    asyncio.run(scenario())
+
+
+def test_routes_report_unknown_and_in_flight(monkeypatch):
+    store = _store()
+    monkeypatch.setattr(schedules, "schedule_store", lambda: store)
+    app = FastAPI()
+    app.include_router(schedules.router)
+
+    async def scenario():
+        pending = await store.add(BOT, NOW + 600, {"text": "a", "chat_id": 1})
+        taken = await store.add(BOT, NOW, {"text": "b", "chat_id": 1})
+        assert await store.pop_due(NOW, 10) == [taken.id]
+        unknown = "00000000-0000-0000-0000-000000000000"
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            patch = {"text": "changed"}
+            assert (await client.patch(f"/schedules/{taken.id}", json=patch)).status_code == 409
+            assert (await client.delete(f"/schedules/{taken.id}")).status_code == 409
+            assert (await client.patch(f"/schedules/{unknown}", json=patch)).status_code == 404
+            assert (await client.delete(f"/schedules/{unknown}")).status_code == 404
+
+            response = await client.patch(f"/schedules/{pending.id}", json=patch)
+            assert response.status_code == 200 and response.json()["text"] == "changed"
+            assert (await client.delete(f"/schedules/{pending.id}")).status_code == 204
+            assert (await client.delete(f"/schedules/{pending.id}")).status_code == 404
+
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("aiohttp")
+pytest.importorskip("httpx")
+
+# Redis в тестах нет: соединение отказывает сразу, дедупликация работает на локальном уровне
+os.environ.setdefault("REDIS_URL", "redis://127.0.0.1:1/0")
+
+import httpx  # noqa: E402
+from fake_telegram import FakeTelegram, message_update  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from app.adapters.telegram.bot import scheduler  # noqa: E402
+from app.adapters.telegram.webhook import SECRET_HEADER, BotRegistry, webhook_secret  # noqa: E402
+from app.api.v1.routers import telegram  # noqa: E402
+
+
+def test_webhook_verifies_secret_and_feeds_each_update_once(monkeypatch):
+    bot_id = uuid.uuid4()
+    app = FastAPI()
+    app.include_router(telegram.router)
+
+    async def scenario():
+        async with FakeTelegram() as fake:
+            registry = BotRegistry(api=fake.api)
+            registry.add(bot_id, "123456:TEST")
+            monkeypatch.setattr(telegram, "registry", registry)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                url = f"/telegram/webhook/{bot_id}"
+                update = message_update(1001, "hello")
+
+                r = await client.post(url, json=update, headers={SECRET_HEADER: "wrong"})
+                assert r.status_code == 401
+
+                headers = {SECRET_HEADER: webhook_secret(bot_id)}
+                assert (await client.post(url, content=b"{", headers=headers)).status_code == 400
+
+                for _ in range(2):  # повторная доставка того же update_id
+                    r = await client.post(url, json=update, headers=headers)
+                    assert r.status_code == 200
+                await scheduler.drain()
+
+                other = await client.post(
+                    f"/telegram/webhook/{uuid.uuid4()}", json=update, headers=headers
+                )
+                assert other.status_code == 401
+            await registry.close()
+        return fake.called("sendMessage")
+
+    sent = asyncio.run(scenario())
+    assert len(sent) == 1
+    assert sent[0]["chat_id"] == "42"
+    assert "hello" in sent[0]["text"]